@@ -1,4 +1,6 @@
 import streamlit as st
+import hashlib
+import io
 import json
 import os
 from sections.student_marks import display_student_marks
@@ -13,7 +15,18 @@ from sections.visualization import (
     display_subject_statistics
 )
 from sections.evolution import display_evolution_dashboard
+from sections.catalog_view import display_catalog
 from utils.constants import MarkConfig, AppConfig
+from utils.catalog import StudentCatalog, current_school_year
+from utils.columnar_format import COLUMNAR_FORMATS, is_columnar_file, read_columnar_envelope, read_columnar_metadata
+from utils.conversion_cache import file_content_hash
+from utils.marks_dataset import MarksDataset
+from utils.student_records import FileMetadata, make_student
+from utils.prefetch import PrefetchCache
+from utils.trimester_dataset import DATASET_EXTENSION, dataset_envelopes, is_dataset_file
+from utils.migrations import LEGACY_VERSION, MigrationCache, compare_versions, is_legacy_content, migrate_data, needs_migration
+from utils.validation import validate_students
+from utils.student_schema import SCHEMA_ERRORS, decode_student_file, probe_student_file
 import plotly.graph_objects as go
 import pandas as pd
 import plotly.express as px
@@ -23,101 +36,171 @@ import logging
 # logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def compare_versions(version1, version2):
-    """Compare two semantic versions and return -1, 0, or 1"""
-    def version_to_tuple(version):
-        return tuple(map(int, version.split('.')))
-    
-    v1_tuple = version_to_tuple(version1)
-    v2_tuple = version_to_tuple(version2)
-    
-    if v1_tuple < v2_tuple:
-        return -1
-    elif v1_tuple > v2_tuple:
-        return 1
-    else:
-        return 0
+# Number of parsed uploaded file versions kept in the loader cache
+UPLOAD_CACHE_ENTRIES = 32
+# Number of uploaded file headers kept in the probe cache
+HEADER_CACHE_ENTRIES = 256
 
 def get_json_files(directory):
-    """Get all JSON files in the directory (kept for compatibility with other modules)"""
+    """Get all JSON and columnar (Parquet/Arrow) files in the directory (kept for compatibility with other modules)"""
     json_files = []
     for filename in os.listdir(directory):
-        if filename.endswith('.json'):
+        if filename.endswith('.json') or is_columnar_file(filename):
             json_files.append(filename)
     return sorted(json_files)
 
-def load_json_files(directory, selected_files, trimestre=None):
-    """Load selected JSON files, optionally filtered by trimester (kept for compatibility with other modules)"""
+def decode_data_file(source, filename, migration_cache=None):
+    """
+    Decode a JSON or columnar (Parquet/Arrow) file given as bytes or a binary
+    file object. Files older than AppConfig.MIN_COMPATIBLE_VERSION are
+    migrated to the current format, old list files once per content with a
+    MigrationCache.
+    """
+    if is_columnar_file(filename):
+        return read_columnar_envelope(source, os.path.splitext(filename)[1].lower().lstrip('.'))
+    content = source.read() if hasattr(source, 'read') else source
+    content = content.tobytes() if isinstance(content, memoryview) else content
+    cached = migration_cache is not None and is_legacy_content(content)
+    if cached:
+        migrated = migration_cache.get_migrated(content, filename)
+        if migrated is not None:
+            return decode_data_file(migrated, filename)
+    try:
+        data = decode_student_file(content)
+    except SCHEMA_ERRORS:
+        # Keep the valid students, parse_data_file reports and skips the rest
+        data = json.loads(content)
+    if needs_migration(data):
+        data, from_version = migrate_data(data, filename)
+        logger.info(f"{filename}: migrat de la versió {from_version} a la {data['metrika_version']}")
+        if cached:
+            migration_cache.put_migrated(content, filename, data)
+    return data
+
+def probe_data_file(source, filename):
+    """
+    Read the header of a JSON or columnar file without decoding its students.
+    Old list files take their header from the migration of an empty list,
+    other files that need a migration are decoded and migrated (see
+    decode_data_file).
+    """
+    if is_columnar_file(filename):
+        return read_columnar_metadata(source, os.path.splitext(filename)[1].lower().lstrip('.'))
+    content = source.read() if hasattr(source, 'read') else source
+    content = content.tobytes() if isinstance(content, memoryview) else content
+    if is_legacy_content(content):
+        data, _ = migrate_data([], filename)
+    else:
+        header = probe_student_file(content)
+        if not needs_migration(header):
+            return header
+        data = decode_data_file(content, filename)
+    return {key: value for key, value in data.items() if key != 'estudiants'}
+
+def describe_data_file(header, filename):
+    """
+    Build the file info and version warnings of a data file from its header,
+    a dict with grup, trimestre and metrika_version. Old formats are migrated
+    before (see decode_data_file), old list files keep their Grup_Antic
+    display name, version 0.0.0 and warning. Returns None for unrecognized
+    formats.
+    """
+    if not isinstance(header, dict):
+        return None
+    version_warnings = []
+    grup = header.get('grup', 'Grup desconegut')
+    trimestre_name = header.get('trimestre', 'Trimestre desconegut')
+    file_version = header.get('metrika_version', '0.0.0')
+    
+    # Old structure (direct array of students), migrated on load
+    legacy = header.get('migrated_from') == LEGACY_VERSION
+    
+    if legacy:
+        file_version = LEGACY_VERSION  # Old files don't have version
+        version_warnings.append(f"⚠️ {filename}: Format antic sense informació de versió")
+    # Check version compatibility
+    elif compare_versions(file_version, AppConfig.MIN_COMPATIBLE_VERSION) < 0:
+        version_warnings.append(f"⚠️ {filename}: Versió {file_version} és anterior a la versió mínima compatible ({AppConfig.MIN_COMPATIBLE_VERSION})")
+    elif compare_versions(file_version, AppConfig.VERSION) > 0:
+        version_warnings.append(f"⚠️ {filename}: Versió {file_version} és posterior a la versió actual ({AppConfig.VERSION})")
+    
+    # Create display name: grup_trimestre
+    display_name = f"Grup_Antic_{trimestre_name}" if legacy else f"{grup}_{trimestre_name}"
+    file_info = {
+        'display_name': display_name,
+        'grup': grup,
+        'trimestre': trimestre_name,
+        'version': file_version
+    }
+    
+    return file_info, version_warnings
+
+def parse_data_file(data, filename):
+    """
+    Extract the students of a decoded JSON/columnar file together with its
+    file info and version warnings. Returns None for unrecognized formats.
+    """
+    if isinstance(data, dict) and isinstance(data.get('estudiants'), list):
+        file_students = data['estudiants']
+    else:
+        return None
+    file_info, version_warnings = describe_data_file(data, filename)
+    # File metadata stored once and shared by every student of the file
+    file = FileMetadata(file_info['grup'], file_info['trimestre'], file_info['display_name'], file_info['version'])
+    students = []
+    
+    # Validate every student at once, report the errors and skip the students that cannot be loaded
+    report = validate_students(file_students)
+    version_warnings.extend(f"⚠️ {filename}: {message}" for message in report.messages())
+    skipped = report.skipped_mask()
+    unnamed = set(report.rows('materia_sense_nom').tolist())
+    
+    # Immutable records of the valid students, the decoded data is left unchanged
+    for i, student in enumerate(file_students):
+        if skipped[i]:
+            continue
+        materies = None
+        if i in unnamed:
+            materies = [m for m in student['materies'] if isinstance(m, dict) and isinstance(m.get('materia'), str) and m['materia'].strip()]
+        students.append(make_student(student, file, materies))
+    
+    return students, file_info, version_warnings
+
+def load_json_files(directory, selected_files, trimestre=None, catalog=None, curs=None, migration_cache=None):
+    """
+    Load selected JSON files, optionally filtered by trimester (kept for compatibility with other modules).
+    With a StudentCatalog, files already stored in it are loaded from the catalog and new ones are added to it.
+    With a MigrationCache, old format files are migrated once and read from it afterwards.
+    """
     all_students = []
     file_info = {}  # Store file metadata for display
     version_warnings = []  # Store version compatibility warnings
     
     for filename in selected_files:
         try:
-            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Check if it's the new structure (with grup, trimestre, estudiants)
-                if isinstance(data, dict) and 'estudiants' in data:
-                    # New structure
-                    students = data['estudiants']
-                    grup = data.get('grup', 'Grup desconegut')
-                    trimestre_name = data.get('trimestre', 'Trimestre desconegut')
-                    file_version = data.get('metrika_version', '0.0.0')
-                    
-                    # Check version compatibility
-                    if compare_versions(file_version, AppConfig.MIN_COMPATIBLE_VERSION) < 0:
-                        version_warnings.append(f"⚠️ {filename}: Versió {file_version} és anterior a la versió mínima compatible ({AppConfig.MIN_COMPATIBLE_VERSION})")
-                    elif compare_versions(file_version, AppConfig.VERSION) > 0:
-                        version_warnings.append(f"⚠️ {filename}: Versió {file_version} és posterior a la versió actual ({AppConfig.VERSION})")
-                    
-                    # Create display name: grup_trimestre
-                    display_name = f"{grup}_{trimestre_name}"
-                    file_info[filename] = {
-                        'display_name': display_name,
-                        'grup': grup,
-                        'trimestre': trimestre_name,
-                        'version': file_version
-                    }
-                    
-                    # Filter out students with NULL IDs and add trimester info
-                    for student in students:
-                        # Ensure ID is always a string
-                        student['id'] = str(student['id'])
-                        if student['id'].upper() != "NULL" and student['id']:
-                            student['trimestre'] = trimestre_name
-                            student['grup'] = grup
-                            student['file_display_name'] = display_name
-                            all_students.append(student)
-                            
-                elif isinstance(data, list):
-                    # Old structure (direct array of students)
-                    # Try to extract trimester from filename
-                    trimestre_from_filename = filename.split('.')[0]  # Will be T1, T2, or T3
-                    
-                    display_name = f"Grup_Antic_{trimestre_from_filename}"
-                    file_info[filename] = {
-                        'display_name': display_name,
-                        'grup': 'Grup Antic',
-                        'trimestre': trimestre_from_filename,
-                        'version': '0.0.0'  # Old files don't have version
-                    }
-                    
-                    # Add warning for old format
-                    version_warnings.append(f"⚠️ {filename}: Format antic sense informació de versió")
-                    
-                    # Filter out students with NULL IDs and add trimester info
-                    for student in data:
-                        # Ensure ID is always a string
-                        student['id'] = str(student['id'])
-                        if student['id'].upper() != "NULL" and student['id']:
-                            student['trimestre'] = trimestre_from_filename
-                            student['grup'] = 'Grup Antic'
-                            student['file_display_name'] = display_name
-                            all_students.append(student)
-                else:
-                    st.warning(f"Format de fitxer no reconegut per a {filename}")
+            path = os.path.join(directory, filename)
+            if catalog is not None:
+                content_hash = file_content_hash(path)
+                file_id = catalog.find_file(content_hash, curs)
+                if file_id is not None:
+                    file_info[filename], warnings = catalog.file_info(file_id)
+                    version_warnings.extend(warnings)
+                    all_students.extend(catalog.load_students([file_id]))
                     continue
+            
+            with open(path, 'rb') as f:
+                data = decode_data_file(f, filename, migration_cache)
+            
+            parsed = parse_data_file(data, filename)
+            if parsed is None:
+                st.warning(f"Format de fitxer no reconegut per a {filename}")
+                continue
+            students, file_info[filename], warnings = parsed
+            if catalog is not None:
+                file_info[filename]['content_hash'] = content_hash
+                catalog.ingest(filename, file_info[filename], students, content_hash, curs, warnings)
+            version_warnings.extend(warnings)
+            all_students.extend(students)
                     
         except Exception as e:
             st.error(f"Error carregant el fitxer {filename}: {str(e)}")
@@ -125,6 +208,33 @@ def load_json_files(directory, selected_files, trimestre=None):
     
     return all_students, file_info, version_warnings
 
+def _decode_uploaded_file(filename, content, migration_cache):
+    return parse_data_file(decode_data_file(content, filename, migration_cache), filename)
+
+@st.cache_resource(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _parse_uploaded_file(filename, content_hash, _content):
+    """
+    Decode and parse one uploaded file. Cached by file name and content hash,
+    so each version of a file is parsed once and shared across reruns,
+    tabs and sessions as read-only StudentEntry records. Files already parsed
+    in the background (see prefetch_uploaded_files) are not parsed again.
+    """
+    return get_prefetch_cache().get(('fitxer', filename, content_hash), _decode_uploaded_file,
+                                    filename, _content, get_migration_cache())
+
+@st.cache_resource(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _build_marks_dataset(files_key, _students):
+    """Build the marks dataset of a set of uploaded file versions once"""
+    return get_prefetch_cache().get(('notes', files_key), MarksDataset.from_students, _students)
+
+def load_marks_dataset(students, file_info, filenames):
+    """
+    Return the MarksDataset of the students loaded from ``filenames``, built
+    once per combination of file contents (see load_uploaded_json_files).
+    """
+    files_key = tuple((name, file_info[name].get('content_hash')) for name in filenames if name in file_info)
+    return _build_marks_dataset(files_key, students)
+
 def load_uploaded_json_files(uploaded_files, trimestre=None):
     """Load uploaded JSON files, optionally filtered by trimester"""
     all_students = []
@@ -133,72 +243,19 @@ def load_uploaded_json_files(uploaded_files, trimestre=None):
     
     for uploaded_file in uploaded_files:
         try:
-            # Read the uploaded file content and decode it
+            # Read the uploaded file content, it is only decoded if its hash is not cached
             uploaded_file.seek(0)  # Reset file pointer to beginning
             file_content = uploaded_file.read()
-            data = json.loads(file_content.decode('utf-8'))
+            content_hash = hashlib.sha256(file_content).hexdigest()
             
-            # Check if it's the new structure (with grup, trimestre, estudiants)
-            if isinstance(data, dict) and 'estudiants' in data:
-                # New structure
-                students = data['estudiants']
-                grup = data.get('grup', 'Grup desconegut')
-                trimestre_name = data.get('trimestre', 'Trimestre desconegut')
-                file_version = data.get('metrika_version', '0.0.0')
-                
-                # Check version compatibility
-                if compare_versions(file_version, AppConfig.MIN_COMPATIBLE_VERSION) < 0:
-                    version_warnings.append(f"⚠️ {uploaded_file.name}: Versió {file_version} és anterior a la versió mínima compatible ({AppConfig.MIN_COMPATIBLE_VERSION})")
-                elif compare_versions(file_version, AppConfig.VERSION) > 0:
-                    version_warnings.append(f"⚠️ {uploaded_file.name}: Versió {file_version} és posterior a la versió actual ({AppConfig.VERSION})")
-                
-                # Create display name: grup_trimestre
-                display_name = f"{grup}_{trimestre_name}"
-                file_info[uploaded_file.name] = {
-                    'display_name': display_name,
-                    'grup': grup,
-                    'trimestre': trimestre_name,
-                    'version': file_version
-                }
-                
-                # Filter out students with NULL IDs and add trimester info
-                for student in students:
-                    # Ensure ID is always a string
-                    student['id'] = str(student['id'])
-                    if student['id'].upper() != "NULL" and student['id']:
-                        student['trimestre'] = trimestre_name
-                        student['grup'] = grup
-                        student['file_display_name'] = display_name
-                        all_students.append(student)
-                        
-            elif isinstance(data, list):
-                # Old structure (direct array of students)
-                # Try to extract trimester from filename
-                trimestre_from_filename = uploaded_file.name.split('.')[0]  # Will be T1, T2, or T3
-                
-                display_name = f"Grup_Antic_{trimestre_from_filename}"
-                file_info[uploaded_file.name] = {
-                    'display_name': display_name,
-                    'grup': 'Grup Antic',
-                    'trimestre': trimestre_from_filename,
-                    'version': '0.0.0'  # Old files don't have version
-                }
-                
-                # Add warning for old format
-                version_warnings.append(f"⚠️ {uploaded_file.name}: Format antic sense informació de versió")
-                
-                # Filter out students with NULL IDs and add trimester info
-                for student in data:
-                    # Ensure ID is always a string
-                    student['id'] = str(student['id'])
-                    if student['id'].upper() != "NULL" and student['id']:
-                        student['trimestre'] = trimestre_from_filename
-                        student['grup'] = 'Grup Antic'
-                        student['file_display_name'] = display_name
-                        all_students.append(student)
-            else:
+            parsed = _parse_uploaded_file(uploaded_file.name, content_hash, file_content)
+            if parsed is None:
                 st.warning(f"Format de fitxer no reconegut per a {uploaded_file.name}")
                 continue
+            students, info, warnings = parsed
+            file_info[uploaded_file.name] = {**info, 'content_hash': content_hash}
+            version_warnings.extend(warnings)
+            all_students.extend(students)
                 
         except Exception as e:
             st.error(f"Error carregant el fitxer {uploaded_file.name}: {str(e)}")
@@ -206,6 +263,214 @@ def load_uploaded_json_files(uploaded_files, trimestre=None):
     
     return all_students, file_info, version_warnings
 
+class _DatasetTrimesterFile(io.BytesIO):
+    """One trimester of an uploaded dataset, read as an uploaded JSON file"""
+    
+    def __init__(self, name, content):
+        super().__init__(content)
+        self.name = name
+
+@st.cache_resource(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _split_uploaded_dataset(filename, content_hash, _content):
+    """Encode each trimester of an uploaded dataset as a JSON file once per dataset version"""
+    stem = os.path.splitext(filename)[0]
+    return [
+        (f"{stem}_{envelope['trimestre']}.json", json.dumps(envelope, ensure_ascii=False).encode('utf-8'))
+        for envelope in dataset_envelopes(_content, filename)
+    ]
+
+def expand_uploaded_datasets(uploaded_files):
+    """
+    Replace every uploaded multi-trimester dataset (see
+    utils.trimester_dataset) by one JSON file per trimester, named
+    <dataset>_<trimestre>.json, so that its trimesters are selected, loaded
+    and compared as uploaded trimester files.
+    """
+    files = []
+    for uploaded_file in uploaded_files:
+        if not is_dataset_file(uploaded_file.name):
+            files.append(uploaded_file)
+            continue
+        try:
+            uploaded_file.seek(0)
+            content = uploaded_file.read()
+            trimesters = _split_uploaded_dataset(uploaded_file.name, hashlib.sha256(content).hexdigest(), content)
+        except Exception as e:
+            st.error(f"Error carregant el fitxer {uploaded_file.name}: {str(e)}")
+            continue
+        files.extend(_DatasetTrimesterFile(name, content) for name, content in trimesters)
+    return files
+
+@st.cache_resource(show_spinner=False, max_entries=HEADER_CACHE_ENTRIES)
+def _probe_uploaded_file(filename, content_hash, _content):
+    """Read the file info of one uploaded file version from its header only"""
+    return describe_data_file(probe_data_file(_content, filename), filename)
+
+@st.cache_resource(show_spinner=False)
+def get_catalog():
+    """Local catalog of saved files, shared by every session"""
+    return StudentCatalog()
+
+@st.cache_resource(show_spinner=False)
+def get_migration_cache():
+    """Old format files migrated to the current format, shared by every session"""
+    return MigrationCache()
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_cache():
+    """Uploaded files parsed and indexed in the foreground or in the background, shared by every session"""
+    return PrefetchCache(max_entries=UPLOAD_CACHE_ENTRIES * 2)
+
+def _index_uploaded_files(prefetch_cache, migration_cache, files):
+    """
+    Parse uploaded files, given as (filename, content_hash, content) tuples,
+    and build the marks dataset of each file and of all of them together,
+    as load_uploaded_json_files and load_marks_dataset do. Runs in the
+    prefetch threads, so it must not call Streamlit.
+    """
+    group_students, files_key = [], []
+    for filename, content_hash, content in files:
+        parsed = prefetch_cache.get(('fitxer', filename, content_hash), _decode_uploaded_file,
+                                    filename, content, migration_cache)
+        if parsed is None:
+            continue
+        file_key = ((filename, content_hash),)
+        prefetch_cache.get(('notes', file_key), MarksDataset.from_students, parsed[0])
+        group_students.extend(parsed[0])
+        files_key.extend(file_key)
+    if len(group_students) >= 2:
+        return prefetch_cache.get(('notes', tuple(files_key)), MarksDataset.from_students, group_students)
+    return None
+
+def prefetch_uploaded_files(uploaded_files, file_info):
+    """
+    Start parsing and indexing in the background every uploaded file of
+    ``file_info`` (see probe_uploaded_files) and the evolution dataset of
+    all of them, so that switching trimesters or opening the Evolució tab
+    finds them ready. Files already parsed and indexed are skipped.
+
+    The cache is grown to hold the parsed data and the marks dataset of
+    every file plus the evolution dataset, so that prefetching many files
+    does not evict the entries the next rerun reads. The tasks only cache
+    the values of _index_uploaded_files, never their own results.
+    """
+    prefetch_cache = get_prefetch_cache()
+    migration_cache = get_migration_cache()
+    prefetch_cache.reserve(2 * len(uploaded_files) + 1)
+    files = []
+    for uploaded_file in uploaded_files:
+        info = file_info.get(uploaded_file.name)
+        if info is None:
+            continue
+        uploaded_file.seek(0)
+        entry = (uploaded_file.name, info['content_hash'], uploaded_file.read())
+        files.append(entry)
+        file_key = ((entry[0], entry[1]),)
+        if ('fitxer', *file_key[0]) in prefetch_cache and ('notes', file_key) in prefetch_cache:
+            continue
+        prefetch_cache.prefetch(('indexat', *file_key[0]), _index_uploaded_files,
+                                prefetch_cache, migration_cache, [entry], store=False)
+    files_key = tuple((filename, content_hash) for filename, content_hash, _ in files)
+    if ('notes', files_key) not in prefetch_cache:
+        prefetch_cache.prefetch(('evolucio', files_key), _index_uploaded_files,
+                                prefetch_cache, migration_cache, files, store=False)
+
+@st.cache_resource(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _load_catalog_students(files_key, _catalog):
+    """Load the students of catalog files once per file version"""
+    return _catalog.load_students([file_id for file_id, _ in files_key])
+
+def load_catalog_students(catalog, file_ids):
+    """
+    Return the students of catalog files and their file info, keyed by
+    'catàleg:<file id>' so that they can be passed to load_marks_dataset.
+    """
+    file_info = {f"catàleg:{file_id}": catalog.file_info(file_id)[0] for file_id in file_ids}
+    files_key = tuple((file_id, file_info[f"catàleg:{file_id}"]['content_hash']) for file_id in file_ids)
+    return _load_catalog_students(files_key, catalog), file_info
+
+def save_uploaded_files_to_catalog(catalog, uploaded_files, file_info, curs):
+    """Store the valid uploaded files that are not in the catalog yet. Returns the number of files added"""
+    added = 0
+    for uploaded_file in uploaded_files:
+        info = file_info.get(uploaded_file.name)
+        if info is None or catalog.find_file(info['content_hash'], curs) is not None:
+            continue
+        students, loaded_info, warnings = load_uploaded_json_files([uploaded_file])
+        if uploaded_file.name in loaded_info:
+            catalog.ingest(uploaded_file.name, loaded_info[uploaded_file.name], students, info['content_hash'], curs, warnings)
+            added += 1
+    return added
+
+def display_dashboards(marks, evolution_marks):
+    """
+    Display the Grup, Materia, Alumne and Evolució tabs of a loaded file.
+    ``evolution_marks`` may be a function returning the dataset, called only
+    after the other tabs are drawn.
+    """
+    tab1, tab2, tab3, tab4 = st.tabs(["Grup", "Materia", "Alumne", "Evolució"])
+    
+    with tab1:
+        col1, col2 = st.columns(2)
+        display_group_statistics(marks)
+        group_failure_table(marks)
+        display_subjects_bar_chart(marks)
+        display_student_subject_heatmap(marks)
+        display_student_ranking(marks)
+    
+    with tab2:
+        # Display subject statistics
+        display_subject_statistics(marks)
+    
+    with tab3:    
+        # Display student selector and get selected student data
+        selected_student_data = display_student_selector(marks)
+        col1, col2 = st.columns(2)
+        with col1:
+            # Display student marks
+            display_student_marks(selected_student_data)
+        with col2:
+            # Display pie chart of marks
+            display_marks_pie_chart(selected_student_data)
+        
+    with tab4:
+        # Trimesters to compare, None when there is not enough data
+        if callable(evolution_marks):
+            evolution_marks = evolution_marks()
+        if evolution_marks is None:
+            st.warning("Es necessiten almenys dos trimestres per visualitzar l'evolució")
+        else:
+            display_evolution_dashboard(evolution_marks)
+
+def probe_uploaded_files(uploaded_files):
+    """
+    Read the file info and version warnings of uploaded files from their
+    headers, without decoding any student, so that the trimester selector
+    is ready before any file is fully loaded (see load_uploaded_json_files).
+    """
+    file_info = {}
+    version_warnings = []
+    
+    for uploaded_file in uploaded_files:
+        try:
+            uploaded_file.seek(0)
+            file_content = uploaded_file.read()
+            content_hash = hashlib.sha256(file_content).hexdigest()
+            
+            described = _probe_uploaded_file(uploaded_file.name, content_hash, file_content)
+            if described is None:
+                st.warning(f"Format de fitxer no reconegut per a {uploaded_file.name}")
+                continue
+            info, warnings = described
+            file_info[uploaded_file.name] = {**info, 'content_hash': content_hash}
+            version_warnings.extend(warnings)
+        
+        except Exception as e:
+            st.error(f"Error carregant el fitxer {uploaded_file.name}: {str(e)}")
+            continue
+    
+    return file_info, version_warnings
+
 def main():
     st.set_page_config(
         page_title=f"{AppConfig.APP_NAME} - Sistema de Visualització de Notes",
@@ -232,7 +497,7 @@ def main():
     # Sidebar menu
     menu = st.sidebar.selectbox(
         "Menú",
-        ["Estadísticas", "Convertir CSV"]
+        ["Estadísticas", "Catàleg", "Convertir CSV"]
     )
     
     if menu == "Estadísticas":
@@ -240,8 +505,8 @@ def main():
         
         # Create a drag and drop file uploader for JSON files
         uploaded_files = st.file_uploader(
-            "Arrossega els fitxers JSON aquí (T1.json, T2.json, T3.json)",
-            type=['json'],
+            "Arrossega els fitxers JSON aquí (T1.json, T2.json, T3.json) o un conjunt de dades multitrimestral (.jsonl)",
+            type=['json', *COLUMNAR_FORMATS, DATASET_EXTENSION],
             accept_multiple_files=True,
             help="Selecciona els fitxers JSON que vols visualitzar"
         )
@@ -250,17 +515,19 @@ def main():
             st.warning("Arrossega almenys un fitxer JSON per visualitzar")
             return
         
-        # Load all uploaded files to get their metadata
-        all_students, file_info, version_warnings = load_uploaded_json_files(uploaded_files)
+        # Every trimester of an uploaded dataset is shown as one more file
+        uploaded_files = expand_uploaded_datasets(uploaded_files)
         
-        if not all_students:
-            st.error("No s'han pogut carregar estudiants dels fitxers seleccionats")
-            return
+        # Read only the headers of the uploaded files to build the selector
+        file_info, version_warnings = probe_uploaded_files(uploaded_files)
         
-        # Show version compatibility warnings
-        if version_warnings:
+        # Show version compatibility warnings, once per session
+        shown_warnings = st.session_state.setdefault('shown_version_warnings', set())
+        new_warnings = [warning for warning in version_warnings if warning not in shown_warnings]
+        shown_warnings.update(new_warnings)
+        if new_warnings:
             st.warning("**Advertències de compatibilitat de versions:**")
-            for warning in version_warnings:
+            for warning in new_warnings:
                 st.markdown(f"• {warning}")
             st.markdown("---")
         
@@ -295,43 +562,58 @@ def main():
             format_func=lambda x: file_info[x]['display_name'] if x in file_info else x
         )
         
-        # Cargar estudiantes según el trimestre seleccionado
+        # Cargar estudiantes según el trimestre seleccionado, only this file is fully decoded
         selected_file = next(f for f in uploaded_files if f.name == trimestre)
-        students, _, _ = load_uploaded_json_files([selected_file])
+        students, selected_info, load_warnings = load_uploaded_json_files([selected_file])
         
-        # Create tabs for different views
-        tab1, tab2, tab3, tab4 = st.tabs(["Grup", "Materia", "Alumne", "Evolució"])
+        # Validation warnings of the selected file, its version warnings are already shown
+        for warning in load_warnings:
+            if warning not in version_warnings:
+                st.warning(warning)
         
-        with tab1:
-            col1, col2 = st.columns(2)
-            display_group_statistics(students)
-            group_failure_table(students)
-            display_subjects_bar_chart(students)
-            display_student_subject_heatmap(students)
-            display_student_ranking(students)
+        if not students:
+            st.error("No s'han pogut carregar estudiants dels fitxers seleccionats")
+            return
         
-        with tab2:
-            # Display subject statistics
-            display_subject_statistics(students)
+        # Marks arrays shared by every section, built once per file contents
+        marks = load_marks_dataset(students, selected_info, [selected_file.name])
         
-        with tab3:    
-            # Display student selector and get selected student data
-            selected_student_data = display_student_selector(students)
-            col1, col2 = st.columns(2)
-            with col1:
-                # Display student marks
-                display_student_marks(selected_student_data)
-            with col2:
-                # Display pie chart of marks
-                display_marks_pie_chart(selected_student_data)
-            
-        with tab4:
-            # Load all trimesters for evolution comparison
-            all_trimesters, _, _ = load_uploaded_json_files(uploaded_files)
-            if len(all_trimesters) < 2:
-                st.warning("Es necessiten almenys dos trimestres per visualitzar l'evolució")
-            else:
-                display_evolution_dashboard(all_trimesters)
+        # The other trimesters and the evolution datasets are prepared in the background
+        prefetch_uploaded_files(uploaded_files, file_info)
+        
+        # Evolution across all the uploaded trimesters, loaded when its tab is drawn
+        def evolution_marks():
+            all_trimesters, all_info, _ = load_uploaded_json_files(uploaded_files)
+            if len(all_trimesters) >= 2:
+                return load_marks_dataset(all_trimesters, all_info, [f.name for f in uploaded_files])
+            return None
+        
+        # Save the uploaded files in the local catalog
+        with st.expander("💾 Desa al catàleg"):
+            curs = st.text_input("Curs acadèmic", value=current_school_year(), key="catalog_save_curs")
+            if st.button("Desa els fitxers carregats al catàleg", key="catalog_save"):
+                added = save_uploaded_files_to_catalog(get_catalog(), uploaded_files, file_info, curs)
+                st.success(f"S'han desat {added} fitxers nous al catàleg ({curs})")
+        
+        display_dashboards(marks, evolution_marks)
+    
+    elif menu == "Catàleg":
+        st.title("Catàleg de dades")
+        catalog = get_catalog()
+        file_id = display_catalog(catalog)
+        if file_id is None:
+            return
+        
+        # Students of the selected file and of its group in the same curs, loaded from the catalog
+        students, info = load_catalog_students(catalog, [file_id])
+        marks = load_marks_dataset(students, info, list(info))
+        selected = catalog.files().set_index('id').loc[file_id]
+        group_ids = catalog.files(curs=selected['curs'], grup=selected['grup'])['id'].tolist()
+        group_students, group_info = load_catalog_students(catalog, group_ids)
+        evolution_marks = None
+        if len(group_students) >= 2:
+            evolution_marks = load_marks_dataset(group_students, group_info, list(group_info))
+        display_dashboards(marks, evolution_marks)
     
     elif menu == "Convertir CSV":
         st.title("Convertir CSV")
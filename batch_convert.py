@@ -0,0 +1,187 @@
+"""
+Headless batch conversion of a directory tree of Esfera CSV files.
+
+Group folders are scanned recursively and every CSV with '1r', '2n' or '3r'
+in its name is converted to <trimestre>.json with the grup/trimestre/
+estudiants/metrika_version structure loaded by the app. Example:
+
+    python batch_convert.py /dades/esfera --output /dades/json --workers 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from utils.conversion_cache import ConversionCache
+from utils.csv_to_json import CONVERSION_ENGINES, detect_trimester, process_trimestre_files
+
+logger = logging.getLogger(__name__)
+
+
+def find_csv_files(root_dir):
+    """Return every CSV file under root_dir, sorted"""
+    csv_files = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.csv'):
+                csv_files.append(os.path.join(dirpath, filename))
+    return csv_files
+
+
+def plan_jobs(csv_files, root_dir, output_dir=None):
+    """
+    Build the conversion jobs of a list of CSV files.
+
+    The grup is the name of the folder holding the CSV and the output file
+    is <trimestre>.json in the same relative folder under output_dir (next
+    to the CSV when output_dir is None). Returns (jobs, skipped) where jobs
+    are (csv_file, output_file, grup, trimestre) and skipped are
+    (csv_file, reason).
+    """
+    jobs = []
+    skipped = []
+    outputs = {}
+    root_name = os.path.basename(os.path.abspath(root_dir))
+    for csv_file in csv_files:
+        trimestre = detect_trimester(csv_file)
+        if trimestre is None:
+            skipped.append((csv_file, "no conté '1r', '2n' o '3r' al nom"))
+            continue
+        folder = os.path.dirname(os.path.relpath(csv_file, root_dir))
+        grup = os.path.basename(folder) or root_name
+        output_file = os.path.join(output_dir if output_dir else root_dir, folder, f"{trimestre}.json")
+        if output_file in outputs:
+            skipped.append((csv_file, f"{outputs[output_file]} ja genera {output_file}"))
+            continue
+        outputs[output_file] = csv_file
+        jobs.append((csv_file, output_file, grup, trimestre))
+    return jobs, skipped
+
+
+def count_students(output_file):
+    """Number of students of a JSON file written by the batch"""
+    with open(output_file, 'r', encoding='utf-8') as f:
+        return len(json.load(f)['estudiants'])
+
+
+def run_batch(root_dir, output_dir=None, workers=1, engine='rows', cache=None, progress=None, stream=False):
+    """
+    Convert every CSV file under root_dir with a pool of ``workers`` processes.
+
+    The conversion, the cache and the pool are those of
+    process_trimestre_files, with the output file and grup of each job.
+    With ``stream`` each file is converted chunk by chunk, so large exports
+    are written without holding all their students in memory.
+    ``progress`` is called with (done, total, csv_file, success, message)
+    after each file. Returns a summary dict with the results per file,
+    the skipped files and the throughput figures.
+    """
+    start = time.perf_counter()
+    jobs, skipped = plan_jobs(find_csv_files(root_dir), root_dir, output_dir)
+    total = len(jobs)
+
+    def report(done, total, csv_file, result):
+        if progress:
+            progress(done, total, csv_file, *result)
+
+    results = process_trimestre_files(
+        [job[0] for job in jobs],
+        output_dir or root_dir,
+        save_to_file=True,
+        workers=workers,
+        progress_callback=report,
+        cache=cache,
+        engine=engine,
+        grup=[job[2] for job in jobs],
+        output_files=[job[1] for job in jobs],
+        envelope=True,
+        stream=stream
+    )
+
+    summary_results = []
+    for (csv_file, output_file, _, _), (success, message) in zip(jobs, results):
+        n_students = 0
+        if success:
+            try:
+                n_students = count_students(output_file)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"No s'ha pogut llegir {output_file}: {str(e)}")
+                success, message = False, f"Error llegint {output_file}: {str(e)}"
+        summary_results.append((csv_file, output_file, success, message, n_students))
+
+    elapsed = time.perf_counter() - start
+    converted = [result for result in summary_results if result[2]]
+    n_students = sum(result[4] for result in converted)
+    n_bytes = sum(os.path.getsize(result[0]) for result in converted)
+    return {
+        'results': summary_results,
+        'skipped': skipped,
+        'converted': len(converted),
+        'failed': total - len(converted),
+        'students': n_students,
+        'bytes': n_bytes,
+        'seconds': elapsed,
+        'files_per_second': len(converted) / elapsed if elapsed else 0.0,
+        'students_per_second': n_students / elapsed if elapsed else 0.0,
+        'mb_per_second': n_bytes / (1024 * 1024) / elapsed if elapsed else 0.0
+    }
+
+
+def format_summary(summary):
+    """Return the text summary printed at the end of a batch"""
+    lines = []
+    for csv_file, output_file, success, message, _ in summary['results']:
+        lines.append(f"{'OK   ' if success else 'ERROR'} {csv_file} -> {output_file}" + ("" if success else f": {message}"))
+    for csv_file, reason in summary['skipped']:
+        lines.append(f"OMÈS {csv_file}: {reason}")
+    lines.append("")
+    lines.append(f"Fitxers convertits: {summary['converted']}, amb errors: {summary['failed']}, omesos: {len(summary['skipped'])}")
+    lines.append(f"Estudiants: {summary['students']}, dades llegides: {summary['bytes'] / (1024 * 1024):.2f} MB")
+    lines.append(
+        f"Temps: {summary['seconds']:.2f} s "
+        f"({summary['files_per_second']:.2f} fitxers/s, {summary['students_per_second']:.0f} estudiants/s, "
+        f"{summary['mb_per_second']:.2f} MB/s)"
+    )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Converteix a JSON tots els CSV d'Esfera d'un arbre de directoris de grups")
+    parser.add_argument('root_dir', help="Directori arrel amb les carpetes dels grups")
+    parser.add_argument('-o', '--output', help="Directori de sortida (per defecte, al costat de cada CSV)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Nombre de processos de conversió")
+    parser.add_argument('--engine', choices=CONVERSION_ENGINES, default='rows', help="Motor de conversió")
+    parser.add_argument('--cache', action='store_true', help="Reutilitza les conversions de fitxers sense canvis")
+    parser.add_argument('--stream', action='store_true', help="Converteix cada fitxer per blocs de files, sense carregar-lo sencer a memòria")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Mostra només el resum final")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not os.path.isdir(args.root_dir):
+        print(f"El directori no existeix: {args.root_dir}", file=sys.stderr)
+        return 2
+
+    def progress(done, total, csv_file, success, message):
+        if not args.quiet:
+            print(f"[{done}/{total}] {'OK' if success else 'ERROR'} {csv_file}", flush=True)
+
+    summary = run_batch(
+        args.root_dir,
+        output_dir=args.output,
+        workers=max(1, args.workers),
+        engine=args.engine,
+        cache=ConversionCache() if args.cache else None,
+        progress=progress,
+        stream=args.stream
+    )
+    print(format_summary(summary))
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
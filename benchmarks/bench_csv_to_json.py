@@ -0,0 +1,99 @@
+"""
+Benchmark for the CSV to JSON conversion engines.
+
+Generates synthetic Esfera exports of increasing size and times the steps
+of process_csv_to_json separately: parsing the CSV, converting the
+DataFrame to student records with every available engine (checking that
+all of them produce the same records) and serializing them to JSON. The
+speedup compares the engines on the conversion step alone, as parsing and
+serializing are shared by both.
+
+    python benchmarks/bench_csv_to_json.py --sizes 100 1000 5000 --materies 40
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.constants import MarkConfig
+from utils.csv_to_json import CONVERSION_ENGINES, dataframe_to_students, open_clean_csv, resolve_csv_schema
+
+
+def write_synthetic_csv(path, n_students, n_materies, seed=0):
+    """Write a pipe-separated Esfera-like CSV with n_students rows"""
+    rng = random.Random(seed)
+    header = ['id', 'nom_cognoms', 'numero_avaluacio']
+    for j in range(1, n_materies + 1):
+        header += [f'm{j}', f'q{j}', f'c{j}']
+    header += ['grup', 'comentari general']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('|'.join(header) + '\n')
+        for i in range(n_students):
+            row = [str(100000 + i), f'Alumne {i} Cognom{i}', '1']
+            for j in range(1, n_materies + 1):
+                if rng.random() < 0.1:
+                    row += ['', '', '']
+                else:
+                    row += [f'Matèria {j} 3r', rng.choice(MarkConfig.LIST.value), f'Comentari {i}-{j}']
+            row += ['3B', f'Comentari general {i}']
+            f.write('|'.join(row) + '\n')
+
+
+def best_time(function, repeat):
+    """Return the best wall time over repeat calls of function and its last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def read_csv(csv_file):
+    """Parse the CSV file as process_csv_to_json does"""
+    with open_clean_csv(csv_file) as cleaned_csv:
+        return pd.read_csv(cleaned_csv, sep='|', on_bad_lines='skip')
+
+
+def time_engine(df, engine, repeat):
+    """Return the best wall time of dataframe_to_students alone over repeat runs and the produced records"""
+    schema = resolve_csv_schema(df.columns)
+    return best_time(lambda: dataframe_to_students(df, engine=engine, schema=schema), repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--materies', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    columns = ['parse'] + list(CONVERSION_ENGINES) + ['json']
+    print(f"{'alumnes':>8} " + ' '.join(f"{column + ' (s)':>14}" for column in columns) + f" {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            csv_file = os.path.join(temp_dir, f'bench_{size}.csv')
+            write_synthetic_csv(csv_file, size, args.materies)
+            timings = {}
+            outputs = {}
+            timings['parse'], df = best_time(lambda: read_csv(csv_file), args.repeat)
+            for engine in CONVERSION_ENGINES:
+                timings[engine], outputs[engine] = time_engine(df, engine, args.repeat)
+            if any(students != outputs['rows'] for students in outputs.values()):
+                raise AssertionError(f"Els motors han generat registres diferents per a {size} alumnes")
+            timings['json'], _ = best_time(lambda: json.dumps(outputs['rows'], ensure_ascii=False, indent=2), args.repeat)
+            speedup = timings['rows'] / timings['columnar']
+            print(f"{size:>8} " + ' '.join(f"{timings[column]:>14.3f}" for column in columns) + f" {speedup:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
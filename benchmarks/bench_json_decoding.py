@@ -0,0 +1,87 @@
+"""
+Benchmark for the JSON decoding backends of student files.
+
+Generates synthetic group files of increasing size and times
+decode_student_file with every available backend (msgspec decoding
+validated with msgspec.convert and the stdlib json module with Python
+validation), checking that all of them produce the same students. The plain json.loads the app used before,
+without validation, is shown as a reference, followed by the time to read
+only the file header with probe_student_file.
+
+    python benchmarks/bench_json_decoding.py --sizes 100 1000 10000 --materies 40
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.constants import AppConfig, MarkConfig
+from utils.student_schema import available_backends, decode_student_file, probe_student_file
+
+
+def synthetic_file(n_students, n_materies, seed=0):
+    """Return the JSON bytes of a group file with n_students students"""
+    rng = random.Random(seed)
+    students = []
+    for i in range(n_students):
+        students.append({
+            "id": str(100000 + i),
+            "nom_cognoms": f"Alumne {i} Cognom{i}",
+            "materies": [
+                {
+                    "materia": f"Matèria {j} 3r",
+                    "qualificacio": rng.choice(MarkConfig.LIST.value),
+                    "comentari": f"Comentari {i}-{j}"
+                }
+                for j in range(1, n_materies + 1)
+            ],
+            "comentari_general": f"Comentari general {i}"
+        })
+    return json.dumps({
+        "grup": "3B",
+        "trimestre": "T1",
+        "estudiants": students,
+        "metrika_version": AppConfig.VERSION
+    }, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def best_time(function, repeat):
+    """Return the best wall time over repeat runs and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--materies', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    backends = available_backends()
+    columns = ['json.loads'] + list(backends) + [f'{backend} header' for backend in backends]
+    print(f"{'alumnes':>8} {'MB':>7} " + ' '.join(f"{name + ' (s)':>20}" for name in columns))
+    for size in args.sizes:
+        content = synthetic_file(size, args.materies)
+        timings = {}
+        outputs = {}
+        timings['json.loads'], _ = best_time(lambda: json.loads(content), args.repeat)
+        for backend in backends:
+            timings[backend], outputs[backend] = best_time(lambda: decode_student_file(content, backend), args.repeat)
+            timings[f'{backend} header'], _ = best_time(lambda: probe_student_file(content, backend), args.repeat)
+        if any(output != outputs[backends[0]] for output in outputs.values()):
+            raise AssertionError(f"Els descodificadors han generat dades diferents per a {size} alumnes")
+        print(f"{size:>8} {len(content) / (1024 * 1024):>7.2f} " + ' '.join(f"{timings[name]:>20.4f}" for name in columns))
+
+
+if __name__ == '__main__':
+    main()
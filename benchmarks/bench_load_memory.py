@@ -0,0 +1,120 @@
+"""
+Memory benchmark of the loaded student files.
+
+Generates a synthetic school (groups x trimesters JSON files), loads every
+file with the app loader (decode_data_file + parse_data_file) and reports
+the memory held by the loaded students, measured with tracemalloc. The
+baseline keeps the decoded student dictionaries with interned strings and
+the grup, trimestre and file_display_name fields copied into every student,
+as the loader did before the StudentEntry records.
+
+    python benchmarks/bench_load_memory.py --groups 30 --students 30 --materies 15
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.constants import AppConfig, MarkConfig
+from utils.string_pool import intern_value
+
+logging.disable(logging.WARNING)
+import app  # noqa: E402  (imported after silencing the Streamlit bare mode warnings)
+
+TRIMESTRES = ("T1", "T2", "T3")
+
+# Student and materia fields interned by the baseline loader
+STUDENT_FIELDS = ('id', 'nom_cognoms', 'grup', 'trimestre', 'file_display_name')
+MATERIA_FIELDS = ('materia', 'qualificacio')
+
+
+def synthetic_school(n_groups, n_students, n_materies, seed=0):
+    """Return {filename: JSON bytes} for every group and trimester"""
+    rng = random.Random(seed)
+    materies = [f"Matèria de l'àmbit {j} - {rng.choice(['1r', '2n', '3r'])} d'ESO" for j in range(n_materies)]
+    files = {}
+    for g in range(n_groups):
+        grup = f"{g // 4 + 1}{'ABCD'[g % 4]}"
+        for trimestre in TRIMESTRES:
+            students = [{
+                "id": str(100000 + g * 1000 + i),
+                "nom_cognoms": f"Alumne {i} Cognom{g}-{i}",
+                "materies": [
+                    {"materia": materia, "qualificacio": rng.choice(MarkConfig.LIST.value), "comentari": ""}
+                    for materia in materies
+                ],
+                "comentari_general": ""
+            } for i in range(n_students)]
+            files[f"{grup}_{trimestre}.json"] = json.dumps({
+                "grup": grup, "trimestre": trimestre, "estudiants": students, "metrika_version": AppConfig.VERSION
+            }, ensure_ascii=False).encode('utf-8')
+    return files
+
+
+def load_records(name, content):
+    """Students of a file as loaded by the app"""
+    return app.parse_data_file(app.decode_data_file(content, name), name)[0]
+
+
+def intern_students(students):
+    """Replace, in place, the repeated strings of student dictionaries by interned copies"""
+    for student in students:
+        for field in STUDENT_FIELDS:
+            if field in student:
+                student[field] = intern_value(student[field])
+        for materia in student.get('materies', ()):
+            for field in MATERIA_FIELDS:
+                if field in materia:
+                    materia[field] = intern_value(materia[field])
+    return students
+
+
+def load_dictionaries(name, content):
+    """Students of a file as decoded dictionaries with the file fields copied into each one"""
+    data = app.decode_data_file(content, name)
+    for student in data['estudiants']:
+        student['id'] = str(student['id'])
+        student['trimestre'] = data['trimestre']
+        student['grup'] = data['grup']
+        student['file_display_name'] = f"{data['grup']}_{data['trimestre']}"
+    return intern_students(data['estudiants'])
+
+
+def loaded_memory(files, load):
+    """Memory (bytes) held by the students of every file once loaded, and the number of students"""
+    gc.collect()
+    tracemalloc.start()
+    loaded = [load(name, content) for name, content in files.items()]
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_students = sum(len(students) for students in loaded)
+    del loaded
+    return current, n_students
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', type=int, default=30)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--materies', type=int, default=15)
+    args = parser.parse_args()
+
+    files = synthetic_school(args.groups, args.students, args.materies)
+    before, n_students = loaded_memory(files, load_dictionaries)
+    after, _ = loaded_memory(files, load_records)
+
+    print(f"Fitxers: {len(files)}, estudiants carregats: {n_students}, matèries per estudiant: {args.materies}")
+    print(f"Diccionaris: {before / (1024 * 1024):8.2f} MB ({before / n_students:7.0f} bytes/estudiant)")
+    print(f"Registres:   {after / (1024 * 1024):8.2f} MB ({after / n_students:7.0f} bytes/estudiant)")
+    print(f"Estalvi:     {(1 - after / before) * 100:7.1f} %")
+
+
+if __name__ == '__main__':
+    main()
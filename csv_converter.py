@@ -1,8 +1,7 @@
 import streamlit as st
 import os
 import logging
-from utils.csv_to_json import process_csv_to_json
-import tempfile
+from utils.csv_to_json import process_csv_to_json, SNIFF_SIZE
 from datetime import datetime
 import json
 from utils.constants import AppConfig
@@ -60,89 +59,77 @@ def main():
                 logger.error(f"El directori de destinació no existeix: {dest_dir}")
                 st.error("El directori de destinació no existeix")
                 return
+            
+            # Create a progress bar
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            
+            # Process each uploaded file
+            processed_files = []
+            for i, uploaded_file in enumerate(uploaded_files):
+                # Update progress
+                progress = (i + 1) / len(uploaded_files)
+                progress_bar.progress(progress)
+                status_text.text(f"Processant {uploaded_file.name}...")
                 
-            # Create a temporary directory to store the uploaded files
-            with tempfile.TemporaryDirectory() as temp_dir:
-                logger.debug(f"S'ha creat el directori temporal: {temp_dir}")
-                # Save uploaded files to temporary directory
-                for uploaded_file in uploaded_files:
-                    file_path = os.path.join(temp_dir, uploaded_file.name)
-                    with open(file_path, 'wb') as f:
-                        f.write(uploaded_file.getbuffer())
-                    logger.debug(f"S'ha desat el fitxer pujat a: {file_path}")
+                logger.info(f"Processant fitxer pujat {i+1}/{len(uploaded_files)}: {uploaded_file.name}")
                 
-                # Create a progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
+                # Get trimester from filename
+                trimestre = os.path.splitext(uploaded_file.name)[0]
+                logger.debug(f"Trimestre extret: {trimestre}")
                 
-                # Process each uploaded file
-                processed_files = []
-                for i, uploaded_file in enumerate(uploaded_files):
-                    # Update progress
-                    progress = (i + 1) / len(uploaded_files)
-                    progress_bar.progress(progress)
-                    status_text.text(f"Processant {uploaded_file.name}...")
-                    
-                    logger.info(f"Processant fitxer pujat {i+1}/{len(uploaded_files)}: {uploaded_file.name}")
-                    
-                    # Get trimester from filename
-                    trimestre = os.path.splitext(uploaded_file.name)[0]
-                    logger.debug(f"Trimestre extret: {trimestre}")
-                    
-                    # Define input and output paths
-                    input_csv = os.path.join(temp_dir, uploaded_file.name)
-                    output_json = os.path.join(dest_dir, f"{trimestre}.json")
-                    logger.debug(f"Entrada: {input_csv}, Sortida: {output_json}")
-                    
+                # Define the output path, the CSV is read from the uploaded file buffer
+                output_json = os.path.join(dest_dir, f"{trimestre}.json")
+                logger.debug(f"Entrada: {uploaded_file.name} (memòria), Sortida: {output_json}")
+                
+                try:
+                    # Convert CSV to JSON from memory (no temporary file, don't save to file)
+                    success, message, json_data = process_csv_to_json(uploaded_file, output_json, trimestre, save_to_file=False)
+                    if success:
+                        logger.info(f"S'ha processat amb èxit {uploaded_file.name}")
+                        processed_files.append((trimestre, json_data))
+                    else:
+                        logger.error(f"Error processant {uploaded_file.name}: {message}")
+                        st.error(f"Error processant {uploaded_file.name}: {message}")
+                except Exception as e:
+                    logger.error(f"Excepció processant {uploaded_file.name}: {str(e)}")
+                    st.error(f"Error processant {uploaded_file.name}: {str(e)}")
+                    # Show file info for debugging
                     try:
-                        # Convert CSV to JSON (store in memory, don't save to file)
-                        success, message, json_data = process_csv_to_json(input_csv, output_json, trimestre, save_to_file=False)
-                        if success:
-                            logger.info(f"S'ha processat amb èxit {uploaded_file.name}")
-                            processed_files.append((trimestre, json_data))
-                        else:
-                            logger.error(f"Error processant {uploaded_file.name}: {message}")
-                            st.error(f"Error processant {uploaded_file.name}: {message}")
-                    except Exception as e:
-                        logger.error(f"Excepció processant {uploaded_file.name}: {str(e)}")
-                        st.error(f"Error processant {uploaded_file.name}: {str(e)}")
-                        # Show file info for debugging
-                        try:
-                            with open(input_csv, 'r', encoding='utf-8') as f:
-                                first_lines = f.readlines()[:5]
-                            logger.debug(f"Primeres 5 línies de {uploaded_file.name}:")
-                            for i, line in enumerate(first_lines):
-                                logger.debug(f"Línia {i+1}: {line.strip()}")
-                            st.text(f"Primeres línies del fitxer {uploaded_file.name}:")
-                            for i, line in enumerate(first_lines):
-                                st.text(f"Línia {i+1}: {line.strip()}")
-                        except Exception as read_error:
-                            logger.error(f"No es pot llegir el fitxer per depuració: {str(read_error)}")
-                            st.error(f"No es pot llegir el fitxer per depuració: {str(read_error)}")
-                        continue
+                        first_lines = bytes(uploaded_file.getbuffer()[:SNIFF_SIZE]).decode('utf-8', errors='replace').splitlines()[:5]
+                        logger.debug(f"Primeres 5 línies de {uploaded_file.name}:")
+                        for i, line in enumerate(first_lines):
+                            logger.debug(f"Línia {i+1}: {line.strip()}")
+                        st.text(f"Primeres línies del fitxer {uploaded_file.name}:")
+                        for i, line in enumerate(first_lines):
+                            st.text(f"Línia {i+1}: {line.strip()}")
+                    except Exception as read_error:
+                        logger.error(f"No es pot llegir el fitxer per depuració: {str(read_error)}")
+                        st.error(f"No es pot llegir el fitxer per depuració: {str(read_error)}")
+                    continue
+            
+            # Clear progress indicators
+            progress_bar.empty()
+            status_text.empty()
+            
+            if processed_files:
+                logger.info(f"Conversió de pujada completada amb èxit. Processats {len(processed_files)} fitxers")
+                st.success("Conversió completada amb èxit!")
                 
-                # Clear progress indicators
-                progress_bar.empty()
-                status_text.empty()
+                # Store processed files in session state
+                st.session_state.processed_files = processed_files
+                st.session_state.show_downloads = True
                 
-                if processed_files:
-                    logger.info(f"Conversió de pujada completada amb èxit. Processats {len(processed_files)} fitxers")
-                    st.success("Conversió completada amb èxit!")
-                    
-                    # Store processed files in session state
-                    st.session_state.processed_files = processed_files
-                    st.session_state.show_downloads = True
-                    
-                    # Show the list of converted files
-                    st.subheader("Fitxers convertits:")
-                    for uploaded_file in uploaded_files:
-                        json_file = os.path.splitext(uploaded_file.name)[0] + ".json"
-                        st.write(f"✅ {uploaded_file.name} → {json_file}")
-                    
-                    st.rerun()  # Rerun to show download section
-                else:
-                    logger.warning("No s'han pogut processar cap fitxer pujat")
-                    st.error("No s'han pogut processar cap fitxer pujat")
+                # Show the list of converted files
+                st.subheader("Fitxers convertits:")
+                for uploaded_file in uploaded_files:
+                    json_file = os.path.splitext(uploaded_file.name)[0] + ".json"
+                    st.write(f"✅ {uploaded_file.name} → {json_file}")
+                
+                st.rerun()  # Rerun to show download section
+            else:
+                logger.warning("No s'han pogut processar cap fitxer pujat")
+                st.error("No s'han pogut processar cap fitxer pujat")
 
     # Show download section if there are processed files
     if st.session_state.show_downloads and st.session_state.processed_files:
@@ -0,0 +1,53 @@
+import streamlit as st
+
+
+def display_catalog(catalog):
+    """
+    Display the files stored in the catalog and their mark counts, filtered
+    by curs, grup and trimestre. Returns the id of the file selected for
+    analysis, or None when the catalog is empty.
+    """
+    files = catalog.files()
+    if files.empty:
+        st.info("El catàleg és buit. Desa-hi fitxers des de la pàgina d'estadístiques.")
+        return None
+    
+    # Filters, an empty selection keeps every value
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        cursos = st.multiselect("Curs", sorted(files['curs'].unique()), key="catalog_curs")
+    with col2:
+        grups = st.multiselect("Grup", sorted(files['grup'].unique()), key="catalog_grup")
+    with col3:
+        trimestres = st.multiselect("Trimestre", sorted(files['trimestre'].unique()), key="catalog_trimestre")
+    filters = {'curs': cursos or None, 'grup': grups or None, 'trimestre': trimestres or None}
+    
+    filtered_files = catalog.files(**filters)
+    st.subheader("Fitxers del catàleg")
+    st.dataframe(
+        filtered_files[['curs', 'grup', 'trimestre', 'filename', 'estudiants', 'metrika_version', 'ingested_at']].rename(columns={
+            'curs': 'Curs', 'grup': 'Grup', 'trimestre': 'Trimestre', 'filename': 'Fitxer',
+            'estudiants': 'Estudiants', 'metrika_version': 'Versió', 'ingested_at': 'Desat'
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+    if filtered_files.empty:
+        return None
+    
+    st.subheader("Qualificacions per grup i matèria")
+    counts = catalog.mark_counts(('curs', 'grup', 'trimestre', 'materia'), **filters)
+    st.dataframe(
+        counts.rename(columns={'curs': 'Curs', 'grup': 'Grup', 'trimestre': 'Trimestre', 'materia': 'Matèria'}),
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    st.subheader("Analitza un fitxer")
+    labels = {row.id: f"{row.curs} · {row.display_name}" for row in filtered_files.itertuples()}
+    return st.selectbox(
+        "Selecciona el fitxer",
+        list(labels),
+        format_func=lambda file_id: labels[file_id],
+        key="catalog_file"
+    )
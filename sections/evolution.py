@@ -3,22 +3,12 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from utils.constants import MarkConfig
+from utils.marks_dataset import as_marks_dataset
 
 def display_evolution_chart(students):
     """Muestra un gráfico de evolución de las notas por trimestre"""
     # Agrupar datos por trimestre y estudiante
-    evolution_data = []
-    for student in students:
-        for materia in student['materies']:
-            evolution_data.append({
-                'id': student['id'],
-                'nom': student['nom_cognoms'],
-                'trimestre': student['trimestre'],
-                'materia': materia['materia'],
-                'qualificacio': materia['qualificacio']
-            })
-    
-    df_evolution = pd.DataFrame(evolution_data)
+    df_evolution = as_marks_dataset(students).long_frame()[['id', 'nom', 'trimestre', 'materia', 'qualificacio']]
     
     # Crear gráfico de evolución
     fig = px.line(df_evolution, 
@@ -33,23 +23,14 @@ def display_evolution_chart(students):
 def display_student_evolution(students, selected_student):
     """Muestra la evolución de las notas de un estudiante específico"""
     # Filtrar datos del estudiante seleccionado
-    student_data = [s for s in students if s['nom_cognoms'] == selected_student]
-    
-    if not student_data:
+    marks = as_marks_dataset(students)
+    if selected_student not in set(marks.names):
         st.warning("No se encontraron datos para el estudiante seleccionado")
         return
     
     # Preparar datos para el gráfico
-    evolution_data = []
-    for student in student_data:
-        for materia in student['materies']:
-            evolution_data.append({
-                'trimestre': student['trimestre'],
-                'materia': materia['materia'],
-                'qualificacio': materia['qualificacio']
-            })
-    
-    df_evolution = pd.DataFrame(evolution_data)
+    df_evolution = marks.long_frame()
+    df_evolution = df_evolution[df_evolution['nom'] == selected_student][['trimestre', 'materia', 'qualificacio']]
     
     # Crear gráfico de evolución
     fig = px.line(df_evolution, 
@@ -64,17 +45,7 @@ def display_student_evolution(students, selected_student):
 def display_subject_evolution(students, selected_subject):
     """Muestra la evolución de las notas de una asignatura específica"""
     # Preparar datos para el gráfico
-    evolution_data = []
-    for student in students:
-        for materia in student['materies']:
-            evolution_data.append({
-                'trimestre': student['trimestre'],
-                'nom': student['nom_cognoms'],
-                'materia': materia['materia'],
-                'qualificacio': materia['qualificacio']
-            })
-    
-    df_evolution = pd.DataFrame(evolution_data)
+    df_evolution = as_marks_dataset(students).long_frame()[['trimestre', 'nom', 'materia', 'qualificacio']]
     
     # Get unique subjects
     all_subjects = sorted(df_evolution['materia'].unique())
@@ -120,37 +91,20 @@ def display_evolution_dashboard(students):
     """Display evolution dashboard for comparing trimester grades"""
     st.subheader("Evolució de Notes per Trimestre")
     
-    # Collect student data by trimester
-    trimester_data = []
-    
-    # Mapeo de calificaciones a valores numéricos
-    grade_map = {
-        'No assoliment': 2.5,  # Suspenso
-        'Assoliment satisfactori': 5.0,  # Aprobado Satisfactoriamente
-        'Assoliment notable': 7.5,  # Aprobado Notablemente
-        'Assoliment excel·lent': 10.0  # Aprobado Excelentemente
-    }
-    
-    for student in students:
-        if 'materies' in student:
-            for materia in student['materies']:
-                if 'materia' in materia and 'qualificacio' in materia and materia['qualificacio']:
-                    # Convertir la calificación a valor numérico
-                    valor = grade_map.get(materia['qualificacio'], 0)
-                    trimester_data.append({
-                        'Alumne': student['nom_cognoms'],
-                        'Materia': materia['materia'],
-                        'Trimestre': student['trimestre'],
-                        'Valor': valor,
-                        'Qualificacio': materia['qualificacio']
-                    })
-    
-    if not trimester_data:
+    # Collect the qualified marks by trimester, as numeric values (NA=2.5 ... AE=10, others 0)
+    marks = as_marks_dataset(students).long_frame(min_code=1)
+    
+    if marks.empty:
         st.warning("No hi ha dades disponibles per visualitzar l'evolució")
         return
     
-    # Convert to DataFrame
-    df = pd.DataFrame(trimester_data)
+    df = pd.DataFrame({
+        'Alumne': marks['nom'],
+        'Materia': marks['materia'],
+        'Trimestre': marks['trimestre'],
+        'Valor': marks['valor'].fillna(0.0),
+        'Qualificacio': marks['qualificacio']
+    })
     
     # Check if we have at least two trimesters
     if len(df['Trimestre'].unique()) < 2:
@@ -7,6 +7,8 @@ from reportlab.lib.units import inch
 import plotly.io as pio
 import pandas as pd
 from utils.constants import MarkConfig
+from utils.failures import FailureSummary
+from utils.marks_dataset import as_marks_dataset, label_counts
 from reportlab.platypus.flowables import KeepTogether
 import openai
 from collections import defaultdict
@@ -126,15 +128,16 @@ def create_pdf_report(students, output_path="informe.pdf"):
     elements.append(Paragraph("Estadístiques del Grup", styles['Heading2']))
     elements.append(Spacer(1, 12))
     
-    # Add group statistics pie chart
-    fig = create_group_statistics_chart(students)
+    # Add group statistics pie chart, the charts share the mark counts of one dataset
+    marks = as_marks_dataset(students)
+    fig = create_group_statistics_chart(marks)
     img_data = pio.to_image(fig, format='png')
     img = Image(io.BytesIO(img_data), width=6*inch, height=4*inch)
     elements.append(img)
     elements.append(Spacer(1, 20))
     
     # Add failure table
-    failure_data = create_failure_table(students)
+    failure_data = create_failure_table(marks)
     elements.append(Paragraph("Resum de Suspensos per Alumne", styles['Heading2']))
     elements.append(Spacer(1, 12))
     
@@ -182,12 +185,8 @@ def create_pdf_report(students, output_path="informe.pdf"):
     elements.append(Paragraph("Estadístiques per Assignatura", styles['Heading2']))
     elements.append(Spacer(1, 12))
     
-    # Get all subjects
-    all_subjects = set()
-    for student in students:
-        for materia in student['materies']:
-            if '3r' in materia['materia']:
-                all_subjects.add(materia['materia'])
+    # Get all subjects of 3r
+    all_subjects = marks.materies[marks.materia_mask(['3r'])].tolist()
     
     if not all_subjects:
         elements.append(Paragraph("No s'han trobat assignatures de 3r", styles['Heading3']))
@@ -201,7 +200,7 @@ def create_pdf_report(students, output_path="informe.pdf"):
         elements.append(Spacer(1, 12))
         
         # Create subject statistics chart
-        fig = create_subject_statistics_chart(students, subject)
+        fig = create_subject_statistics_chart(marks, subject)
         img_data = pio.to_image(fig, format='png')
         img = Image(io.BytesIO(img_data), width=6*inch, height=4*inch)
         elements.append(img)
@@ -273,22 +272,8 @@ def create_group_statistics_chart(students):
     """Create a pie chart for group statistics"""
     import plotly.graph_objects as go
     
-    # Count marks
-    mark_counts = {
-        MarkConfig.NA.value: 0,
-        MarkConfig.AS.value: 0,
-        MarkConfig.AN.value: 0,
-        MarkConfig.AE.value: 0
-    }
-    
-    for student in students:
-        for materia in student['materies']:
-            qualificacio = materia['qualificacio']
-            if qualificacio in mark_counts:
-                mark_counts[qualificacio] += 1
-    
-    # Filter out marks with zero count
-    filtered_counts = {k: v for k, v in mark_counts.items() if v > 0}
+    # Count marks, without zero counts
+    filtered_counts = label_counts(as_marks_dataset(students).mark_counts())
     
     # Create pie chart
     fig = go.Figure(data=[go.Pie(
@@ -310,58 +295,15 @@ def create_group_statistics_chart(students):
 
 def create_failure_table(students):
     """Create failure statistics table data"""
-    categories = {
-        "Tot aprovat": [],
-        "Fins a 3 susp.": [],
-        "4 o 5 susp.": [],
-        "Més de 5 susp.": []
-    }
-    
-    for student in students:
-        n_susp = sum(1 for m in student['materies'] if m['qualificacio'] == MarkConfig.NA.value)
-        name = student['nom_cognoms']
-        if n_susp == 0:
-            categories["Tot aprovat"].append(name)
-        elif 1 <= n_susp <= 3:
-            categories["Fins a 3 susp."].append(name)
-        elif 4 <= n_susp <= 5:
-            categories["4 o 5 susp."].append(name)
-        else:
-            categories["Més de 5 susp."].append(name)
-    
-    total = len(students)
-    data = []
-    for cat, names in categories.items():
-        data.append({
-            "Categoria": cat,
-            "Nº d'alumnes": len(names),
-            "%": f"{(len(names)/total*100):.1f}%",
-            "Alumnes": '; '.join(names)
-        })
-    
-    return data
+    return FailureSummary(as_marks_dataset(students)).rows()
 
 def create_subject_statistics_chart(students, subject):
     """Create a pie chart for subject statistics"""
     import plotly.graph_objects as go
     
-    # Count marks for the selected subject
-    mark_counts = {
-        MarkConfig.NA.value: 0,
-        MarkConfig.AS.value: 0,
-        MarkConfig.AN.value: 0,
-        MarkConfig.AE.value: 0
-    }
-    
-    for student in students:
-        for materia in student['materies']:
-            if materia['materia'] == subject:
-                mark = materia['qualificacio']
-                if mark in mark_counts:
-                    mark_counts[mark] += 1
-    
-    # Filter out marks with zero count
-    filtered_counts = {k: v for k, v in mark_counts.items() if v > 0}
+    # Count marks for the selected subject, without zero counts
+    marks = as_marks_dataset(students)
+    filtered_counts = label_counts(marks.mark_counts([marks.materia_index[subject]]))
     
     # Create pie chart
     fig = go.Figure(data=[go.Pie(
@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+from utils.subject_catalog import SubjectCatalog
 
 def display_student_marks(selected_student_data):
     """Display student marks in a filtered and sorted table"""
@@ -34,7 +35,7 @@ def display_student_marks(selected_student_data):
         selected_courses.append("3r")
     
     if selected_courses:
-        mask = df['Materia'].str.contains('|'.join(selected_courses), case=False, na=False)
+        mask = SubjectCatalog(df['Materia']).mask(selected_courses, case=False)
         df = df[mask]
     
     # Sort subjects alphabetically
@@ -1,39 +1,32 @@
 import streamlit as st
+from utils.constants import MarkConfig
+from utils.marks_dataset import MARK_CODES, MARK_LABELS, MARK_VALUES, as_marks_dataset, count_codes, encode_marks
 
 def display_student_selector(students):
     """Display the student selector dropdown and return the selected student data"""
     # Create a list of student names for the dropdown
-    student_names = [f"{student['nom_cognoms']} ({student['id']})" for student in students]
+    marks = as_marks_dataset(students)
+    records = [marks.record(s) for s in range(len(marks))]
+    student_names = [f"{student['nom_cognoms']} ({student['id']})" for student in records]
     
-    # Create the dropdown
-    selected_student = st.selectbox(
+    # Create the dropdown, students are picked by row so that repeated ids stay apart
+    selected_row = st.selectbox(
         "Selecciona un alumne:",
-        student_names,
+        range(len(records)),
+        format_func=student_names.__getitem__,
         key="student_selector"
     )
     
     # Get the selected student's data
-    student_id = selected_student.split("(")[-1].strip(")")
-    selected_student_data = next(student for student in students if str(student['id']) == student_id)
+    selected_student_data = records[selected_row]
     
-    # Calculate average grade
-    mark_to_value = {
-        "No assoliment": 2.5,
-        "Assoliment satisfactori": 5,
-        "Assoliment notable": 7.5,
-        "Assoliment excel·lent": 10
-    }
+    # Get the codes of all evaluated subjects (excluding non-evaluated ones)
+    codes = encode_marks(subject['qualificacio'] for subject in selected_student_data['materies'])
+    evaluated_codes = codes[(codes >= MARK_CODES[MarkConfig.NA.value]) & (codes <= MARK_CODES[MarkConfig.AE.value])]
     
-    # Get all evaluated subjects (excluding non-evaluated ones)
-    evaluated_subjects = [
-        subject for subject in selected_student_data['materies']
-        if subject['qualificacio'] in mark_to_value
-    ]
-    
-    if evaluated_subjects:
-        # Calculate average
-        total_value = sum(mark_to_value[subject['qualificacio']] for subject in evaluated_subjects)
-        average = total_value / len(evaluated_subjects)
+    if evaluated_codes.size:
+        # Calculate average grade
+        average = MARK_VALUES[evaluated_codes].mean()
                 
         # Display average grade in a dashboard style
         st.subheader("Nota Mitjana")
@@ -49,13 +42,10 @@ def display_student_selector(students):
             )
         
         with col2:
-            # Calculate percentage of each grade
-            grade_counts = {grade: 0 for grade in mark_to_value.keys()}
-            for subject in evaluated_subjects:
-                grade_counts[subject['qualificacio']] += 1
-            
-            # Find most common grade
-            most_common = max(grade_counts.items(), key=lambda x: x[1])
+            # Find most common grade (the lowest one on ties)
+            grade_counts = count_codes(evaluated_codes)
+            most_common_code = max(MARK_CODES.values(), key=lambda code: grade_counts[code])
+            most_common = (MARK_LABELS[most_common_code], int(grade_counts[most_common_code]))
             
             # Determine color based on most common grade
             delta_color = "inverse" if most_common[0] == "No assoliment" else "normal"
@@ -69,11 +59,8 @@ def display_student_selector(students):
         
         with col3:
             # Calculate pass rate (AS, AN, AE)
-            pass_count = sum(1 for subject in evaluated_subjects 
-                           if subject['qualificacio'] in ["Assoliment satisfactori", 
-                                                        "Assoliment notable", 
-                                                        "Assoliment excel·lent"])
-            pass_rate = (pass_count / len(evaluated_subjects)) * 100
+            pass_count = int((evaluated_codes >= MARK_CODES[MarkConfig.AS.value]).sum())
+            pass_rate = (pass_count / evaluated_codes.size) * 100
             
             # Determine color based on most common grade
             delta_color = "inverse" if most_common[0] == "No assoliment" else "normal"
@@ -81,7 +68,7 @@ def display_student_selector(students):
             st.metric(
                 label="Taxa d'aprovat",
                 value=f"{pass_rate:.1f}%",
-                delta=f"{pass_count}/{len(evaluated_subjects)} assignatures",
+                delta=f"{pass_count}/{evaluated_codes.size} assignatures",
                 delta_color=delta_color
             )
     
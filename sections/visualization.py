@@ -2,9 +2,21 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from utils.constants import DataConfig, MarkConfig
+from utils.marks_dataset import MARK_CODES, MARK_LABELS, as_marks_dataset, count_codes, encode_marks, label_counts
+from utils.failures import FailureSummary
+from utils.ranking import bottom_k, ranking_frame, top_k
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Students highlighted at the top and at the bottom of the ranking
+RANKING_HIGHLIGHT = 5
+
+# Students per heatmap tile, larger groups are shown one tile at a time
+HEATMAP_TILE_ROWS = 200
+
+# Mark code shown on hover for each heatmap value 0-3, N/A for empty cells
+HEATMAP_HOVER_CODES = np.array(["NA", "AS", "AN", "AE", "N/A"], dtype=object)
+
 
 def show_classroom_table(data:pd.DataFrame, title:str=None):
     with st.expander(f"Tabla global clase ({title})"):
@@ -190,31 +202,9 @@ def show_student_evolution(data1:pd.DataFrame, data2:pd.DataFrame, student_name:
 
 def display_marks_pie_chart(student_data):
     """Display a pie chart of the student's marks by qualification level"""
-    # Initialize counters for each qualification level
-    qualification_counts = {
-        "": 0,
-        MarkConfig.NA.value: 0,
-        MarkConfig.AS.value: 0,
-        MarkConfig.AN.value: 0,
-        MarkConfig.AE.value: 0
-    }
-
-    # Count subjects by qualification level
-    for materia in student_data['materies']:
-        qualificacio = materia['qualificacio']
-        if qualificacio == MarkConfig.NA.value:
-            qualification_counts[MarkConfig.NA.value] += 1
-        elif qualificacio == MarkConfig.AS.value:
-            qualification_counts[MarkConfig.AS.value] += 1
-        elif qualificacio == MarkConfig.AN.value:
-            qualification_counts[MarkConfig.AN.value] += 1
-        elif qualificacio == MarkConfig.AE.value:
-            qualification_counts[MarkConfig.AE.value] += 1
-        else:
-            qualification_counts[""] += 1
-
-    # Filter out empty values
-    filtered_counts = {k: v for k, v in qualification_counts.items() if k != "" and v > 0}
+    # Count subjects by qualification level, without empty values
+    codes = encode_marks(materia['qualificacio'] for materia in student_data['materies'])
+    filtered_counts = label_counts(count_codes(codes))
 
     # Create the pie chart
     fig = go.Figure(data=[go.Pie(
@@ -243,23 +233,9 @@ def display_marks_pie_chart(student_data):
 
 def display_group_statistics(students):
     """Display statistics for the entire group"""
-    # Initialize counters for each qualification level
-    qualification_counts = {
-        MarkConfig.NA.value: 0,
-        MarkConfig.AS.value: 0,
-        MarkConfig.AN.value: 0,
-        MarkConfig.AE.value: 0
-    }
-
-    # Count all marks across all students and subjects
-    for student in students:
-        for materia in student['materies']:
-            qualificacio = materia['qualificacio']
-            if qualificacio in qualification_counts:
-                qualification_counts[qualificacio] += 1
-
-    # Filter out empty values
-    filtered_counts = {k: v for k, v in qualification_counts.items() if v > 0}
+    # Count all marks across all students and subjects, without empty values
+    marks = as_marks_dataset(students)
+    filtered_counts = label_counts(marks.mark_counts())
 
     # Create the pie chart
     fig = go.Figure(data=[go.Pie(
@@ -284,37 +260,12 @@ def display_group_statistics(students):
 
 
 def group_failure_table(students):
-    if not students:
+    marks = as_marks_dataset(students)
+    if not len(marks):
         st.info("No hi ha estudiants per mostrar en aquesta taula.")
         return
         
-    categories = {
-        "Tot aprovat": [],
-        "Fins a 3 susp.": [],
-        "4 o 5 susp.": [],
-        "Més de 5 susp.": []
-    }
-    for student in students:
-        n_susp = sum(1 for m in student['materies'] if m['qualificacio'] == MarkConfig.NA.value)
-        name = student['nom_cognoms']
-        if n_susp == 0:
-            categories["Tot aprovat"].append(name)
-        elif 1 <= n_susp <= 3:
-            categories["Fins a 3 susp."].append(name)
-        elif 4 <= n_susp <= 5:
-            categories["4 o 5 susp."].append(name)
-        else:
-            categories["Més de 5 susp."].append(name)
-    total = len(students)
-    data = []
-    for cat, names in categories.items():
-        percentage = f"{(len(names)/total*100):.1f}%" if total > 0 else "0.0%"
-        data.append({
-            "Categoria": cat,
-            "Nº d'alumnes": len(names),
-            "%": percentage,
-            "Alumnes": '; '.join(names)
-        })
+    data = FailureSummary(marks).rows()
     st.subheader("Resum de suspensos per alumne")
     col1, col2 = st.columns(2)
     with col1:
@@ -359,25 +310,15 @@ def display_subjects_bar_chart(students):
     if third_year:
         selected_courses.append("3r")
 
-    # Obtener todas las materies filtradas por curso
-    all_subjects = set()
-    for student in students:
-        for m in student['materies']:
-            if any(c in m['materia'] for c in selected_courses):
-                all_subjects.add(m['materia'])
-    all_subjects = sorted(list(all_subjects))
-
-    # Contar NA, AS, AN, AE por materia
-    data = []
-    for subject in all_subjects:
-        counts = {k: 0 for k in [MarkConfig.NA.value, MarkConfig.AS.value, MarkConfig.AN.value, MarkConfig.AE.value]}
-        for student in students:
-            for m in student['materies']:
-                if m['materia'] == subject and any(c in m['materia'] for c in selected_courses):
-                    if m['qualificacio'] in counts:
-                        counts[m['qualificacio']] += 1
-        for mark, count in counts.items():
-            data.append({"Assignatura": subject, "Qualificació": mark, "Comptador": count})
+    # Contar NA, AS, AN, AE por materia filtrada por curso
+    marks = as_marks_dataset(students)
+    subject_mask = marks.materia_mask(selected_courses)
+    subject_counts = marks.materia_mark_counts(subject_mask)
+    data = [
+        {"Assignatura": subject, "Qualificació": MARK_LABELS[code], "Comptador": int(counts[code])}
+        for subject, counts in zip(marks.materies[subject_mask], subject_counts)
+        for code in MARK_CODES.values()
+    ]
 
     df = pd.DataFrame(data)
     if not df.empty:
@@ -397,43 +338,24 @@ def display_subjects_bar_chart(students):
 
 def display_student_ranking(students):
     st.subheader("Ranking d'alumnes per mitjana numèrica (NA=2.5, AS=5, AN=7.5, AE=10)")
-    mark_to_value = {
-        "No assoliment": 2.5,
-        "Assoliment satisfactori": 5,
-        "Assoliment notable": 7.5,
-        "Assoliment excel·lent": 10
-    }
-    ranking = []
-    for student in students:
-        values = [
-            mark_to_value[m['qualificacio']]
-            for m in student['materies']
-            if m['qualificacio'] in mark_to_value
-        ]
-        if values:
-            avg = sum(values) / len(values)
-            avg_10 = float(f"{avg:.2g}")
-        else:
-            avg_10 = "N/A"
-        ranking.append({
-            "Alumne": student['nom_cognoms'],
-            "Mitjana (0-10)": avg_10
-        })
-    # Ordenar de mayor a menor media
-    ranking = sorted(ranking, key=lambda x: (x["Mitjana (0-10)"] if x["Mitjana (0-10)"] != "N/A" else -1), reverse=True)
-    df = pd.DataFrame(ranking)
-    def highlight_top_bottom(col):
-        colors = [''] * len(col)
-        # Solo filas con valor numérico
-        numeric_idx = [i for i, v in enumerate(col) if isinstance(v, (int, float))]
-        # Top 5 verde oscuro con texto negro
-        for i in numeric_idx[:5]:
-            colors[i] = 'background-color: #218739; color: black'  # verde oscuro
-        # Bottom 5 rojo claro con texto negro
-        for i in numeric_idx[-5:]:
-            colors[i] = 'background-color: #ffb3b3; color: black'
-        return colors
-    styled_df = df.style.apply(highlight_top_bottom, subset=['Mitjana (0-10)'])
+    marks = as_marks_dataset(students)
+    ranking = ranking_frame(marks)
+    df = pd.DataFrame({
+        "Alumne": ranking['nom'],
+        "Mitjana (0-10)": ranking['mitjana'].round(1),
+        "Percentil": ranking['percentil'].round(0)
+    })
+    # Several groups: show the group of each student
+    if len(marks.groups) > 1:
+        df.insert(1, "Grup", ranking['grup'])
+
+    # Top 5 verde oscuro y bottom 5 rojo claro, con texto negro (solo filas con media)
+    colors = np.full(len(df), '', dtype=object)
+    colors[top_k(ranking['mitjana'], RANKING_HIGHLIGHT)] = 'background-color: #218739; color: black'
+    colors[bottom_k(ranking['mitjana'], RANKING_HIGHLIGHT)] = 'background-color: #ffb3b3; color: black'
+    styled_df = df.style.apply(lambda col: colors, subset=['Mitjana (0-10)']).format(
+        {"Mitjana (0-10)": "{:.1f}", "Percentil": "{:.0f}"}, na_rep="N/A"
+    )
     st.dataframe(styled_df, hide_index=True, use_container_width=True)
 
 
@@ -458,67 +380,58 @@ def display_student_subject_heatmap(students):
     if third_year:
         selected_courses.append("3r")
 
-    # Get all subjects for selected courses
-    all_subjects = set()
-    for student in students:
-        for m in student['materies']:
-            if any(c in m['materia'] for c in selected_courses):
-                all_subjects.add(m['materia'])
-    all_subjects = sorted(list(all_subjects))
-
-    # Create matrix of marks
-    matrix_data = []
-    for student in students:
-        row = {'Alumne': student['nom_cognoms']}
-        for subject in all_subjects:
-            # Find the mark for this subject
-            mark = next((m['qualificacio'] for m in student['materies'] if m['materia'] == subject), None)
-            if mark:
-                # Convert mark to numeric value for heatmap
-                if mark == MarkConfig.NA.value:
-                    row[subject] = 0
-                elif mark == MarkConfig.AS.value:
-                    row[subject] = 1
-                elif mark == MarkConfig.AN.value:
-                    row[subject] = 2
-                elif mark == MarkConfig.AE.value:
-                    row[subject] = 3
-                else:
-                    row[subject] = None
-            else:
-                row[subject] = None
-        matrix_data.append(row)
-
-    # Create DataFrame
-    df = pd.DataFrame(matrix_data)
-    df = df.set_index('Alumne')
+    # Create matrix of marks for the subjects of the selected courses:
+    # NA, AS, AN, AE become 0-3 and anything else is empty
+    marks = as_marks_dataset(students)
+    subject_mask = marks.materia_mask(selected_courses)
+    codes, positions = marks.marks_matrix()
+    codes = codes[:, subject_mask]
+    mark_codes = (codes >= MARK_CODES[MarkConfig.NA.value]) & (codes <= MARK_CODES[MarkConfig.AE.value])
+    matrix = np.where(mark_codes, codes - 1, np.nan)
+
     # Sort by alumne alphabetically
-    df = df.sort_index(key=lambda x: x.str.lower())
+    names = marks.names[positions]
+    order = np.argsort(np.char.lower(names.astype(str)), kind='stable')
+    matrix, names = matrix[order], names[order]
+    subjects = marks.materies[subject_mask]
+
+    # Large groups are shown in tiles of HEATMAP_TILE_ROWS students
+    if len(names) > HEATMAP_TILE_ROWS:
+        starts = range(0, len(names), HEATMAP_TILE_ROWS)
+        start = st.selectbox(
+            "Alumnes",
+            starts,
+            format_func=lambda start: f"{start + 1}-{min(start + HEATMAP_TILE_ROWS, len(names))} de {len(names)}",
+            key="heatmap_tile"
+        )
+        matrix, names = matrix[start:start + HEATMAP_TILE_ROWS], names[start:start + HEATMAP_TILE_ROWS]
 
-    # Create heatmap
+    # Create heatmap, the hover shows the short mark code (customdata) of each value 0-3
     fig = go.Figure(data=go.Heatmap(
-        z=df.values,
-        x=df.columns,
-        y=df.index,
+        z=matrix,
+        x=subjects,
+        y=names,
+        customdata=HEATMAP_HOVER_CODES[np.where(np.isnan(matrix), 4, matrix).astype(np.intp)],
+        hovertemplate="%{y}<br>%{x}: %{customdata}<extra></extra>",
         colorscale=[
             [0, MarkConfig.COLOR_MAP.value[MarkConfig.NA.value]],  # NA
             [0.33, MarkConfig.COLOR_MAP.value[MarkConfig.AS.value]],  # AS
             [0.66, MarkConfig.COLOR_MAP.value[MarkConfig.AN.value]],  # AN
             [1, MarkConfig.COLOR_MAP.value[MarkConfig.AE.value]]  # AE
         ],
+        zmin=0,
+        zmax=3,
         colorbar=dict(
             title="Qualificació",
-            ticktext=["NA", "AS", "AN", "AE"],
+            ticktext=HEATMAP_HOVER_CODES[:4].tolist(),
             tickvals=[0, 1, 2, 3]
         ),
-        hoverongaps=False,
-        hoverinfo='text',
-        text=[[{0: MarkConfig.NA.value, 1: MarkConfig.AS.value, 2: MarkConfig.AN.value, 3: MarkConfig.AE.value}.get(val, "N/A") for val in row] for row in df.values]
+        hoverongaps=False
     ))
 
     # Update layout
     fig.update_layout(
-        height=max(400, len(students) * 25),  # Adjust height based on number of students
+        height=max(400, len(names) * 25),  # Adjust height based on number of students
         xaxis_title="Assignatures",
         yaxis_title="Alumnes",
         xaxis={'tickangle': 45},
@@ -550,11 +463,8 @@ def display_subject_statistics(students):
         selected_courses.append("3r")
     
     # Get unique subjects filtered by selected courses
-    all_subjects = set()
-    for student in students:
-        for materia in student['materies']:
-            if any(c in materia['materia'] for c in selected_courses):
-                all_subjects.add(materia['materia'])
+    marks = as_marks_dataset(students)
+    all_subjects = marks.materies[marks.materia_mask(selected_courses)].tolist()
     
     if not all_subjects:
         st.info("Selecciona almenys un curs per veure les assignatures.")
@@ -563,37 +473,26 @@ def display_subject_statistics(students):
     # Subject selector
     selected_subject = st.selectbox(
         "Selecciona una assignatura",
-        sorted(list(all_subjects)),
+        all_subjects,
         key="subject_selector"
     )
     
     st.subheader(f"Estadístiques de {selected_subject}")
     
-    # Count marks for the selected subject
-    mark_counts = {
-        MarkConfig.NA.value: 0,
-        MarkConfig.AS.value: 0,
-        MarkConfig.AN.value: 0,
-        MarkConfig.AE.value: 0
-    }
+    # Count marks for the selected subject, without zero counts
+    subject = marks.materia_index[selected_subject]
+    filtered_counts = label_counts(marks.mark_counts([subject]))
     
-    # Collect comments
+    # Collect comments of every entry of the subject, repeated entries included
     comments_data = []
-    
-    for student in students:
-        for materia in student['materies']:
-            if materia['materia'] == selected_subject:
-                mark = materia['qualificacio']
-                if mark in mark_counts:
-                    mark_counts[mark] += 1
-                comments_data.append({
-                    'Alumne': student['nom_cognoms'],
-                    'Qualificació': mark,
-                    'Comentari': materia['comentari']
-                })
-    
-    # Filter out marks with zero count
-    filtered_counts = {k: v for k, v in mark_counts.items() if v > 0}
+    students_of_cells, subjects_of_cells, _ = marks.cells
+    for cell in np.flatnonzero(subjects_of_cells == subject):
+        materia = marks.cell_details[cell]
+        comments_data.append({
+            'Alumne': marks.names[students_of_cells[cell]],
+            'Qualificació': materia['qualificacio'],
+            'Comentari': materia['comentari']
+        })
     
     # Create pie chart
     fig = go.Figure(data=[go.Pie(
@@ -0,0 +1,97 @@
+"""
+Tests for the headless batch conversion of directory trees
+"""
+import pytest
+import json
+import os
+from unittest.mock import patch
+
+from batch_convert import find_csv_files, plan_jobs, run_batch, format_summary, main
+from utils.constants import AppConfig
+from utils.conversion_cache import ConversionCache
+
+
+@pytest.fixture
+def school_tree(temp_test_dir, sample_csv_data):
+    """Two group folders with trimester CSV files and one unrelated CSV"""
+    root = os.path.join(temp_test_dir, "esfera")
+    for grup, names in [("3A", ["3A_1r.csv", "3A_2n.csv"]), (os.path.join("ESO", "4B"), ["4B_1r.csv", "notes.csv"])]:
+        os.makedirs(os.path.join(root, grup))
+        for name in names:
+            with open(os.path.join(root, grup, name), 'w', encoding='utf-8') as f:
+                f.write(sample_csv_data)
+    return root
+
+
+class TestBatchConvert:
+    """Test scanning, planning and converting a directory tree"""
+    
+    def test_plan_jobs(self, school_tree, temp_test_dir):
+        """Test grup, trimestre and output path of every CSV"""
+        output_dir = os.path.join(temp_test_dir, "json")
+        jobs, skipped = plan_jobs(find_csv_files(school_tree), school_tree, output_dir)
+        
+        assert [(grup, trimestre) for _, _, grup, trimestre in jobs] == [("3A", "T1"), ("3A", "T2"), ("4B", "T1")]
+        assert jobs[2][1] == os.path.join(output_dir, "ESO", "4B", "T1.json")
+        assert [os.path.basename(csv_file) for csv_file, _ in skipped] == ["notes.csv"]
+    
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_run_batch_writes_envelopes(self, school_tree, workers):
+        """Test that every trimester file is written with the app file structure"""
+        summary = run_batch(school_tree, workers=workers)
+        
+        assert summary['converted'] == 3 and summary['failed'] == 0
+        assert summary['students'] > 0 and summary['students_per_second'] > 0
+        with open(os.path.join(school_tree, "ESO", "4B", "T1.json"), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        assert data['grup'] == "4B"
+        assert data['trimestre'] == "T1"
+        assert data['metrika_version'] == AppConfig.VERSION
+        assert len(data['estudiants']) * 3 == summary['students']
+        assert "Fitxers convertits: 3" in format_summary(summary)
+    
+    def test_run_batch_stream(self, school_tree, temp_test_dir):
+        """Test that a streamed batch writes the same files"""
+        output_dir = os.path.join(temp_test_dir, "json")
+        summary = run_batch(school_tree, output_dir=output_dir, stream=True)
+        run_batch(school_tree)
+        
+        assert summary['converted'] == 3 and summary['failed'] == 0
+        for _, output_file, _, _, _ in summary['results']:
+            with open(output_file, 'r', encoding='utf-8') as streamed, open(os.path.join(school_tree, os.path.relpath(output_file, output_dir)), 'r', encoding='utf-8') as converted:
+                assert streamed.read() == converted.read()
+    
+    def test_run_batch_with_cache(self, school_tree, temp_test_dir):
+        """Test that a second batch is served from the cache"""
+        cache = ConversionCache(os.path.join(temp_test_dir, "cache"))
+        first = run_batch(school_tree, cache=cache)
+        second = run_batch(school_tree, cache=cache)
+        
+        assert second['students'] == first['students']
+        assert all("memòria cau" in message for _, _, _, message, _ in second['results'])
+    
+    def test_cache_key_error_does_not_stop_the_batch(self, school_tree, temp_test_dir):
+        """Test that a file whose cache key cannot be computed is converted without the cache"""
+        cache = ConversionCache(os.path.join(temp_test_dir, "cache"))
+        run_batch(school_tree, cache=cache)
+        make_key = cache.make_key
+        
+        def failing_make_key(csv_file, options):
+            if csv_file.endswith("3A_2n.csv"):
+                raise OSError("Permission denied")
+            return make_key(csv_file, options)
+        
+        with patch.object(cache, 'make_key', side_effect=failing_make_key):
+            summary = run_batch(school_tree, cache=cache)
+        
+        assert summary['converted'] == 3 and summary['failed'] == 0
+        messages = {os.path.basename(csv_file): message for csv_file, _, _, message, _ in summary['results']}
+        assert "memòria cau" not in messages["3A_2n.csv"]
+        assert "memòria cau" in messages["4B_1r.csv"]
+    
+    def test_main_exit_codes(self, school_tree, temp_test_dir, capsys):
+        """Test the command line entry point"""
+        assert main([school_tree, "--quiet", "--workers", "1"]) == 0
+        assert main([school_tree, "--quiet", "--workers", "1", "--stream"]) == 0
+        assert "estudiants/s" in capsys.readouterr().out
+        assert main([os.path.join(temp_test_dir, "missing")]) == 2
@@ -0,0 +1,198 @@
+"""
+Tests for the SQLite catalog of student files
+"""
+import pytest
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from unittest.mock import patch
+
+import app
+from app import load_json_files
+from utils.catalog import StudentCatalog, current_school_year
+
+
+def file_info(grup, trimestre):
+    return {'display_name': f"{grup}_{trimestre}", 'grup': grup, 'trimestre': trimestre, 'version': '1.0.0'}
+
+
+def loaded_students(grup, trimestre, students):
+    """Students as returned by the app loaders"""
+    return [
+        {**student, 'trimestre': trimestre, 'grup': grup, 'file_display_name': f"{grup}_{trimestre}"}
+        for student in students
+    ]
+
+
+@pytest.fixture
+def catalog(temp_test_dir):
+    with StudentCatalog(os.path.join(temp_test_dir, "catalog.sqlite3")) as catalog:
+        yield catalog
+
+
+class TestStudentCatalog:
+    """Test storing and querying files"""
+    
+    def test_round_trip(self, catalog, sample_students_data):
+        """Test that stored students are loaded back unchanged"""
+        sample_students_data[0]['comentari_general'] = "Bon trimestre"
+        students = loaded_students("3B", "T1", sample_students_data)
+        
+        file_id = catalog.ingest("T1.json", file_info("3B", "T1"), students, "hash1", "2024-25", ["avís"])
+        
+        assert catalog.load_students([file_id]) == students
+        info, warnings = catalog.file_info(file_id)
+        assert info == {**file_info("3B", "T1"), 'content_hash': "hash1"}
+        assert warnings == ["avís"]
+    
+    def test_ingest_deduplicates_and_replaces(self, catalog, sample_students_data):
+        """Test that the same content is stored once and a new version replaces the old one"""
+        students = loaded_students("3B", "T1", sample_students_data)
+        first = catalog.ingest("T1.json", file_info("3B", "T1"), students, "hash1", "2024-25")
+        
+        assert catalog.ingest("T1.json", file_info("3B", "T1"), students, "hash1", "2024-25") == first
+        assert catalog.find_file("hash1") == first
+        
+        second = catalog.ingest("T1.json", file_info("3B", "T1"), students[:1], "hash2", "2024-25")
+        files = catalog.files()
+        assert files['id'].tolist() == [second]
+        assert files['estudiants'].tolist() == [1]
+        assert catalog.find_file("hash1") is None
+    
+    def test_files_are_replaced_by_file_name(self, catalog, sample_students_data):
+        """Test that different files of the same grup and trimestre are kept apart"""
+        students = loaded_students("Grup Antic", "T1", sample_students_data)
+        catalog.ingest("a/T1.json", file_info("Grup Antic", "T1"), students, "hash1", "2024-25")
+        second = catalog.ingest("b/T1.json", file_info("Grup Antic", "T1"), students[:1], "hash2", "2024-25")
+        
+        third = catalog.ingest("a/T1.json", file_info("Grup Antic", "T1"), students[1:], "hash3", "2024-25")
+        
+        assert sorted(catalog.files()['id'].tolist()) == sorted([second, third])
+        assert catalog.find_file("hash1") is None
+        assert catalog.load_students([second]) == students[:1]
+        assert catalog.load_students([third]) == students[1:]
+    
+    def test_repeated_materia_comments(self, catalog, sample_students_data):
+        """Test that every entry of a repeated materia keeps its own comment"""
+        sample_students_data[0]['materies'].append(
+            {"materia": "Matemàtiques", "qualificacio": "No assoliment", "comentari": "Segona avaluació"}
+        )
+        students = loaded_students("3B", "T1", sample_students_data)
+        
+        file_id = catalog.ingest("T1.json", file_info("3B", "T1"), students, "hash1", "2024-25")
+        
+        materies = catalog.load_students([file_id])[0]['materies']
+        assert [m['comentari'] for m in materies] == [m['comentari'] for m in sample_students_data[0]['materies']]
+    
+    def test_old_catalog_is_upgraded(self, temp_test_dir):
+        """Test that a catalog keyed by curs, grup and trimestre keeps its students and takes the new key"""
+        path = os.path.join(temp_test_dir, "antic.sqlite3")
+        connection = sqlite3.connect(path)
+        connection.executescript("""
+            CREATE TABLE files (id INTEGER PRIMARY KEY, curs TEXT NOT NULL, grup TEXT NOT NULL, trimestre TEXT NOT NULL,
+                filename TEXT NOT NULL, display_name TEXT NOT NULL, metrika_version TEXT NOT NULL,
+                content_hash TEXT NOT NULL, warnings TEXT NOT NULL, ingested_at TEXT NOT NULL,
+                UNIQUE (curs, grup, trimestre));
+            CREATE TABLE students (id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL, student_id TEXT NOT NULL, nom_cognoms TEXT NOT NULL);
+            CREATE TABLE subjects (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+            CREATE TABLE marks (student INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+                subject INTEGER NOT NULL REFERENCES subjects (id), position INTEGER NOT NULL, qualificacio TEXT,
+                code INTEGER NOT NULL);
+            CREATE TABLE comments (student INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+                subject INTEGER REFERENCES subjects (id), text TEXT NOT NULL);
+            INSERT INTO files VALUES (1, '2024-25', 'Grup Antic', 'T1', 'a.json', 'Grup_Antic_T1', '0.0.0', 'h1', '', '');
+            INSERT INTO students VALUES (1, 1, 0, '1', 'Joan');
+            INSERT INTO subjects VALUES (1, 'Mat');
+            INSERT INTO marks VALUES (1, 1, 0, 'No assoliment', 1);
+            INSERT INTO comments VALUES (1, 1, 'Ha de treballar');
+        """)
+        connection.close()
+        
+        with StudentCatalog(path) as catalog:
+            student = catalog.load_students([1])[0]
+            catalog.ingest("b.json", file_info("Grup Antic", "T1"), [student], "h2", "2024-25")
+            
+            assert student['materies'][0]['comentari'] == "Ha de treballar"
+            assert sorted(catalog.files()['filename']) == ["a.json", "b.json"]
+    
+    def test_queries_across_groups(self, catalog, sample_students_data):
+        """Test filtered marks and mark counts over several groups and years"""
+        catalog.ingest("T1.json", file_info("3A", "T1"), loaded_students("3A", "T1", sample_students_data), "a", "2023-24")
+        catalog.ingest("T1.json", file_info("3B", "T1"), loaded_students("3B", "T1", sample_students_data), "b", "2024-25")
+        
+        marks = catalog.marks(grup="3B", materia=["Anglès", "Català"])
+        assert len(marks) == 4
+        assert set(marks['curs']) == {"2024-25"}
+        assert marks['codi'].tolist() == [2, 1, 3, 2]
+        
+        counts = catalog.mark_counts(('curs', 'materia'), materia="Matemàtiques")
+        assert counts[['NA', 'AS', 'AN', 'AE']].values.tolist() == [[0, 0, 1, 1], [0, 0, 1, 1]]
+        assert catalog.files(curs="2023-24")['grup'].tolist() == ["3A"]
+        
+        with pytest.raises(ValueError):
+            catalog.marks(professor="x")
+    
+    def test_extra_fields_round_trip(self, catalog, temp_test_dir, sample_json_structure):
+        """Test that the students loaded from the catalog equal the ones parsed from the file, extra fields included"""
+        sample_json_structure['estudiants'][0]['tutor'] = "Pere"
+        sample_json_structure['estudiants'][0]['numero_avaluacio'] = 1
+        sample_json_structure['estudiants'][0]['materies'][0]['extra_m'] = {"nivell": "3r"}
+        with open(os.path.join(temp_test_dir, "T1.json"), 'w', encoding='utf-8') as f:
+            json.dump(sample_json_structure, f)
+        parsed = load_json_files(temp_test_dir, ["T1.json"])[0]
+        
+        loaded = load_json_files(temp_test_dir, ["T1.json"], catalog=catalog, curs="2024-25")[0]
+        from_catalog = catalog.load_students(catalog.files()['id'].tolist())
+        
+        assert loaded == parsed
+        assert from_catalog == parsed
+        assert from_catalog[0].extra == {'tutor': "Pere", 'numero_avaluacio': 1}
+        assert from_catalog[0]['materies'][0]['extra_m'] == {"nivell": "3r"}
+    
+    def test_concurrent_access(self, catalog, sample_students_data):
+        """Test that threads sharing the catalog do not interleave their statements"""
+        errors = []
+        
+        def ingest_and_load(i):
+            try:
+                students = loaded_students(f"G{i}", "T1", sample_students_data)
+                file_id = catalog.ingest("T1.json", file_info(f"G{i}", "T1"), students, f"hash{i}", "2024-25")
+                for _ in range(5):
+                    assert catalog.load_students([file_id]) == students
+                    catalog.marks(grup=f"G{i}")
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=ingest_and_load, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert errors == []
+        assert len(catalog.files()) == 8
+    
+    def test_current_school_year(self):
+        """Test that school years start in September"""
+        assert current_school_year(datetime.date(2025, 6, 30)) == "2024-25"
+        assert current_school_year(datetime.date(2025, 9, 1)) == "2025-26"
+
+
+class TestCatalogLoading:
+    """Test that the directory loader goes through the catalog"""
+    
+    def test_load_json_files_uses_catalog(self, catalog, temp_test_dir, sample_json_structure):
+        """Test that a stored file is not decoded again"""
+        with open(os.path.join(temp_test_dir, "T1.json"), 'w', encoding='utf-8') as f:
+            json.dump(sample_json_structure, f)
+        
+        first = load_json_files(temp_test_dir, ["T1.json"], catalog=catalog, curs="2024-25")
+        with patch('app.decode_data_file', wraps=app.decode_data_file) as mock_decode:
+            second = load_json_files(temp_test_dir, ["T1.json"], catalog=catalog, curs="2024-25")
+        
+        mock_decode.assert_not_called()
+        assert second == first
+        assert len(catalog.files()) == 1
@@ -0,0 +1,137 @@
+"""
+Tests for the Parquet/Arrow columnar output and its loading
+"""
+import pytest
+import json
+import os
+from unittest.mock import Mock
+
+from app import describe_data_file, load_json_files, load_uploaded_json_files, get_json_files
+from utils.columnar_format import (
+    students_to_frame,
+    write_columnar,
+    read_columnar,
+    read_columnar_envelope,
+    read_columnar_metadata,
+    columnar_path,
+)
+from utils.csv_to_json import process_csv_to_json, process_trimestre_files
+
+
+STUDENTS = [
+    {
+        "id": "1",
+        "nom_cognoms": "Joan Pérez",
+        "materies": [
+            {"materia": "Matemàtiques", "qualificacio": "Assoliment notable", "comentari": "Bé"},
+            {"materia": "Català", "qualificacio": "", "comentari": ""}
+        ],
+        "comentari_general": "Bon trimestre"
+    },
+    {
+        "id": "2",
+        "nom_cognoms": "Maria López",
+        "materies": [],
+        "numero_avaluacio": "1"
+    }
+]
+
+
+class TestColumnarFormat:
+    """Test the long student x materia table"""
+
+    def test_frame_has_one_row_per_materia(self):
+        """Test flattening students with and without materies"""
+        df, extra_fields = students_to_frame(STUDENTS)
+
+        assert len(df) == 3
+        assert extra_fields == ["numero_avaluacio"]
+        assert str(df['qualificacio'].dtype) == 'category'
+        assert df['materia'].isna().sum() == 1
+
+    @pytest.mark.parametrize("columnar_format", ["parquet", "arrow"])
+    def test_round_trip(self, temp_test_dir, columnar_format):
+        """Test that students and metadata survive a write/read round trip"""
+        path = columnar_path(os.path.join(temp_test_dir, "T1.json"), columnar_format)
+        write_columnar(STUDENTS, path, columnar_format, metadata={"trimestre": "T1"})
+
+        students, metadata = read_columnar(path)
+        assert students == STUDENTS
+        assert metadata == {"trimestre": "T1"}
+
+        with open(path, 'rb') as f:
+            assert read_columnar(f.read(), columnar_format)[0] == STUDENTS
+        assert read_columnar_metadata(path) == {"trimestre": "T1"}
+
+    def test_unknown_format(self, temp_test_dir):
+        """Test that an unknown columnar format is rejected"""
+        with pytest.raises(ValueError):
+            write_columnar(STUDENTS, os.path.join(temp_test_dir, "T1.orc"), "orc")
+
+
+class TestColumnarConversion:
+    """Test the columnar output of the converter"""
+
+    def test_process_csv_writes_parquet(self, temp_test_dir, sample_csv_data):
+        """Test that the Parquet file holds the same students as the JSON"""
+        csv_file = os.path.join(temp_test_dir, "1r.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+        output_file = os.path.join(temp_test_dir, "T1.json")
+
+        success, _, json_data = process_csv_to_json(
+            csv_file, output_file, "T1", save_to_file=True, columnar_format="parquet"
+        )
+
+        assert success
+        data = read_columnar_envelope(os.path.join(temp_test_dir, "T1.parquet"))
+        assert data['trimestre'] == "T1"
+        assert data['grup'] == os.path.basename(temp_test_dir)
+        assert len(data['estudiants']) == len(json.loads(json_data))
+
+    def test_process_trimestre_files_writes_arrow(self, temp_test_dir, sample_csv_data):
+        """Test the columnar output of the trimester batch"""
+        csv_file = os.path.join(temp_test_dir, "grup_2n.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+
+        results = process_trimestre_files([csv_file], temp_test_dir, save_to_file=True, columnar_format="arrow", grup="3B")
+
+        assert results[0][0] is True
+        arrow_file = os.path.join(temp_test_dir, "T2.arrow")
+        assert read_columnar_metadata(arrow_file)['grup'] == "3B"
+        file_info, _ = describe_data_file(read_columnar_metadata(arrow_file), "T2.arrow")
+        assert file_info['display_name'] == "3B_T2"
+
+
+class TestColumnarLoading:
+    """Test that the app loaders read columnar files"""
+
+    def test_load_json_files_reads_parquet(self, temp_test_dir, sample_json_structure):
+        """Test loading a Parquet file from a directory"""
+        path = os.path.join(temp_test_dir, "T1.parquet")
+        write_columnar(sample_json_structure['estudiants'], path, metadata={
+            "grup": "3B", "trimestre": "Primer trimestre", "metrika_version": "1.0.0"
+        })
+
+        assert get_json_files(temp_test_dir) == ["T1.parquet"]
+        students, file_info, version_warnings = load_json_files(temp_test_dir, ["T1.parquet"])
+
+        assert len(students) == 1
+        assert students[0]['materies'] == sample_json_structure['estudiants'][0]['materies']
+        assert file_info["T1.parquet"]["display_name"] == "3B_Primer trimestre"
+        assert version_warnings == []
+
+    def test_load_uploaded_arrow_file(self, temp_test_dir, sample_json_structure):
+        """Test loading an uploaded Arrow file"""
+        path = os.path.join(temp_test_dir, "T1.arrow")
+        write_columnar(sample_json_structure['estudiants'], path, "arrow", metadata={"grup": "3B"})
+        mock_file = Mock()
+        mock_file.name = "T1.arrow"
+        with open(path, 'rb') as f:
+            mock_file.read.return_value = f.read()
+
+        students, file_info, _ = load_uploaded_json_files([mock_file])
+
+        assert len(students) == 1
+        assert students[0]['grup'] == "3B"
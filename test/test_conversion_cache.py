@@ -0,0 +1,82 @@
+"""
+Tests for the persistent CSV to JSON conversion cache
+"""
+import pytest
+import os
+import time
+from unittest.mock import patch
+
+from utils.conversion_cache import ConversionCache, file_content_hash
+from utils.csv_to_json import process_trimestre_files
+
+
+class TestConversionCache:
+    """Test cache keys, hits and eviction"""
+    
+    def test_key_depends_on_content_version_and_options(self, temp_test_dir):
+        """Test that the key changes with content, converter version and options"""
+        cache = ConversionCache(os.path.join(temp_test_dir, "cache"))
+        csv_file = os.path.join(temp_test_dir, "1r.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("a|b\n1|2\n")
+        
+        key = cache.make_key(csv_file, {'engine': 'rows'})
+        assert key == cache.make_key(csv_file, {'engine': 'rows'})
+        assert key != cache.make_key(csv_file, {'engine': 'columnar'})
+        with patch('utils.conversion_cache.AppConfig.VERSION', "9.9.9"):
+            assert key != cache.make_key(csv_file, {'engine': 'rows'})
+        
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("a|b\n1|3\n")
+        assert key != cache.make_key(csv_file, {'engine': 'rows'})
+    
+    def test_put_get_persists_across_instances(self, temp_test_dir):
+        """Test that entries survive reopening the cache"""
+        cache_dir = os.path.join(temp_test_dir, "cache")
+        ConversionCache(cache_dir).put("abc", '[{"id": "1"}]', source="1r.csv")
+        
+        cache = ConversionCache(cache_dir)
+        assert cache.get("abc") == '[{"id": "1"}]'
+        assert cache.get("missing") is None
+    
+    def test_eviction_by_age_and_size(self, temp_test_dir):
+        """Test age eviction and least recently used size eviction"""
+        cache = ConversionCache(os.path.join(temp_test_dir, "cache"), max_age=None, max_size=None)
+        for key in ["old", "lru", "recent"]:
+            cache.put(key, "x" * 100)
+        cache.manifest["old"]['last_used'] = time.time() - 1000
+        cache.manifest["lru"]['last_used'] = time.time() - 10
+        
+        assert cache.evict(max_age=500) == 1
+        assert cache.get("old") is None
+        assert cache.evict(max_size=150) == 1
+        assert cache.get("lru") is None
+        assert cache.get("recent") == "x" * 100
+        assert not os.path.exists(os.path.join(cache.cache_dir, "old.json"))
+
+
+class TestCachedTrimestreConversion:
+    """Test process_trimestre_files with a conversion cache"""
+    
+    def test_unchanged_files_are_not_reconverted(self, temp_test_dir, sample_csv_data):
+        """Test that the second run serves every file from the cache"""
+        csv_file = os.path.join(temp_test_dir, "grup_1r.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+        cache = ConversionCache(os.path.join(temp_test_dir, "cache"))
+        
+        first = process_trimestre_files([csv_file], temp_test_dir, save_to_file=True, cache=cache)
+        output_file = os.path.join(temp_test_dir, "T1.json")
+        with open(output_file, 'r', encoding='utf-8') as f:
+            converted = f.read()
+        os.unlink(output_file)
+        
+        with patch('utils.csv_to_json.process_csv_to_json') as mock_process:
+            second = process_trimestre_files([csv_file], temp_test_dir, save_to_file=True, cache=cache)
+            mock_process.assert_not_called()
+        
+        assert first[0][0] is True and second[0][0] is True
+        assert "memòria cau" in second[0][1]
+        with open(output_file, 'r', encoding='utf-8') as f:
+            assert f.read() == converted
+        assert len(file_content_hash(csv_file)) == 64
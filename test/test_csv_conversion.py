@@ -2,13 +2,28 @@
 High-priority tests for CSV to JSON conversion functionality
 """
 import pytest
+import io
 import json
 import os
 import tempfile
 import pandas as pd
 from unittest.mock import Mock, patch
 
-from utils.csv_to_json import process_csv_to_json
+from utils.csv_to_json import (
+    process_csv_to_json,
+    dataframe_to_students,
+    CONVERSION_ENGINES,
+    CleanCSVStream,
+    open_clean_csv,
+    sniff_csv_separator,
+    stream_csv_to_json,
+    build_envelope,
+    detect_trimester,
+    process_trimestre_files,
+    resolve_csv_schema,
+    open_csv_text
+)
+from utils.trimester_dataset import load_dataset, merge_session_into_dataset, merge_converted_sessions, dataset_envelopes
 from utils.constants import DataConfig, AppConfig
 
 
@@ -345,4 +360,418 @@ class TestCSVErrorHandling:
         success, message, json_data = process_csv_to_json(csv_file, output_file, "T1")
         
         # Should fail due to encoding error
-        assert success is False 
\ No newline at end of file
+        assert success is False 
+
+class TestConversionEngines:
+    """Test that the row and columnar conversion engines are interchangeable"""
+    
+    def test_engines_produce_identical_json(self, temp_test_dir):
+        """Test both engines on a CSV with gaps, extra fields and an unnamed row"""
+        csv_data = """id|nom_cognoms|numero_avaluacio|m1|q1|c1|m2|q2|c2|grup|nota|comentari general
+12345|Joan Pérez García|1|Matemàtiques| Assoliment notable |Bon treball||Assoliment satisfactori|Sense matèria|3B|1.5|Bon treball en general
+67890| |1|Català|No assoliment|Falta|||||3|Sense nom
+11111|Maria López|1| ||Buit|Català|||3B||"""
+        csv_file = os.path.join(temp_test_dir, "engines.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(csv_data)
+        
+        results = {
+            engine: process_csv_to_json(csv_file, None, "T1", engine=engine)
+            for engine in CONVERSION_ENGINES
+        }
+        
+        assert all(success for success, _, _ in results.values())
+        assert results['rows'][2] == results['columnar'][2]
+        students = json.loads(results['columnar'][2])
+        assert [s['id'] for s in students] == ["12345", "11111"]
+        assert students[0]['materies'] == [
+            {'materia': "Matemàtiques", 'qualificacio': "Assoliment notable", 'comentari': "Bon treball"}
+        ]
+        assert students[1]['materies'][0]['qualificacio'] == ""
+    
+    def test_engines_on_sample_file(self):
+        """Test both engines on the sample CSV shipped with the tests"""
+        csv_file = os.path.join(os.path.dirname(__file__), "test_data.csv")
+        df = pd.read_csv(csv_file, sep='|')
+        
+        assert dataframe_to_students(df, engine='rows') == dataframe_to_students(df, engine='columnar')
+    
+    def test_unknown_engine(self, temp_test_dir):
+        """Test that an unknown engine is rejected"""
+        with pytest.raises(ValueError):
+            process_csv_to_json(os.path.join(temp_test_dir, "missing.csv"), None, "T1", engine="simd")
+
+
+class TestCSVCleaningStream:
+    """Test the streaming CSV cleaner used before parsing"""
+    
+    def test_line_breaks_inside_cells(self, temp_test_dir):
+        """Test that quoted line breaks are replaced while streaming"""
+        csv_data = 'id|nom_cognoms|numero_avaluacio|m1|q1|c1|comentari general\n12345|"Joan\nPérez"|1|Matemàtiques|Assoliment notable|"Bon\r\ntreball"|General\n'
+        csv_file = os.path.join(temp_test_dir, "line_breaks.csv")
+        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(csv_data)
+        
+        assert sniff_csv_separator(csv_file) == '|'
+        with open_clean_csv(csv_file) as stream:
+            assert isinstance(stream, CleanCSVStream)
+            # Small reads force several refills of the pending buffer
+            chunks = iter(lambda: stream.read(7), '')
+            cleaned = ''.join(chunks)
+        
+        lines = cleaned.splitlines()
+        assert len(lines) == 2
+        assert "Joan Pérez" in lines[1]
+        assert "Bon treball" in lines[1]
+    
+    def test_conversion_does_not_create_temp_files(self, temp_test_dir, sample_csv_data):
+        """Test that the conversion never writes a cleaned copy to disk"""
+        csv_file = os.path.join(temp_test_dir, "no_temp.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+        
+        with patch('tempfile.NamedTemporaryFile') as mock_temp:
+            success, _, json_data = process_csv_to_json(csv_file, None, "T1")
+        
+        assert success is True
+        assert len(json.loads(json_data)) == 2
+        mock_temp.assert_not_called()
+    
+    def test_undetectable_separator_reads_original(self, temp_test_dir):
+        """Test that a single-column file is read as is"""
+        csv_file = os.path.join(temp_test_dir, "single_column.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("id\n12345\n")
+        
+        assert sniff_csv_separator(csv_file) is None
+        with open_clean_csv(csv_file) as stream:
+            assert not isinstance(stream, CleanCSVStream)
+            assert stream.read() == "id\n12345\n"
+
+
+class TestStreamingConversion:
+    """Test the chunked streaming CSV to JSON conversion"""
+    
+    def test_stream_matches_in_memory_json(self, temp_test_dir):
+        """Test that the streamed JSON array equals the in-memory conversion"""
+        csv_file = os.path.join(os.path.dirname(__file__), "test_data.csv")
+        output_file = os.path.join(temp_test_dir, "streamed.json")
+        
+        success, message, n_students = stream_csv_to_json(csv_file, output_file, "T1", chunksize=2)
+        _, _, json_data = process_csv_to_json(csv_file, None, "T1")
+        
+        assert success is True
+        assert n_students == len(json.loads(json_data))
+        with open(output_file, 'r', encoding='utf-8') as f:
+            assert f.read() == json_data
+    
+    @pytest.mark.parametrize("engine", CONVERSION_ENGINES)
+    def test_stream_matches_inferred_dtypes(self, temp_test_dir, engine):
+        """Test that numeric ids and fields are written as the in-memory conversion writes them"""
+        csv_file = os.path.join(temp_test_dir, "numeric.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("id|nom_cognoms|numero_avaluacio|edat|codi|m1|q1|c1|comentari general\n")
+            f.write("007|Anna|1|15|12|Mates|AS|Bé|Cap\n")
+            f.write("8|Pau|1|16|34|Mates|AN||Cap\n")
+            f.write("9|Laia|1||A5|Mates|NA|Millorar|\n")
+        output_file = os.path.join(temp_test_dir, "numeric.json")
+        
+        success, _, n_students = stream_csv_to_json(csv_file, output_file, "T1", chunksize=2, engine=engine)
+        _, _, json_data = process_csv_to_json(csv_file, None, "T1", engine=engine)
+        
+        assert success is True and n_students == 3
+        with open(output_file, 'r', encoding='utf-8') as f:
+            assert f.read() == json_data
+        students = json.loads(json_data)
+        assert [s['id'] for s in students] == ["7", "8", "9"]
+        assert [s['edat'] for s in students] == ["15.0", "16.0", ""]
+        assert [s['codi'] for s in students] == ["12", "34", "A5"]
+    
+    def test_stream_envelope(self, temp_test_dir):
+        """Test that the enveloped stream equals the saved envelope of the in-memory conversion"""
+        csv_file = os.path.join(os.path.dirname(__file__), "test_data.csv")
+        output_file = os.path.join(temp_test_dir, "T1.json")
+        
+        success, _, _ = stream_csv_to_json(csv_file, output_file, "T1", chunksize=2, grup="3A", envelope=True)
+        _, _, json_data = process_csv_to_json(csv_file, None, "T1")
+        
+        assert success is True
+        with open(output_file, 'r', encoding='utf-8') as f:
+            assert f.read() == build_envelope(json_data, "3A", "T1")
+    
+    def test_stream_trimestre_files(self, temp_test_dir):
+        """Test that process_trimestre_files saves the same files with and without streaming"""
+        csv_file = os.path.join(temp_test_dir, "3A_1r.csv")
+        with open(os.path.join(os.path.dirname(__file__), "test_data.csv"), 'r', encoding='utf-8') as source:
+            content = source.read()
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        
+        outputs = {}
+        for stream in (False, True):
+            output_dir = os.path.join(temp_test_dir, f"out_{stream}")
+            results = process_trimestre_files([csv_file], output_dir, save_to_file=True, envelope=True, grup="3A", stream=stream)
+            assert results[0][0] is True
+            with open(os.path.join(output_dir, "T1.json"), 'r', encoding='utf-8') as f:
+                outputs[stream] = f.read()
+        
+        assert outputs[True] == outputs[False]
+        with pytest.raises(ValueError):
+            process_trimestre_files([csv_file], temp_test_dir, save_to_file=True, columnar_format='parquet', stream=True)
+    
+    def test_stream_json_lines(self, temp_test_dir, sample_csv_data):
+        """Test JSON lines output with one chunk per row"""
+        csv_file = os.path.join(temp_test_dir, "stream.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+        output_file = os.path.join(temp_test_dir, "stream.jsonl")
+        
+        success, _, n_students = stream_csv_to_json(csv_file, output_file, "T1", output_format='jsonl', chunksize=1)
+        
+        assert success is True
+        assert n_students == 2
+        with open(output_file, 'r', encoding='utf-8') as f:
+            students = [json.loads(line) for line in f]
+        assert [s['id'] for s in students] == ["12345", "67890"]
+        assert len(students[0]['materies']) == 5
+    
+    def test_stream_missing_columns_removes_output(self, temp_test_dir):
+        """Test that a failed streaming conversion leaves no partial file"""
+        csv_file = os.path.join(temp_test_dir, "bad.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write("id|nom_cognoms\n12345|Joan\n")
+        output_file = os.path.join(temp_test_dir, "bad.json")
+        
+        success, message, n_students = stream_csv_to_json(csv_file, output_file, "T1")
+        
+        assert success is False
+        assert "Falten columnes" in message
+        assert n_students == 0
+        assert not os.path.exists(output_file)
+
+
+class TestTrimestreFilesProcessing:
+    """Test batch conversion of trimester CSV files"""
+    
+    def _write_csv_files(self, directory, sample_csv_data):
+        names = ["grup_1r.csv", "sense_trimestre.csv", "grup_2n.csv", "grup_3r.csv"]
+        paths = []
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(sample_csv_data)
+            paths.append(path)
+        return paths
+    
+    def test_detect_trimester(self):
+        """Test trimester detection from file names"""
+        assert detect_trimester("/tmp/3B_1r.csv") == "T1"
+        assert detect_trimester("Acta_2N_trimestre.csv") == "T2"
+        assert detect_trimester("3r.csv") == "T3"
+        assert detect_trimester("final.csv") is None
+    
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_results_keep_input_order(self, temp_test_dir, sample_csv_data, workers):
+        """Test that sequential and parallel runs report results in input order"""
+        csv_files = self._write_csv_files(temp_test_dir, sample_csv_data)
+        progress = []
+        
+        results = process_trimestre_files(
+            csv_files,
+            temp_test_dir,
+            save_to_file=True,
+            workers=workers,
+            progress_callback=lambda done, total, csv_file, result: progress.append((done, total, csv_file))
+        )
+        
+        assert [success for success, _ in results] == [True, False, True, True]
+        assert "grup_1r.csv" in results[0][1]
+        assert "sense_trimestre.csv" in results[1][1]
+        assert [done for done, _, _ in progress] == [1, 2, 3, 4]
+        assert sorted(csv_file for _, _, csv_file in progress) == sorted(csv_files)
+        for trimester in ["T1", "T2", "T3"]:
+            assert os.path.exists(os.path.join(temp_test_dir, f"{trimester}.json"))
+
+
+class TestCSVSchema:
+    """Test resolution of the CSV header into a column layout"""
+    
+    def test_resolve_schema(self):
+        """Test triplet, extra and required column detection"""
+        schema = resolve_csv_schema([
+            'id', 'nom_cognoms', 'numero_avaluacio', 'm2', 'q2', 'c2', 'm1', 'q1',
+            'curs', 'comentari tutor', 'q3', 'comentari general'
+        ])
+        
+        assert schema.materies == [(1, 6, 7, None), (2, 3, 4, 5)]
+        assert schema.other_columns == [('curs', 8), ('comentari tutor', 9)]
+        assert schema.required == {'id': 0, 'nom_cognoms': 1, 'numero_avaluacio': 2, 'comentari general': 11}
+        assert schema.missing == []
+        assert resolve_csv_schema(['id', 'm1']).missing == ['nom_cognoms', 'numero_avaluacio', 'comentari general']
+    
+    def test_more_than_100_materies_and_extra_columns(self):
+        """Test that wide exports keep every materia and extra columns starting with m/q/c"""
+        columns = ['id', 'nom_cognoms', 'numero_avaluacio']
+        values = ['12345', 'Joan Pérez García', '1']
+        for j in range(1, 121):
+            columns += [f'm{j}', f'q{j}', f'c{j}']
+            values += [f'Matèria {j}', "Assoliment notable", '']
+        columns += ['curs', 'comentari tutor', 'comentari general']
+        values += ['3r ESO', 'Cap', 'General']
+        df = pd.DataFrame([values], columns=columns)
+        
+        for engine in CONVERSION_ENGINES:
+            student = dataframe_to_students(df, engine=engine)[0]
+            assert len(student['materies']) == 120
+            assert student['materies'][-1]['materia'] == "Matèria 120"
+            assert student['curs'] == "3r ESO"
+            assert student['comentari tutor'] == "Cap"
+            assert student['comentari_general'] == "General"
+
+
+class TestDatasetMerge:
+    """Test the incremental merge of sessions into a multi-trimester dataset"""
+    
+    @staticmethod
+    def student(student_id, mark="Assoliment notable"):
+        return {
+            'id': student_id,
+            'nom_cognoms': f"Alumne {student_id}",
+            'materies': [{'materia': "Matemàtiques", 'qualificacio': mark, 'comentari': ""}]
+        }
+    
+    def test_only_new_and_changed_records_are_appended(self, temp_test_dir):
+        """Test that unchanged students are not written again"""
+        dataset_file = os.path.join(temp_test_dir, "dataset.jsonl")
+        first = merge_session_into_dataset([self.student("1"), self.student("2")], dataset_file, "T1", grup="3B")
+        with open(dataset_file, 'r', encoding='utf-8') as f:
+            lines_before = f.readlines()
+        
+        second = merge_session_into_dataset(
+            [self.student("1"), self.student("2", "Assoliment excel·lent"), self.student("3"), self.student("NULL")],
+            dataset_file, "T1"
+        )
+        with open(dataset_file, 'r', encoding='utf-8') as f:
+            lines_after = f.readlines()
+        
+        assert first == {'nous': 2, 'modificats': 0, 'sense_canvis': 0, 'ignorats': 0}
+        assert second == {'nous': 1, 'modificats': 1, 'sense_canvis': 1, 'ignorats': 1}
+        assert lines_after[:len(lines_before)] == lines_before
+        assert len(lines_after) == len(lines_before) + 2
+        
+        header, trimestres, _ = load_dataset(dataset_file)
+        assert header['grup'] == "3B"
+        assert trimestres['T1']['2']['materies'][0]['qualificacio'] == "Assoliment excel·lent"
+        assert sorted(trimestres['T1']) == ["1", "2", "3"]
+    
+    def test_trimesters_are_kept_apart_and_compacted(self, temp_test_dir):
+        """Test several trimesters and the compaction of replaced records"""
+        dataset_file = os.path.join(temp_test_dir, "dataset.jsonl")
+        merge_session_into_dataset([self.student("1")], dataset_file, "T1")
+        merge_session_into_dataset([self.student("1", "Assoliment satisfactori")], dataset_file, "T2")
+        for mark in ["Assoliment excel·lent", "No assoliment", "Assoliment notable"]:
+            merge_session_into_dataset([self.student("1", mark)], dataset_file, "T1")
+        
+        _, trimestres, n_records = load_dataset(dataset_file)
+        assert n_records <= 4
+        assert trimestres['T1']['1']['materies'][0]['qualificacio'] == "Assoliment notable"
+        envelopes = dataset_envelopes(dataset_file)
+        assert [e['trimestre'] for e in envelopes] == ["T1", "T2"]
+        assert envelopes[1]['estudiants'][0]['materies'][0]['qualificacio'] == "Assoliment satisfactori"
+    
+    def test_only_sessions_converted_in_this_run_are_merged(self, temp_test_dir, sample_csv_data):
+        """Test that a stale trimester file of an earlier run is not merged when its conversion fails"""
+        with open(os.path.join(temp_test_dir, "T1.json"), 'w', encoding='utf-8') as f:
+            json.dump([self.student("antic")], f)
+        csv_files = [os.path.join(temp_test_dir, "grup_1r.csv"), os.path.join(temp_test_dir, "grup_2n.csv")]
+        with open(csv_files[0], 'w', encoding='utf-8') as f:
+            f.write("no és un CSV d'Esfera\n")
+        with open(csv_files[1], 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+        dataset_file = os.path.join(temp_test_dir, "dataset.jsonl")
+        
+        results = process_trimestre_files(csv_files, temp_test_dir, save_to_file=True)
+        merged = merge_converted_sessions([detect_trimester(f) for f in csv_files], results, temp_test_dir, dataset_file, grup="3B")
+        
+        assert [(trimester, success) for trimester, success, _ in merged] == [("T1", False), ("T2", True)]
+        header, trimestres, _ = load_dataset(dataset_file)
+        assert list(trimestres) == ["T2"]
+        assert header['grup'] == "3B"
+    
+    def test_dataset_without_grup_takes_the_merged_one(self, temp_test_dir):
+        """Test that a dataset header without grup is completed by a later merge"""
+        dataset_file = os.path.join(temp_test_dir, "dataset.jsonl")
+        merge_session_into_dataset([self.student("1")], dataset_file, "T1")
+        merge_session_into_dataset([self.student("1")], dataset_file, "T2", grup="3B")
+        
+        header, trimestres, n_records = load_dataset(dataset_file)
+        assert header['grup'] == "3B"
+        assert sorted(trimestres) == ["T1", "T2"]
+        assert n_records == 2
+    
+    def test_session_of_another_grup_is_rejected(self, temp_test_dir):
+        """Test that a dataset only holds the sessions of its grup"""
+        dataset_file = os.path.join(temp_test_dir, "dataset.jsonl")
+        merge_session_into_dataset([self.student("1")], dataset_file, "T1", grup="3B")
+        
+        with pytest.raises(ValueError, match="3C"):
+            merge_session_into_dataset([self.student("2")], dataset_file, "T2", grup="3C")
+        merge_session_into_dataset([self.student("2")], dataset_file, "T2")
+        
+        header, trimestres, _ = load_dataset(dataset_file)
+        assert header['grup'] == "3B"
+        assert sorted(trimestres) == ["T1", "T2"]
+    
+    def test_envelopes_of_dataset_bytes(self, temp_test_dir):
+        """Test reading the trimesters of an uploaded dataset from its content"""
+        dataset_file = os.path.join(temp_test_dir, "dataset.jsonl")
+        merge_session_into_dataset([self.student("1")], dataset_file, "T2", grup="3B")
+        merge_session_into_dataset([self.student("1", "No assoliment")], dataset_file, "T1")
+        with open(dataset_file, 'rb') as f:
+            content = f.read()
+        
+        assert dataset_envelopes(content, "dataset.jsonl") == dataset_envelopes(dataset_file)
+        with pytest.raises(ValueError, match="dades.jsonl"):
+            dataset_envelopes(b'{"grup": "3B"}\n', "dades.jsonl")
+
+
+class TestInMemoryConversion:
+    """Test converting CSV data given as bytes or file objects"""
+    
+    def test_sources_match_file_conversion(self, temp_test_dir, sample_csv_data):
+        """Test that bytes, memoryviews and file objects give the same JSON as the file"""
+        csv_file = os.path.join(temp_test_dir, "1r.csv")
+        with open(csv_file, 'w', encoding='utf-8') as f:
+            f.write(sample_csv_data)
+        content = sample_csv_data.encode('utf-8')
+        expected = process_csv_to_json(csv_file, None, "T1")[2]
+        
+        uploaded = io.BytesIO(content)
+        uploaded.name = "1r.csv"
+        for source in [content, bytearray(content), memoryview(content), uploaded, io.BufferedReader(io.BytesIO(content))]:
+            success, message, json_data = process_csv_to_json(source, None, "T1")
+            assert success, message
+            assert json_data == expected
+        assert "1r.csv" in process_csv_to_json(uploaded, None, "T1")[1]
+        
+        # The uploaded buffer is released and can still be used
+        uploaded.write(b"")
+        assert not uploaded.closed
+    
+    def test_open_csv_text_leaves_file_open(self):
+        """Test that file objects from the caller are not closed"""
+        source = io.BufferedReader(io.BytesIO("a|b\n1|2\n".encode('utf-8')))
+        with open_csv_text(source) as f:
+            assert f.read() == "a|b\n1|2\n"
+        assert not source.closed
+        with pytest.raises(TypeError):
+            open_csv_text(42)
+    
+    def test_stream_from_memory(self, temp_test_dir, sample_csv_data):
+        """Test streaming conversion of in-memory data"""
+        output_file = os.path.join(temp_test_dir, "T1.json")
+        success, _, n_students = stream_csv_to_json(memoryview(sample_csv_data.encode('utf-8')), output_file, "T1")
+        
+        assert success
+        with open(output_file, 'r', encoding='utf-8') as f:
+            assert len(json.load(f)) == n_students
@@ -7,8 +7,11 @@ import os
 import tempfile
 from unittest.mock import Mock, patch
 import pandas as pd
+from streamlit.testing.v1 import AppTest
 
-from app import load_json_files, load_uploaded_json_files, compare_versions
+from app import (load_json_files, load_uploaded_json_files, probe_uploaded_files, compare_versions, _parse_uploaded_file,
+                 expand_uploaded_datasets)
+from utils.trimester_dataset import merge_session_into_dataset
 
 
 class TestVersionComparison:
@@ -258,6 +261,86 @@ class TestUploadedFileLoading:
         assert len(file_info) == 0
 
 
+    def test_uploaded_file_parsed_once_per_content(self):
+        """Test that reloading unchanged uploads is served from the cache across reruns"""
+        def script():
+            import json
+            from unittest.mock import Mock, patch
+            import streamlit as st
+            import app
+            
+            mock_file = Mock()
+            mock_file.name = "T1.json"
+            content = {"grup": "3B", "estudiants": [{"id": "1", "nom_cognoms": "Student 1", "materies": []}]}
+            mock_file.read.return_value = json.dumps(content).encode('utf-8')
+            with patch('app.decode_data_file', wraps=app.decode_data_file) as mock_decode:
+                first, _, _ = app.load_uploaded_json_files([mock_file])
+                second, _, _ = app.load_uploaded_json_files([mock_file])
+                content["estudiants"][0]["nom_cognoms"] = "Student 2"
+                mock_file.read.return_value = json.dumps(content).encode('utf-8')
+                third, _, _ = app.load_uploaded_json_files([mock_file])
+            st.write(f"{mock_decode.call_count}|{second[0] is first[0]}|{third[0]['nom_cognoms']}")
+        
+        _parse_uploaded_file.clear()
+        at = AppTest.from_function(script).run()
+        
+        assert not at.exception
+        # Parsed once for the first content and once for the changed content
+        assert at.markdown[0].value == "2|True|Student 2"
+    
+    def test_repeated_strings_are_shared(self):
+        """Test that materia names and qualifications of different files are the same objects"""
+        files = []
+        for name, trimestre in (("T1.json", "Primer trimestre"), ("T2.json", "Segon trimestre")):
+            mock_file = Mock()
+            mock_file.name = name
+            mock_file.read.return_value = json.dumps({
+                "grup": "3B",
+                "trimestre": trimestre,
+                "estudiants": [{"id": "1", "nom_cognoms": "Student 1", "materies": [
+                    {"materia": "Matemàtiques 3r", "qualificacio": "Assoliment notable", "comentari": ""}
+                ]}]
+            }).encode('utf-8')
+            files.append(mock_file)
+        
+        first, second = load_uploaded_json_files(files)[0]
+        
+        assert first['materies'][0]['materia'] is second['materies'][0]['materia']
+        assert first['materies'][0]['qualificacio'] is second['materies'][0]['qualificacio']
+        assert first['nom_cognoms'] is second['nom_cognoms']
+        assert first['grup'] is second['grup']
+    
+    def test_probe_uploaded_files_reads_headers_only(self, mock_uploaded_file):
+        """Test that the selector file info is read without decoding students"""
+        _, loaded_info, loaded_warnings = load_uploaded_json_files([mock_uploaded_file])
+        
+        with patch('app.decode_student_file') as mock_decode:
+            file_info, version_warnings = probe_uploaded_files([mock_uploaded_file])
+        
+        mock_decode.assert_not_called()
+        assert file_info == loaded_info
+        assert version_warnings == loaded_warnings
+    
+    def test_uploaded_dataset_is_loaded_per_trimester(self, temp_test_dir, sample_students_data, mock_uploaded_file):
+        """Test that the trimesters of an uploaded multi-trimester dataset load as trimester files"""
+        dataset_file = os.path.join(temp_test_dir, "3B.jsonl")
+        merge_session_into_dataset(sample_students_data, dataset_file, "T1", grup="3B")
+        merge_session_into_dataset(sample_students_data[:1], dataset_file, "T2", grup="3B")
+        dataset = Mock()
+        dataset.name = "3B.jsonl"
+        with open(dataset_file, 'rb') as f:
+            dataset.read.return_value = f.read()
+        
+        files = expand_uploaded_datasets([mock_uploaded_file, dataset])
+        students, file_info, _ = load_uploaded_json_files(files)
+        
+        assert [f.name for f in files] == ["test_file.json", "3B_T1.json", "3B_T2.json"]
+        assert file_info["3B_T1.json"]['display_name'] == "3B_T1"
+        assert file_info["3B_T2.json"]['trimestre'] == "T2"
+        assert len(students) == 1 + len(sample_students_data) + 1
+        assert probe_uploaded_files(files)[0].keys() == file_info.keys()
+
+
 class TestDataValidation:
     """Test data validation functionality"""
     
@@ -0,0 +1,78 @@
+"""
+Tests for the failure categories of the group and PDF tables
+"""
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+from sections.visualization import group_failure_table
+from utils.failures import FAILURE_CATEGORIES, FailureSummary, failure_categories
+from utils.marks_dataset import MarksDataset
+
+
+def make_student(student_id, grup, trimestre, n_failures):
+    return {"id": student_id, "nom_cognoms": f"Alumne {student_id}", "grup": grup, "trimestre": trimestre, "materies": [
+        {"materia": f"Materia {j}", "qualificacio": "No assoliment" if j < n_failures else "Assoliment notable",
+         "comentari": ""}
+        for j in range(8)
+    ]}
+
+
+class TestFailureCategories:
+    """Test the binning of the number of NA marks"""
+
+    def test_bins(self):
+        """Test the category of each number of NA marks"""
+        categories = failure_categories(np.arange(9))
+
+        assert [FAILURE_CATEGORIES[c] for c in categories] == [
+            "Tot aprovat", "Fins a 3 susp.", "Fins a 3 susp.", "Fins a 3 susp.",
+            "4 o 5 susp.", "4 o 5 susp.", "Més de 5 susp.", "Més de 5 susp.", "Més de 5 susp."
+        ]
+
+
+class TestFailureSummary:
+    """Test the tables of every group and trimester"""
+
+    def test_groups_and_trimesters(self):
+        """Test that one summary gives the table of any group and trimester"""
+        marks = MarksDataset.from_students([
+            make_student("1", "3A", "T1", 0),
+            make_student("2", "3A", "T1", 4),
+            make_student("3", "3B", "T1", 7),
+            make_student("1", "3A", "T2", 2),
+            make_student("3", "3B", "T2", 0)
+        ])
+        summary = FailureSummary(marks)
+
+        assert summary.counts.shape == (2, 2, 4)
+        assert summary.category_counts(trimester="T1").tolist() == [1, 0, 1, 1]
+        assert summary.category_counts(group="3A", trimester=1).tolist() == [0, 1, 0, 0]
+        assert summary.category_counts(group="3B").tolist() == [0, 0, 0, 1]
+        assert summary.category_counts().tolist() == [0, 1, 1, 1]
+
+        rows = summary.rows(group="3A", trimester="T1")
+        assert [row["Alumnes"] for row in rows] == ["Alumne 1", "", "Alumne 2", ""]
+        assert rows[0]["%"] == "50.0%"
+        assert summary.rows(group="3B", trimester="T2")[0]["Nº d'alumnes"] == 1
+
+    def test_category_boundaries(self):
+        """Test the students at the edge of every category of the Grup and PDF table"""
+        students = [make_student(str(n), "3A", "T1", n) for n in (0, 1, 3, 4, 5, 6)]
+        rows = FailureSummary(MarksDataset.from_students(students)).rows()
+
+        assert [row["Alumnes"] for row in rows] == ["Alumne 0", "Alumne 1; Alumne 3", "Alumne 4; Alumne 5", "Alumne 6"]
+        assert [row["Nº d'alumnes"] for row in rows] == [1, 2, 2, 1]
+
+    def test_group_and_pdf_tables_match(self, sample_students_data):
+        """Test that the Grup tab and the PDF report show the same table"""
+        with patch('sections.visualization.st') as mock_st:
+            mock_st.columns.return_value = (MagicMock(), MagicMock())
+            group_failure_table(sample_students_data)
+            rows = mock_st.dataframe.call_args[0][0]
+
+        assert [row["Categoria"] for row in rows] == list(FAILURE_CATEGORIES)
+        assert sum(row["Nº d'alumnes"] for row in rows) == len(sample_students_data)
+        pytest.importorskip("openai")
+        from sections.pdf_report import create_failure_table
+        assert create_failure_table(sample_students_data) == rows
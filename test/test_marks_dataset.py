@@ -0,0 +1,155 @@
+"""
+Tests for the normalized marks dataset used by the sections
+"""
+import pytest
+import numpy as np
+
+from utils.marks_dataset import (
+    MarksDataset,
+    as_marks_dataset,
+    encode_marks,
+    count_codes,
+    N_CODES,
+    label_counts,
+    ABSENT_CODE,
+    EMPTY_CODE,
+    OTHER_CODE,
+)
+
+
+@pytest.fixture
+def two_trimesters():
+    """Students of two trimesters, one of them only in the second"""
+    return [
+        {"id": "1", "nom_cognoms": "Joan", "trimestre": "T1", "materies": [
+            {"materia": "Mat 3r", "qualificacio": "No assoliment", "comentari": "Ha de treballar"},
+            {"materia": "Cat 3r", "qualificacio": "", "comentari": ""}
+        ]},
+        {"id": "2", "nom_cognoms": "Maria", "trimestre": "T1", "materies": [
+            {"materia": "Mat 3r", "qualificacio": "Assoliment notable", "comentari": ""},
+            {"materia": "Rel 2n", "qualificacio": "Exempt", "comentari": ""}
+        ]},
+        {"id": "3", "nom_cognoms": "Pau", "trimestre": "T2", "materies": [
+            {"materia": "Mat 3r", "qualificacio": "Assoliment satisfactori", "comentari": ""}
+        ]},
+        {"id": "1", "nom_cognoms": "Joan", "trimestre": "T2", "materies": [
+            {"materia": "Mat 3r", "qualificacio": "Assoliment excel·lent", "comentari": ""}
+        ]}
+    ]
+
+
+class TestMarksDataset:
+    """Test building and querying the marks array"""
+    
+    def test_codes_array(self, two_trimesters):
+        """Test the students x materies x trimesters int8 array"""
+        marks = MarksDataset.from_students(two_trimesters)
+        
+        assert marks.codes.dtype == np.int8
+        assert marks.codes.shape == (3, 3, 2)
+        assert marks.ids.tolist() == ["1", "2", "3"]
+        assert marks.materies.tolist() == ["Cat 3r", "Mat 3r", "Rel 2n"]
+        assert marks.trimesters == ["T1", "T2"]
+        assert marks.codes[0, :, 0].tolist() == [EMPTY_CODE, 1, ABSENT_CODE]
+        assert marks.codes[0, 1, 1] == 4
+        assert marks.codes[1, 2, 0] == OTHER_CODE
+        assert marks.materia_detail(0, 1, 0)['comentari'] == "Ha de treballar"
+    
+    def test_aggregates(self, two_trimesters):
+        """Test counts, failures and averages per trimester"""
+        marks = MarksDataset.from_students(two_trimesters)
+        
+        assert label_counts(marks.mark_counts(trimester="T1")) == {"No assoliment": 1, "Assoliment notable": 1}
+        assert marks.materia_mark_counts(marks.materia_mask(["3r"]))[1].tolist() == [0, 1, 1, 1, 1, 0]
+        assert marks.failures().tolist() == [1, 0, 0]
+        np.testing.assert_allclose(marks.averages(), [6.25, 7.5, 5.0])
+        assert np.isnan(marks.averages("T2")[1])
+        codes, positions = marks.marks_matrix()
+        assert positions.tolist() == [0, 2]
+        assert codes.shape == (2, 3)
+    
+    def test_long_frame_keeps_loading_order(self, two_trimesters):
+        """Test the long table of qualified marks"""
+        frame = MarksDataset.from_students(two_trimesters).long_frame(min_code=1)
+        
+        assert frame['nom'].tolist() == ["Joan", "Maria", "Maria", "Pau", "Joan"]
+        assert frame['trimestre'].tolist() == ["T1", "T1", "T1", "T2", "T2"]
+        assert frame['qualificacio'].tolist()[2] == "Exempt"
+        assert frame['valor'].tolist()[:2] == [2.5, 7.5]
+    
+    def test_repeated_materia_counts_every_entry(self):
+        """Test that a materia repeated in a record is counted as often as it appears"""
+        marks = MarksDataset.from_students([
+            {"id": "1", "nom_cognoms": "Joan", "trimestre": "T1", "materies": [
+                {"materia": "Mat 3r", "qualificacio": "No assoliment", "comentari": "Primera"},
+                {"materia": "Cat 3r", "qualificacio": "Assoliment notable", "comentari": ""},
+                {"materia": "Mat 3r", "qualificacio": "No assoliment", "comentari": "Segona"}
+            ]}
+        ])
+    
+        assert marks.codes[0, :, 0].tolist() == [3, 1]
+        assert marks.materia_detail(0, 1, 0)['comentari'] == "Primera"
+        assert marks.repeated.tolist() == [False, False, True]
+        assert marks.failures().tolist() == [2]
+        assert label_counts(marks.mark_counts()) == {"No assoliment": 2, "Assoliment notable": 1}
+        np.testing.assert_allclose(marks.averages(), [(2.5 + 7.5 + 2.5) / 3])
+        assert marks.long_frame()['qualificacio'].tolist() == [
+            "No assoliment", "Assoliment notable", "No assoliment"
+        ]
+    
+    def test_repeated_ids_keep_the_original_id(self):
+        """Test that students sharing an id within a trimester get their own row and keep their id"""
+        marks = MarksDataset.from_students([
+            {"id": "1", "nom_cognoms": "Joan", "trimestre": "T1", "materies": []},
+            {"id": "1", "nom_cognoms": "Pau", "trimestre": "T1", "materies": [
+                {"materia": "Mat 3r", "qualificacio": "No assoliment", "comentari": ""}
+            ]},
+            {"id": "1", "nom_cognoms": "Joan", "trimestre": "T2", "materies": []}
+        ])
+    
+        assert marks.ids.tolist() == ["1", "1"]
+        assert marks.names.tolist() == ["Joan", "Pau"]
+        assert marks.student_index == {"1": 0}
+        assert marks.record(1)['nom_cognoms'] == "Pau"
+        assert marks.present.tolist() == [[True, True], [True, False]]
+        assert marks.long_frame()[['id', 'nom']].values.tolist() == [["1", "Pau"]]
+    
+    def test_helpers(self, two_trimesters):
+        """Test mark encoding helpers and as_marks_dataset"""
+        codes = encode_marks(["Assoliment notable", "", None, "Altres"])
+        assert codes.tolist() == [3, EMPTY_CODE, EMPTY_CODE, OTHER_CODE]
+        assert count_codes(codes).tolist() == [2, 0, 0, 1, 0, 1]
+        
+        marks = as_marks_dataset(two_trimesters)
+        assert as_marks_dataset(marks) is marks
+        assert len(as_marks_dataset([])) == 0
+
+
+class TestMarkCube:
+    """Test the group x trimester x materia x code counts"""
+    
+    def test_cube_matches_the_codes(self, two_trimesters):
+        """Test that the cube counts every code of the marks array once"""
+        for student in two_trimesters:
+            student['grup'] = "3A" if student['id'] != "2" else "3B"
+        marks = MarksDataset.from_students(two_trimesters)
+        cube = marks.cube
+        
+        assert cube.groups == ["3A", "3B"]
+        assert cube.counts.shape == (2, 2, 3, N_CODES)
+        assert cube.counts.sum() == (marks.codes >= 0).sum()
+        for t in range(2):
+            for j in range(3):
+                assert cube.materia_mark_counts(trimester=t)[j].tolist() == count_codes(marks.codes[:, j, t]).tolist()
+        assert label_counts(cube.mark_counts(group="3B")) == {"Assoliment notable": 1}
+        assert cube.group_mark_counts(trimester="T2")[:, 4].tolist() == [1, 0]
+        assert marks.mark_counts([1], group="3A").tolist() == [0, 1, 1, 0, 1, 0]
+        assert marks.failures("T2").tolist() == [0, 0, 0]
+    
+    def test_empty_cube(self):
+        """Test the cube of a dataset without marks"""
+        marks = MarksDataset.from_students([])
+        
+        assert marks.cube.counts.shape == (0, 0, 0, N_CODES)
+        assert marks.mark_counts().tolist() == [0] * N_CODES
+        assert marks.failures().tolist() == []
@@ -0,0 +1,120 @@
+"""
+Tests for the migration of old format files
+"""
+import pytest
+import json
+import os
+from unittest.mock import patch
+
+import app
+from app import decode_data_file, describe_data_file, load_json_files, probe_data_file
+from utils.constants import AppConfig
+from utils.migrations import (DEFAULT_MIGRATION_MAX_SIZE, LEGACY_VERSION, MIGRATIONS, MigrationCache, migrate_data,
+                              needs_migration, register_migration)
+
+
+@pytest.fixture
+def migration_cache(temp_test_dir):
+    return MigrationCache(os.path.join(temp_test_dir, "migracions"))
+
+
+class TestMigrations:
+    """Test the version-keyed migration registry"""
+
+    def test_legacy_list_is_wrapped(self, sample_old_json_structure):
+        """Test that a bare list of students becomes the current envelope"""
+        data, from_version = migrate_data(sample_old_json_structure, "dades/T2.json")
+
+        assert from_version == LEGACY_VERSION
+        assert data == {
+            'grup': "Grup Antic",
+            'trimestre': "T2",
+            'estudiants': sample_old_json_structure,
+            'metrika_version': AppConfig.MIN_COMPATIBLE_VERSION,
+            'migrated_from': LEGACY_VERSION
+        }
+        assert not needs_migration(data)
+
+    def test_current_files_are_not_migrated(self, sample_json_structure):
+        """Test that current and unversioned envelopes are left unchanged"""
+        assert migrate_data(sample_json_structure, "T1.json") == (sample_json_structure, "1.0.0")
+        del sample_json_structure['metrika_version']
+        assert not needs_migration(sample_json_structure)
+
+    def test_migrations_are_chained(self, sample_old_json_structure):
+        """Test that migrations run one after the other up to the minimum version"""
+        @register_migration("1.0.0", "1.1.0")
+        def add_curs(data, filename):
+            return {**data, 'curs': "2024-25", 'metrika_version': "1.1.0"}
+
+        try:
+            with patch.object(AppConfig, 'MIN_COMPATIBLE_VERSION', "1.1.0"):
+                data, from_version = migrate_data(sample_old_json_structure, "T1.json")
+        finally:
+            del MIGRATIONS["1.0.0"]
+
+        assert from_version == LEGACY_VERSION
+        assert data['metrika_version'] == "1.1.0"
+        assert data['curs'] == "2024-25"
+
+    def test_duplicate_migration_is_rejected(self):
+        """Test that a version can only have one migration"""
+        with pytest.raises(ValueError):
+            register_migration(LEGACY_VERSION, "1.0.0")(lambda data, filename: data)
+
+
+class TestMigratedLoading:
+    """Test that old files are migrated once and keep their legacy file info"""
+
+    def test_old_file_is_migrated_on_load(self, temp_test_dir, sample_old_json_structure):
+        """Test that an old file is loaded without writing anything besides it"""
+        with open(os.path.join(temp_test_dir, "T1.json"), 'w', encoding='utf-8') as f:
+            json.dump(sample_old_json_structure, f)
+
+        students, file_info, version_warnings = load_json_files(temp_test_dir, ["T1.json"])
+
+        assert os.listdir(temp_test_dir) == ["T1.json"]
+        assert students[0]['grup'] == "Grup Antic"
+        assert file_info["T1.json"] == {
+            'display_name': "Grup_Antic_T1",
+            'grup': "Grup Antic",
+            'trimestre': "T1",
+            'version': LEGACY_VERSION
+        }
+        assert version_warnings == ["⚠️ T1.json: Format antic sense informació de versió"]
+
+    def test_migrated_file_is_cached(self, temp_test_dir, sample_old_json_structure, migration_cache):
+        """Test that the second load reads the migrated file from the cache with the same file info"""
+        with open(os.path.join(temp_test_dir, "T1.json"), 'w', encoding='utf-8') as f:
+            json.dump(sample_old_json_structure, f)
+
+        first = load_json_files(temp_test_dir, ["T1.json"], migration_cache=migration_cache)
+        with patch('app.migrate_data', wraps=app.migrate_data) as mock_migrate:
+            second = load_json_files(temp_test_dir, ["T1.json"], migration_cache=migration_cache)
+
+        mock_migrate.assert_not_called()
+        assert second == first
+        assert second[1]["T1.json"]['display_name'] == "Grup_Antic_T1"
+        assert len(migration_cache.manifest) == 1
+        assert migration_cache.max_size == DEFAULT_MIGRATION_MAX_SIZE
+
+    def test_probe_old_file(self, sample_old_json_structure):
+        """Test that the header of an old file is read without decoding its students"""
+        content = json.dumps(sample_old_json_structure).encode('utf-8')
+
+        with patch('app.decode_student_file') as mock_decode:
+            header = probe_data_file(content, "T3.json")
+
+        mock_decode.assert_not_called()
+        assert header == {'grup': "Grup Antic", 'trimestre': "T3", 'metrika_version': AppConfig.MIN_COMPATIBLE_VERSION,
+                          'migrated_from': LEGACY_VERSION}
+        assert describe_data_file(header, "T3.json")[0]['display_name'] == "Grup_Antic_T3"
+        assert decode_data_file(content, "T3.json")['estudiants'] == sample_old_json_structure
+
+    def test_current_file_info_is_unchanged(self, sample_json_structure):
+        """Test that only old list files get the legacy file info"""
+        file_info, version_warnings = describe_data_file(sample_json_structure, "T1.json")
+
+        assert file_info['display_name'] == f"{sample_json_structure['grup']}_{sample_json_structure['trimestre']}"
+        assert file_info['version'] == sample_json_structure['metrika_version']
+        assert version_warnings == []
@@ -0,0 +1,155 @@
+"""
+Tests for the background prefetch of uploaded files
+"""
+import pytest
+import threading
+import time
+from streamlit.testing.v1 import AppTest
+
+from utils.prefetch import PrefetchCache
+
+
+@pytest.fixture
+def prefetch_cache():
+    cache = PrefetchCache(max_workers=2, max_entries=4)
+    yield cache
+    cache.shutdown()
+
+
+class TestPrefetchCache:
+    """Test the thread-safe cache"""
+
+    def test_value_is_computed_once(self, prefetch_cache):
+        """Test that concurrent callers of a key share one computation"""
+        calls = []
+
+        def slow(value):
+            calls.append(value)
+            time.sleep(0.05)
+            return value * 2
+
+        assert prefetch_cache.prefetch("a", slow, 21)
+        assert not prefetch_cache.prefetch("a", slow, 21)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(prefetch_cache.get("a", slow, 21))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        prefetch_cache.wait()
+
+        assert results == [42, 42, 42]
+        assert calls == [21]
+        assert prefetch_cache.ready("a")
+
+    def test_failures_are_not_cached(self, prefetch_cache):
+        """Test that a failed computation is retried by the next caller"""
+        prefetch_cache.prefetch("a", lambda: 1 / 0)
+        prefetch_cache.wait()
+
+        assert "a" not in prefetch_cache
+        with pytest.raises(ZeroDivisionError):
+            prefetch_cache.get("a", lambda: 1 / 0)
+        assert prefetch_cache.get("a", lambda: 1) == 1
+
+    def test_oldest_entries_are_evicted(self, prefetch_cache):
+        """Test that the cache keeps the most recently used entries"""
+        for key in "abcd":
+            prefetch_cache.get(key, str, key)
+        prefetch_cache.get("a", str, "a")
+        prefetch_cache.get("e", str, "e")
+
+        assert len(prefetch_cache) == 4
+        assert "b" not in prefetch_cache
+        assert "a" in prefetch_cache
+
+
+    def test_tasks_without_stored_results(self, prefetch_cache):
+        """Test that store=False runs the task once at a time without caching its result"""
+        prefetch_cache.prefetch("tasca", prefetch_cache.get, "a", str, "a", store=False)
+        prefetch_cache.wait()
+
+        assert "tasca" not in prefetch_cache
+        assert prefetch_cache.ready("a")
+
+    def test_reserve_only_grows(self, prefetch_cache):
+        """Test that reserving entries never shrinks the cache"""
+        prefetch_cache.reserve(10)
+        prefetch_cache.reserve(2)
+
+        assert prefetch_cache.max_entries == 10
+
+
+class TestUploadPrefetch:
+    """Test that the other trimesters are ready after a prefetch"""
+
+    def test_prefetched_files_are_not_decoded_again(self):
+        """Test that loading prefetched files and their evolution dataset does not decode them again"""
+        def script():
+            import json
+            from unittest.mock import Mock, patch
+            import streamlit as st
+            import app
+            
+            files = []
+            for name, trimestre in (("T1.json", "Primer trimestre"), ("T2.json", "Segon trimestre")):
+                mock_file = Mock()
+                mock_file.name = name
+                mock_file.read.return_value = json.dumps({
+                    "grup": "4Z",
+                    "trimestre": trimestre,
+                    "estudiants": [{"id": "1", "nom_cognoms": f"Prefetch {name}", "materies": [
+                        {"materia": "Matemàtiques 3r", "qualificacio": "Assoliment notable", "comentari": ""}
+                    ]}],
+                    "metrika_version": "1.0.0"
+                }).encode('utf-8')
+                files.append(mock_file)
+            file_info, _ = app.probe_uploaded_files(files)
+            
+            app.prefetch_uploaded_files(files, file_info)
+            app.get_prefetch_cache().wait()
+            with patch('app.decode_data_file') as mock_decode, patch('app.MarksDataset.from_students') as mock_build:
+                students, group_info, _ = app.load_uploaded_json_files(files)
+                marks = app.load_marks_dataset(students, group_info, ["T1.json", "T2.json"])
+            st.write(f"{mock_decode.call_count}|{mock_build.call_count}|{len(students)}|{'/'.join(marks.trimesters)}")
+        
+        at = AppTest.from_function(script).run()
+        
+        assert not at.exception
+        assert at.markdown[0].value == "0|0|2|Primer trimestre/Segon trimestre"
+    
+    def test_many_uploads_are_not_evicted(self):
+        """Test that prefetching more files than the default cache size keeps all of them"""
+        def script():
+            import json
+            from unittest.mock import Mock, patch
+            import streamlit as st
+            import app
+            
+            files = []
+            for i in range(40):
+                mock_file = Mock()
+                mock_file.name = f"T{i}.json"
+                mock_file.read.return_value = json.dumps({
+                    "grup": "4Y",
+                    "trimestre": f"Trimestre {i}",
+                    "estudiants": [{"id": "1", "nom_cognoms": "Prefetch", "materies": []}],
+                    "metrika_version": "1.0.0"
+                }).encode('utf-8')
+                files.append(mock_file)
+            file_info, _ = app.probe_uploaded_files(files)
+            
+            app.prefetch_uploaded_files(files, file_info)
+            app.get_prefetch_cache().wait()
+            prefetch_cache = app.get_prefetch_cache()
+            markers = sum(1 for key in prefetch_cache._futures if key[0] in ('indexat', 'evolucio'))
+            with patch('app.decode_data_file') as mock_decode:
+                app.prefetch_uploaded_files(files, file_info)
+                app.get_prefetch_cache().wait()
+                students, _, _ = app.load_uploaded_json_files(files)
+            st.write(f"{mock_decode.call_count}|{markers}|{len(students)}")
+        
+        at = AppTest.from_function(script).run()
+        
+        assert not at.exception
+        assert at.markdown[0].value == "0|0|40"
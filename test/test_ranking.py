@@ -0,0 +1,82 @@
+"""
+Tests for the vectorized student ranking
+"""
+import numpy as np
+from unittest.mock import patch
+
+from sections.visualization import display_student_ranking
+from utils.marks_dataset import MarksDataset
+from utils.ranking import bottom_k, group_ranks, percentile_ranks, rank_order, ranking_frame, top_k
+
+
+def make_student(student_id, grup, marks):
+    return {"id": student_id, "nom_cognoms": f"Alumne {student_id}", "grup": grup, "trimestre": "T1", "materies": [
+        {"materia": f"Materia {j}", "qualificacio": mark, "comentari": ""} for j, mark in enumerate(marks)
+    ]}
+
+
+class TestRankingEngine:
+    """Test ordering, top-k and percentiles of an array of averages"""
+
+    def test_order_and_top_k(self):
+        """Test that the highest values come first and NaN values are left out of top and bottom k"""
+        values = np.array([5.0, np.nan, 10.0, 2.5, 7.5, 5.0])
+
+        assert rank_order(values).tolist() == [2, 4, 0, 5, 3, 1]
+        assert top_k(values, 2).tolist() == [2, 4]
+        assert bottom_k(values, 2).tolist() == [3, 5]
+        assert top_k(values, 10).tolist() == [2, 4, 0, 5, 3]
+        assert top_k(values, 0).tolist() == []
+
+    def test_top_k_matches_a_full_sort(self):
+        """Test argpartition selection against sorting thousands of values"""
+        values = np.random.default_rng(0).random(5000)
+
+        assert top_k(values, 25).tolist() == np.argsort(-values)[:25].tolist()
+        assert bottom_k(values, 25).tolist() == np.argsort(values)[:25].tolist()
+
+    def test_ranks_and_percentiles_per_group(self):
+        """Test that ties share a position and groups are ranked at once"""
+        values = np.array([5.0, 7.5, 5.0, np.nan, 10.0, 2.5])
+        groups = np.array([0, 0, 0, 0, 1, 1])
+
+        assert group_ranks(values).tolist() == [3, 2, 3, 0, 1, 5]
+        assert group_ranks(values, groups).tolist() == [2, 1, 2, 0, 1, 2]
+        np.testing.assert_allclose(percentile_ranks(values, groups), [100 / 3, 500 / 6, 100 / 3, np.nan, 75, 25])
+
+
+class TestRankingFrame:
+    """Test the ranking of a MarksDataset"""
+
+    def test_school_wide_ranking(self):
+        """Test the ranking of students of several groups"""
+        marks = MarksDataset.from_students([
+            make_student("1", "3A", ["Assoliment notable", "Assoliment excel·lent"]),
+            make_student("2", "3A", ["No assoliment"]),
+            make_student("3", "3B", ["Assoliment satisfactori"]),
+            make_student("4", "3B", [""])
+        ])
+
+        ranking = ranking_frame(marks)
+        assert ranking['nom'].tolist() == ["Alumne 1", "Alumne 3", "Alumne 2", "Alumne 4"]
+        assert ranking['id'].tolist() == ["1", "3", "2", "4"]
+        assert ranking['grup'].tolist() == ["3A", "3B", "3A", "3B"]
+        assert ranking['posicio'].tolist() == [1, 2, 3, 0]
+
+        by_group = ranking_frame(marks, by_group=True)
+        assert by_group['posicio'].tolist() == [1, 1, 2, 0]
+        assert by_group['percentil'].tolist()[:3] == [75.0, 50.0, 25.0]
+
+    def test_display_ranking_highlights_top_and_bottom(self):
+        """Test the ranking table shown in the Grup tab"""
+        students = [make_student(str(i), "3A", ["Assoliment notable"] * (i % 4) + ["No assoliment"]) for i in range(12)]
+        with patch('sections.visualization.st') as mock_st:
+            display_student_ranking(students)
+            styled = mock_st.dataframe.call_args[0][0]
+
+        table = styled.data
+        assert list(table.columns) == ["Alumne", "Mitjana (0-10)", "Percentil"]
+        assert table["Mitjana (0-10)"].is_monotonic_decreasing
+        styles = styled._compute().ctx
+        assert [row for (row, _), css in styles.items() if ('background-color', '#218739') in css] == [0, 1, 2, 3, 4]
+        assert [row for (row, _), css in styles.items() if ('background-color', '#ffb3b3') in css] == [7, 8, 9, 10, 11]
@@ -0,0 +1,83 @@
+"""
+Tests for the immutable student records built by the loaders
+"""
+import pytest
+import copy
+import json
+
+from app import decode_data_file, parse_data_file
+from utils.student_records import FileMetadata, MateriaEntry, StudentEntry, make_student
+
+
+@pytest.fixture
+def file_metadata():
+    return FileMetadata("3B", "Primer trimestre", "3B_Primer trimestre", "1.0.0")
+
+
+class TestStudentRecords:
+    """Test the records and their mapping interface"""
+
+    def test_record_reads_like_a_dictionary(self, sample_students_data, file_metadata):
+        """Test that a record has the fields of the loaded student dictionaries"""
+        student = make_student(sample_students_data[0], file_metadata)
+
+        assert student['id'] == "12345"
+        assert student['trimestre'] == "Primer trimestre"
+        assert student['file_display_name'] == "3B_Primer trimestre"
+        assert student['materies'][0]['qualificacio'] == "Assoliment notable"
+        assert student.get('comentari_general') is None
+        assert 'comentari_general' not in student
+        assert student == {**sample_students_data[0], 'trimestre': "Primer trimestre", 'grup': "3B",
+                           'file_display_name': "3B_Primer trimestre"}
+
+    def test_records_are_read_only(self, sample_students_data, file_metadata):
+        """Test that records cannot be modified as dictionaries"""
+        student = make_student(sample_students_data[0], file_metadata)
+
+        with pytest.raises(TypeError):
+            student['grup'] = "3C"
+        with pytest.raises(TypeError):
+            student['materies'][0]['qualificacio'] = "No assoliment"
+        with pytest.raises(AttributeError):
+            student.materies.append(MateriaEntry("Música"))
+
+    def test_extra_fields_are_kept(self, file_metadata):
+        """Test that fields outside the schema stay available"""
+        student = make_student({'id': 7, 'nom_cognoms': "Anna", 'materies': [], 'tutor': "Pere"}, file_metadata)
+
+        assert isinstance(student, StudentEntry)
+        assert student['id'] == "7"
+        assert student['tutor'] == "Pere"
+        assert set(student) == {'id', 'nom_cognoms', 'materies', 'tutor', 'trimestre', 'grup', 'file_display_name'}
+
+
+class TestLoadedRecords:
+    """Test the records built by parse_data_file"""
+
+    def test_file_metadata_is_shared(self, sample_json_structure, sample_students_data):
+        """Test that the students of a file share one FileMetadata and the decoded data is left unchanged"""
+        sample_json_structure['estudiants'] = sample_students_data
+        data = decode_data_file(json.dumps(sample_json_structure).encode('utf-8'), "T1.json")
+        decoded = copy.deepcopy(data)
+
+        students, file_info, _ = parse_data_file(data, "T1.json")
+
+        assert data == decoded
+        assert students[0].file is students[1].file
+        assert students[0]['grup'] == file_info['grup']
+        assert 'trimestre' not in data['estudiants'][0]
+
+    def test_extra_fields_survive_decoding(self, sample_json_structure):
+        """Test that student and materia fields outside the schema reach the loaded records"""
+        sample_json_structure['estudiants'][0]['tutor'] = "Pere"
+        sample_json_structure['estudiants'][0]['materies'][0]['extra_m'] = 3
+        data = decode_data_file(json.dumps(sample_json_structure).encode('utf-8'), "T1.json")
+
+        students, _, _ = parse_data_file(data, "T1.json")
+
+        assert students[0].extra == {'tutor': "Pere"}
+        assert students[0]['tutor'] == "Pere"
+        assert students[0]['materies'][0].extra == {'extra_m': 3}
+        assert students[0]['materies'][0]['extra_m'] == 3
+        assert students[0].to_dict()['materies'][0]['extra_m'] == 3
+        assert students[0]['materies'][0].to_dict() == sample_json_structure['estudiants'][0]['materies'][0]
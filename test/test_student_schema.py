@@ -0,0 +1,134 @@
+"""
+Tests for the typed decoding of student JSON files
+"""
+import pytest
+import io
+import json
+import re
+from unittest.mock import patch
+
+import utils.student_schema
+from utils.student_schema import (
+    available_backends,
+    decode_student_file,
+    default_backend,
+    probe_student_file,
+)
+
+
+BACKENDS = available_backends()
+
+
+class TestStudentSchema:
+    """Test that every backend decodes and validates the same way"""
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_decode_new_structure(self, backend, sample_json_structure):
+        """Test decoding the grup/trimestre/estudiants structure"""
+        content = json.dumps(sample_json_structure).encode('utf-8')
+        
+        data = decode_student_file(content, backend)
+        
+        assert data == sample_json_structure
+        assert decode_student_file(io.BytesIO(content), backend) == data
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_decode_old_structure_keeps_unknown_fields(self, backend):
+        """Test decoding a bare list of students with extra fields"""
+        students = [
+            {"id": 12, "nom_cognoms": "Joan", "materies": [{"materia": "Mat", "extra": 1}], "altres": "x"},
+            {"id": None, "nom_cognoms": "Sense id", "materies": []}
+        ]
+        
+        data = decode_student_file(json.dumps(students).encode('utf-8'), backend)
+        
+        assert data == students
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("document, where", [
+        ({"grup": "3B"}, "estudiants"),
+        ({"estudiants": [{"id": "1", "nom_cognoms": 3, "materies": []}]}, "$.estudiants[0].nom_cognoms"),
+        ({"estudiants": [{"id": True, "nom_cognoms": "Joan", "materies": []}]}, "$.estudiants[0].id"),
+        ({"estudiants": [{"id": "1", "nom_cognoms": "Joan"}]}, "materies"),
+        ("text", "str"),
+    ])
+    def test_invalid_documents(self, backend, document, where):
+        """Test that schema errors are reported with their location"""
+        with pytest.raises(ValueError, match=re.escape(where)):
+            decode_student_file(json.dumps(document).encode('utf-8'), backend)
+    
+    def test_backends(self):
+        """Test the backend selection"""
+        assert 'json' in BACKENDS
+        assert default_backend() == BACKENDS[0] == 'json'
+        with pytest.raises(ValueError):
+            decode_student_file(b"[]", "ujson")
+
+
+class TestStudentFileProbe:
+    """Test reading the header of a student file without its students"""
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_probe_header(self, backend, sample_json_structure):
+        """Test header fields before and after the students array"""
+        content = json.dumps(sample_json_structure, indent=2).encode('utf-8')
+        
+        header = probe_student_file(content, backend)
+        
+        assert header == {"grup": "3B", "trimestre": "Primer trimestre", "metrika_version": "1.0.0"}
+        assert probe_student_file(io.BytesIO(content), backend) == header
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("content, header", [
+        (b' [{"id": "1", "nom_cognoms": "Joan", "materies": []}]', []),
+        (b'{"estudiants": [], "grup": "x]"}', {"grup": "x]"}),
+        (b'{"grup": "A", "estudiants": [{"id": "]", "nom_cognoms": "}]", "materies": []}]}', {"grup": "A"}),
+    ])
+    def test_probe_edge_cases(self, backend, content, header):
+        """Test old files and brackets inside strings"""
+        assert probe_student_file(content, backend) == header
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_probe_fields_after_the_students(self, backend):
+        """Test a list of objects and escaped quotes after the students array"""
+        data = {
+            "grup": "3B",
+            "estudiants": [{"id": "1", "nom_cognoms": "Joan \\\"}]\"", "materies": []}],
+            "historial": [{"trimestre": "T1"}, {"trimestre": "T2]"}],
+            "metrika_version": "1.0.0"
+        }
+        content = json.dumps(data).encode('utf-8')
+        
+        header = probe_student_file(content, backend)
+        
+        assert header == {"grup": "3B", "metrika_version": "1.0.0"}
+    
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7])
+    def test_probe_reads_small_chunks(self, chunk_size, sample_json_structure):
+        """Test that tokens, escapes and multi-byte characters split across chunks are read by the stdlib scan"""
+        sample_json_structure['estudiants'][0]['nom_cognoms'] = 'Pérez \\"[{'
+        sample_json_structure['trimestre'] = "Tercer trimestre é"
+        sample_json_structure['curs'] = 2025
+        content = json.dumps(sample_json_structure, ensure_ascii=False).encode('utf-8')
+        
+        with patch.object(utils.student_schema, 'PROBE_CHUNK_SIZE', chunk_size), \
+                patch('utils.student_schema.decode_student_file') as mock_decode:
+            header = probe_student_file(content, 'json')
+        
+        mock_decode.assert_not_called()
+        assert header == {"grup": "3B", "trimestre": "Tercer trimestre é", "metrika_version": "1.0.0"}
+    
+    def test_probe_falls_back_to_a_full_decode(self):
+        """Test that content the scan cannot read is decoded as a whole"""
+        with patch('utils.student_schema.decode_student_file', wraps=decode_student_file) as mock_decode:
+            with pytest.raises(ValueError):
+                probe_student_file(b'{"estudiants": [] "grup": "A"}', 'json')
+        
+        mock_decode.assert_called_once()
+    
+    @pytest.mark.parametrize("backend", BACKENDS)
+    @pytest.mark.parametrize("content", [b'{"grup": "A"}', b'{"grup": 1, "estudiants": []}', b'"text"', b'{"estudiants": [}'])
+    def test_probe_invalid(self, backend, content):
+        """Test that files without a valid header are rejected"""
+        with pytest.raises(ValueError):
+            probe_student_file(content, backend)
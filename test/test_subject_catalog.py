@@ -0,0 +1,72 @@
+"""
+Tests for the parsed subject names used by the course filters
+"""
+import pytest
+
+from utils.marks_dataset import MarksDataset
+from utils.subject_catalog import SubjectCatalog, parse_subject
+
+
+class TestParseSubject:
+    """Test parsing one subject name"""
+
+    @pytest.mark.parametrize("name, canonical, levels, stage, area", [
+        ("Matemàtiques 3r", "Matemàtiques", {"3r"}, "ESO", "MAT"),
+        ("Física i Química 3R", "Física i Química", set(), "ESO", "FQ"),
+        ("Matèria de l'àmbit 3 - 2n d'ESO", "Matèria de l'àmbit 3", {"2n"}, "ESO", None),
+        ("Llengua Catalana 1r de Batxillerat", "Llengua Catalana", {"1r"}, "Batxillerat", "CAT"),
+        ("Educació Física 4t", "Educació Física", {"4t"}, "ESO", "EDF"),
+        ("Anglès", "Anglès", set(), "ESO", "ANG"),
+    ])
+    def test_parse_subject(self, name, canonical, levels, stage, area):
+        """Test the course levels, stage, canonical name and area of a subject"""
+        subject = parse_subject(name)
+
+        assert subject.canonical == canonical
+        assert subject.levels == levels
+        assert subject.stage == stage
+        assert subject.area == area
+
+    def test_course_levels_are_substrings(self):
+        """Test that course levels are found anywhere in the name, with their case"""
+        assert parse_subject("Taller 13r").levels == {"3r"}
+        assert parse_subject("MAT_3r").levels == {"3r"}
+        assert parse_subject("MAT_3R").levels == set()
+        assert parse_subject("MAT_3R").folded_bits == parse_subject("MAT_3r").bits
+
+
+class TestSubjectCatalog:
+    """Test the course filters of a catalog"""
+
+    def test_masks_and_sets(self):
+        """Test that the level bitmasks and sets select the same subjects"""
+        catalog = SubjectCatalog(["Mat 3r", "Cat 1r", "Hist", "Fil 1r Batx", "Tec 4t"])
+
+        assert catalog.mask(["1r"]).tolist() == [False, True, False, True, False]
+        assert catalog.mask(["1r"], stage="ESO").tolist() == [False, True, False, False, False]
+        assert catalog.mask([]).tolist() == [False] * 5
+        assert catalog.names_of(["1r", "3r"]) == {"Mat 3r", "Cat 1r", "Fil 1r Batx"}
+        assert catalog.names_of(["4t"], stage="Batxillerat") == set()
+        assert catalog.levels() == ["1r", "3r", "4t"]
+
+    def test_mask_ignoring_case(self):
+        """Test the case-insensitive filter of the student marks table"""
+        catalog = SubjectCatalog(["Mat 3R", "Cat 3r", float('nan'), "Tec 4t"])
+
+        assert catalog.mask(["3r"]).tolist() == [False, True, False, False]
+        assert catalog.mask(["3r"], case=False).tolist() == [True, True, False, False]
+        assert catalog.mask(["3R"], case=False).tolist() == [True, True, False, False]
+        assert catalog.mask(["Tec"]).tolist() == [False, False, False, True]
+
+    def test_marks_dataset_filters_with_the_catalog(self):
+        """Test that MarksDataset.materia_mask keeps the substring course filter"""
+        marks = MarksDataset.from_students([
+            {"id": "1", "nom_cognoms": "Joan", "trimestre": "T1", "materies": [
+                {"materia": "Mat 3r", "qualificacio": "Assoliment notable", "comentari": ""},
+                {"materia": "Taller 13r", "qualificacio": "", "comentari": ""},
+                {"materia": "Hist 4t", "qualificacio": "", "comentari": ""}
+            ]}
+        ])
+
+        assert marks.materies[marks.materia_mask(["3r"])].tolist() == ["Mat 3r", "Taller 13r"]
+        assert marks.materies[marks.materia_mask(["4t"])].tolist() == ["Hist 4t"]
@@ -0,0 +1,131 @@
+"""
+Tests for the bulk validation of loaded students and CSV rows
+"""
+import pytest
+import json
+import pandas as pd
+
+from app import decode_data_file, parse_data_file
+from utils.csv_to_json import resolve_csv_schema, validate_csv_frame
+from utils.validation import ValidationReport, validate_students
+
+
+def student(student_id, name, materies):
+    return {'id': student_id, 'nom_cognoms': name, 'materies': materies}
+
+
+class TestValidateStudents:
+    """Test the report of a list of decoded students"""
+
+    def test_valid_students(self, sample_students_data):
+        """Test that valid students give an empty report"""
+        report = validate_students(sample_students_data)
+
+        assert report.ok
+        assert report.messages() == []
+        assert not report.skipped_mask().any()
+
+    def test_all_errors_are_reported(self):
+        """Test that every malformed student is reported instead of the first one"""
+        students = [
+            student(None, "Anna", []),
+            "no és un estudiant",
+            student("2", " ", [{'materia': "Català", 'qualificacio': "Assoliment satisfactori"}]),
+            {'id': "3", 'nom_cognoms': "Pau"},
+            student("NULL", "Joan", []),
+            student("5", "Marta", [{'materia': "Anglès", 'qualificacio': "Exempt"}, {'materia': ""}, 7]),
+            student("5", "Marta", [{'materia': "Anglès"}, {'materia': "Anglès", 'qualificacio': "No assoliment"}])
+        ]
+
+        report = validate_students(students)
+
+        assert report.counts() == {
+            'registre_invalid': 1,
+            'id_absent': 2,
+            'nom_absent': 1,
+            'materies_invalides': 1,
+            'id_repetit': 2,
+            'materia_sense_nom': 1,
+            'materia_repetida': 1,
+            'qualificacio_desconeguda': 1
+        }
+        assert report.rows('id_absent').tolist() == [0, 4]
+        assert report.rows('materia_sense_nom').tolist() == [5]
+        assert report.rows('materia_repetida').tolist() == [6]
+        assert report.skipped_mask().tolist() == [True, True, True, True, True, False, False]
+
+    def test_qualification_without_materia(self):
+        """Test that a qualification on a materia with a blank name is reported with the unnamed materia"""
+        students = [
+            student("1", "Anna", [{'materia': " ", 'qualificacio': "Assoliment notable"}, {'materia': "Català"}]),
+            student("2", "Pau", [{'materia': "", 'qualificacio': ""}, {'qualificacio': None}])
+        ]
+
+        report = validate_students(students)
+
+        assert report.rows('materia_sense_nom').tolist() == [0, 1]
+        assert report.rows('qualificacio_sense_materia').tolist() == [0]
+        assert not report.skipped_mask().any()
+
+    def test_messages(self):
+        """Test that messages give the count and the first rows of each kind"""
+        report = ValidationReport(20, {'id_absent': range(12), 'id_repetit': [15, 14]})
+
+        assert report.messages() == [
+            "12 estudiants sense id (s'ometen) (files 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, ...)",
+            "2 estudiants amb l'id repetit (files 14, 15)"
+        ]
+        assert report.to_dict()['errors']['id_repetit'] == {'total': 2, 'files': [14, 15]}
+
+
+class TestValidatedLoading:
+    """Test that the loaders keep the valid students of a malformed file"""
+
+    def test_malformed_student_is_skipped(self, sample_json_structure):
+        """Test that one malformed student does not drop the whole file"""
+        sample_json_structure['estudiants'].append({'id': "9", 'nom_cognoms': "Sense matèries"})
+        content = json.dumps(sample_json_structure).encode('utf-8')
+
+        students, _, warnings = parse_data_file(decode_data_file(content, "T1.json"), "T1.json")
+
+        assert [s['id'] for s in students] == ["12345"]
+        assert warnings == ["⚠️ T1.json: 1 estudiants sense llista de matèries (s'ometen) (files 1)"]
+
+    def test_unnamed_materies_are_dropped(self, sample_json_structure):
+        """Test that materies without name are removed from a loaded student"""
+        sample_json_structure['estudiants'][0]['materies'].append({'materia': " ", 'qualificacio': "Assoliment satisfactori"})
+        content = json.dumps(sample_json_structure).encode('utf-8')
+
+        students, _, warnings = parse_data_file(decode_data_file(content, "T1.json"), "T1.json")
+
+        assert all(m['materia'].strip() for m in students[0]['materies'])
+        assert warnings == [
+            "⚠️ T1.json: 1 estudiants amb matèries sense nom (files 0)",
+            "⚠️ T1.json: 1 estudiants amb qualificacions sense matèria (files 0)"
+        ]
+
+
+class TestValidateCsvFrame:
+    """Test the report of the rows of an Esfera CSV"""
+
+    def test_csv_errors(self):
+        """Test the row level errors of a CSV DataFrame"""
+        df = pd.DataFrame({
+            'id': ["1", "2", None, "2", "5"],
+            'nom_cognoms': ["Anna", "", "Pau", "Joan", "Marta"],
+            'comentari general': [""] * 5,
+            'm1': ["Català", "Català", "Català", None, "Anglès"],
+            'q1': ["Assoliment satisfactori", "Exempt", "No assoliment", "Assoliment notable", "Assoliment excel·lent"],
+            'm2': ["Anglès", None, "Català", None, "Anglès"],
+            'q2': ["Assoliment excel·lent", None, "Assoliment satisfactori", None, "No assoliment"]
+        })
+
+        report = validate_csv_frame(df, resolve_csv_schema(df.columns))
+
+        assert report.rows('id_absent').tolist() == [2]
+        assert report.rows('nom_absent').tolist() == [1]
+        assert report.rows('id_repetit').tolist() == [1, 3]
+        assert report.rows('qualificacio_desconeguda').tolist() == [1]
+        assert report.rows('qualificacio_sense_materia').tolist() == [3]
+        assert report.rows('materia_repetida').tolist() == [2, 4]
+        assert report.skipped_mask().tolist() == [False, True, True, False, False]
@@ -6,7 +6,7 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 
 from sections.visualization import (
     display_marks_pie_chart,
@@ -289,6 +289,32 @@ class TestHeatmapVisualization:
             # Should still generate heatmap
             mock_st.plotly_chart.assert_called_once()
 
+    
+    def test_large_group_heatmap_is_tiled(self):
+        """Test that a large group is shown one tile of students at a time with coded hover labels"""
+        students = [
+            {"id": str(i), "nom_cognoms": f"Alumne {i:04d}", "materies": [
+                {"materia": "Matemàtiques 3r", "qualificacio": MarkConfig.LIST.value[i % 4], "comentari": ""},
+                {"materia": "Català 3r", "qualificacio": "", "comentari": ""}
+            ]}
+            for i in range(450)
+        ]
+        with patch('sections.visualization.st') as mock_st:
+            mock_st.columns.return_value = (MagicMock(), MagicMock(), MagicMock())
+            mock_st.checkbox.side_effect = [False, False, True]
+            mock_st.selectbox.side_effect = lambda label, options, **kwargs: options[2]
+            display_student_subject_heatmap(students)
+            
+            fig = mock_st.plotly_chart.call_args[0][0]
+        
+        heatmap = fig.data[0]
+        assert list(heatmap.y) == [f"Alumne {i:04d}" for i in range(400, 450)]
+        assert list(heatmap.x) == ["Català 3r", "Matemàtiques 3r"]
+        assert heatmap.customdata[0].tolist() == ["N/A", "NA"]
+        assert heatmap.customdata[1].tolist() == ["N/A", "AS"]
+        assert "%{customdata}" in heatmap.hovertemplate
+        assert heatmap.text is None
+
 
 class TestSubjectStatistics:
     """Test subject statistics functionality"""
@@ -330,6 +356,27 @@ class TestSubjectStatistics:
             
             # Should generate multiple charts (one per subject)
             assert mock_st.plotly_chart.call_count >= 3
+    
+    def test_comments_of_repeated_subject_entries(self):
+        """Test that every entry of a subject repeated in a record shows its comment"""
+        students = [{
+            "id": "1",
+            "nom_cognoms": "Student 1",
+            "materies": [
+                {"materia": "Mat 3r", "qualificacio": "No assoliment", "comentari": "Primera"},
+                {"materia": "Cat 3r", "qualificacio": "Assoliment notable", "comentari": ""},
+                {"materia": "Mat 3r", "qualificacio": "Assoliment satisfactori", "comentari": "Segona"}
+            ]
+        }]
+        
+        with patch('sections.visualization.st') as mock_st:
+            mock_st.columns.side_effect = lambda n: [MagicMock() for _ in range(n)]
+            mock_st.selectbox.return_value = "Mat 3r"
+            display_subject_statistics(students)
+            
+            comments = mock_st.dataframe.call_args[0][0]
+            assert comments['Comentari'].tolist() == ["Primera", "Segona"]
+            assert comments['Qualificació'].tolist() == ["No assoliment", "Assoliment satisfactori"]
 
 
 class TestDataFrameOperations:
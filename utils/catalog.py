@@ -0,0 +1,380 @@
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import pandas as pd
+from utils.marks_dataset import mark_code
+from utils.student_records import FileMetadata, make_student, materia_extra, student_extra
+
+logger = logging.getLogger(__name__)
+
+# Default location of the catalog database
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.metrika', 'catalog.sqlite3')
+
+# Files are replaced by a new version of the same file name, group and trimester of a curs
+FILES_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY,
+    curs TEXT NOT NULL,
+    grup TEXT NOT NULL,
+    trimestre TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    metrika_version TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    warnings TEXT NOT NULL,
+    ingested_at TEXT NOT NULL,
+    UNIQUE (curs, grup, trimestre, filename)
+);
+"""
+
+# Key of the files table in catalogs created before files were told apart by file name
+LEGACY_FILES_KEY = 'UNIQUE (curs, grup, trimestre)'
+
+SCHEMA = FILES_TABLE.format(name='files') + """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    student_id TEXT NOT NULL,
+    nom_cognoms TEXT NOT NULL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS marks (
+    student INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+    subject INTEGER NOT NULL REFERENCES subjects (id),
+    position INTEGER NOT NULL,
+    qualificacio TEXT,
+    code INTEGER NOT NULL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS comments (
+    student INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+    subject INTEGER REFERENCES subjects (id),
+    text TEXT NOT NULL,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_files_grup ON files (grup);
+CREATE INDEX IF NOT EXISTS idx_files_trimestre ON files (trimestre);
+CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files (content_hash);
+CREATE INDEX IF NOT EXISTS idx_students_file ON students (file_id, position);
+CREATE INDEX IF NOT EXISTS idx_students_student_id ON students (student_id);
+CREATE INDEX IF NOT EXISTS idx_marks_student ON marks (student, position);
+CREATE INDEX IF NOT EXISTS idx_marks_subject ON marks (subject, code);
+CREATE INDEX IF NOT EXISTS idx_comments_student ON comments (student, subject);
+"""
+
+# Filters accepted by the queries and the column they apply to
+FILTER_COLUMNS = {
+    'curs': 'f.curs',
+    'grup': 'f.grup',
+    'trimestre': 'f.trimestre',
+    'materia': 'sub.name',
+    'id': 's.student_id'
+}
+
+# Columns added after the first version of the schema, added to older catalogs when opened
+ADDED_COLUMNS = (('students', 'extra', 'TEXT'), ('marks', 'extra', 'TEXT'), ('comments', 'position', 'INTEGER'))
+
+# Mark columns of mark_counts and their code (see utils.marks_dataset)
+COUNT_COLUMNS = {'NA': 1, 'AS': 2, 'AN': 3, 'AE': 4}
+
+
+def current_school_year(today=None):
+    """Return the school year of a date as '2024-25', school years start in September"""
+    today = today or datetime.date.today()
+    start = today.year if today.month >= 9 else today.year - 1
+    return f"{start}-{str(start + 1)[-2:]}"
+
+
+def _dump_extra(extra):
+    """JSON text of the extra fields of a student or materia, None without them"""
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+class StudentCatalog:
+    """
+    Local SQLite catalog of loaded student files.
+
+    Every file is stored once per school year (curs), group, trimester and
+    file name, split into students, subjects, marks and comments tables indexed by
+    group, trimester, subject and student id. Files are identified by their
+    content hash, so unchanged files are not ingested again and their
+    students can be loaded back without decoding the JSON file. Student and
+    materia fields outside those columns are stored as JSON in ``extra``.
+
+    One connection is shared by the threads of every Streamlit session, so
+    each method holds a lock while it uses it.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Streamlit reruns the script in different threads
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        # Rebuilt before enabling foreign keys, so that dropping the old table keeps the students
+        self._upgrade_files_key()
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        for table, column, column_type in ADDED_COLUMNS:
+            columns = [row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _upgrade_files_key(self):
+        """
+        Rebuild the files table of catalogs keyed by curs, grup and trimester
+        only (LEGACY_FILES_KEY), where files of the same group, such as
+        different old files of 'Grup Antic', replaced each other.
+        """
+        row = self.connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'files'").fetchone()
+        if row is None or LEGACY_FILES_KEY not in row[0]:
+            return
+        with self.connection:
+            self.connection.execute(FILES_TABLE.format(name='files_new'))
+            self.connection.execute("INSERT INTO files_new SELECT * FROM files")
+            self.connection.execute("DROP TABLE files")
+            self.connection.execute("ALTER TABLE files_new RENAME TO files")
+        logger.info(f"S'ha actualitzat la clau dels fitxers del catàleg {self.path}")
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def find_file(self, content_hash, curs=None):
+        """Return the id of a file ingested with this content hash (in the given curs), None if not found"""
+        query = "SELECT id FROM files WHERE content_hash = ?"
+        params = [content_hash]
+        if curs is not None:
+            query += " AND curs = ?"
+            params.append(curs)
+        with self._lock:
+            row = self.connection.execute(query, params).fetchone()
+        return row[0] if row else None
+
+    def _subject_ids(self, names):
+        """Return the id of every subject name, adding the new ones"""
+        self.connection.executemany("INSERT OR IGNORE INTO subjects (name) VALUES (?)", [(name,) for name in names])
+        ids = {}
+        names = list(names)
+        # Keep below SQLite's limit of host parameters
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT name, id FROM subjects WHERE name IN ({','.join('?' * len(chunk))})", chunk
+            )
+            ids.update(rows)
+        return ids
+
+    def ingest(self, filename, file_info, students, content_hash, curs=None, version_warnings=()):
+        """
+        Store the students of a loaded file with its version warnings (as
+        returned by the app loaders) and return its file id. A file already
+        stored with the same content hash is kept as it is, one with the
+        same curs, grup, trimestre and file name (an earlier version of the
+        file) is replaced.
+        """
+        curs = curs or current_school_year()
+        with self._lock, self.connection:
+            existing = self.find_file(content_hash, curs)
+            if existing is not None:
+                return existing
+
+            self.connection.execute(
+                "DELETE FROM files WHERE curs = ? AND grup = ? AND trimestre = ? AND filename = ?",
+                (curs, file_info['grup'], file_info['trimestre'], filename)
+            )
+            cursor = self.connection.execute(
+                "INSERT INTO files (curs, grup, trimestre, filename, display_name, metrika_version, content_hash, warnings, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (curs, file_info['grup'], file_info['trimestre'], filename, file_info['display_name'], file_info['version'],
+                 content_hash, '\n'.join(version_warnings), datetime.datetime.now().isoformat(timespec='seconds'))
+            )
+            file_id = cursor.lastrowid
+            subject_ids = self._subject_ids({m['materia'] for student in students for m in student.get('materies', [])})
+
+            marks = []
+            comments = []
+            for position, student in enumerate(students):
+                cursor = self.connection.execute(
+                    "INSERT INTO students (file_id, position, student_id, nom_cognoms, extra) VALUES (?, ?, ?, ?, ?)",
+                    (file_id, position, student['id'], student.get('nom_cognoms', ''), _dump_extra(student_extra(student)))
+                )
+                row = cursor.lastrowid
+                if student.get('comentari_general') is not None:
+                    comments.append((row, None, None, student['comentari_general']))
+                for materia_position, materia in enumerate(student.get('materies', [])):
+                    subject = subject_ids[materia['materia']]
+                    marks.append((row, subject, materia_position, materia.get('qualificacio'),
+                                  mark_code(materia.get('qualificacio')), _dump_extra(materia_extra(materia))))
+                    if materia.get('comentari'):
+                        comments.append((row, subject, materia_position, materia['comentari']))
+            self.connection.executemany(
+                "INSERT INTO marks (student, subject, position, qualificacio, code, extra) VALUES (?, ?, ?, ?, ?, ?)", marks
+            )
+            self.connection.executemany("INSERT INTO comments (student, subject, position, text) VALUES (?, ?, ?, ?)", comments)
+
+        logger.info(f"S'ha afegit {filename} al catàleg ({len(students)} estudiants)")
+        return file_id
+
+    def files(self, **filters):
+        """DataFrame of the stored files with their number of students, filtered by curs, grup or trimestre"""
+        where, params = self._where(filters, ('curs', 'grup', 'trimestre'))
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT f.id, f.curs, f.grup, f.trimestre, f.filename, f.display_name, f.metrika_version, "
+                "f.content_hash, f.ingested_at, COUNT(s.id) AS estudiants "
+                f"FROM files f LEFT JOIN students s ON s.file_id = f.id {where} "
+                "GROUP BY f.id ORDER BY f.curs, f.grup, f.trimestre",
+                self.connection, params=params
+            )
+
+    def file_info(self, file_id):
+        """File info and version warnings of a stored file, as built by the app loaders. None if not found"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT display_name, grup, trimestre, metrika_version, content_hash, warnings FROM files WHERE id = ?",
+                (file_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('display_name', 'grup', 'trimestre', 'version', 'content_hash'), row)), row[5].splitlines()
+
+    def load_students(self, file_ids):
+        """
+        Rebuild the students of stored files as StudentEntry records, in the
+        order they were loaded and sharing one FileMetadata per file, as the
+        app loaders build them.
+        """
+        file_ids = list(file_ids)
+        if not file_ids:
+            return []
+        with self._lock:
+            return self._load_students(file_ids)
+
+    def _load_students(self, file_ids):
+        """load_students with the lock held"""
+        placeholders = ','.join('?' * len(file_ids))
+        order = {file_id: i for i, file_id in enumerate(file_ids)}
+        files = {
+            file_id: FileMetadata(grup, trimestre, display_name, version)
+            for file_id, grup, trimestre, display_name, version in self.connection.execute(
+                f"SELECT id, grup, trimestre, display_name, metrika_version FROM files WHERE id IN ({placeholders})", file_ids
+            )
+        }
+        students = {}
+        rows = self.connection.execute(
+            "SELECT s.id, s.student_id, s.nom_cognoms, s.file_id, s.extra "
+            f"FROM students s WHERE s.file_id IN ({placeholders}) "
+            "ORDER BY s.file_id, s.position", file_ids
+        )
+        for row, student_id, nom_cognoms, file_id, extra in rows:
+            students[row] = (order[file_id], file_id, {
+                'id': student_id,
+                'nom_cognoms': nom_cognoms,
+                'materies': [],
+                **(json.loads(extra) if extra else {})
+            })
+
+        # Materia comments by position, by subject when stored before the comments had a position
+        comments = {}
+        subject_comments = {}
+        rows = self.connection.execute(
+            "SELECT c.student, c.subject, c.position, c.text FROM comments c JOIN students s ON s.id = c.student "
+            f"WHERE s.file_id IN ({placeholders})", file_ids
+        )
+        for row, subject, position, text in rows:
+            if subject is None:
+                students[row][2]['comentari_general'] = text
+            elif position is None:
+                subject_comments[(row, subject)] = text
+            else:
+                comments[(row, position)] = text
+
+        rows = self.connection.execute(
+            "SELECT m.student, m.subject, m.position, sub.name, m.qualificacio, m.extra FROM marks m "
+            "JOIN students s ON s.id = m.student JOIN subjects sub ON sub.id = m.subject "
+            f"WHERE s.file_id IN ({placeholders}) ORDER BY m.student, m.position", file_ids
+        )
+        for row, subject, position, name, qualificacio, extra in rows:
+            students[row][2]['materies'].append({
+                'materia': name,
+                'qualificacio': qualificacio,
+                'comentari': comments.get((row, position), subject_comments.get((row, subject), "")),
+                **(json.loads(extra) if extra else {})
+            })
+
+        # Sort by the requested file order, rows are already in loading order within a file
+        return [make_student(student, files[file_id]) for _, file_id, student in sorted(students.values(), key=lambda item: item[0])]
+
+    def _where(self, filters, allowed=tuple(FILTER_COLUMNS)):
+        """WHERE clause of query filters, every filter takes a value or a list of values"""
+        clauses = []
+        params = []
+        for name, value in filters.items():
+            if name not in allowed:
+                raise ValueError(f"Filtre desconegut: {name}. Opcions: {allowed}")
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{FILTER_COLUMNS[name]} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def marks(self, **filters):
+        """
+        Long DataFrame with one row per stored mark, filtered by curs, grup,
+        trimestre, materia or student id. Columns: curs, grup, trimestre,
+        id, nom_cognoms, materia, qualificacio and codi.
+        """
+        where, params = self._where(filters)
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT f.curs, f.grup, f.trimestre, s.student_id AS id, s.nom_cognoms, sub.name AS materia, "
+                "m.qualificacio, m.code AS codi "
+                "FROM marks m JOIN students s ON s.id = m.student JOIN files f ON f.id = s.file_id "
+                f"JOIN subjects sub ON sub.id = m.subject {where} "
+                "ORDER BY f.curs, f.grup, f.trimestre, s.position, m.position",
+                self.connection, params=params
+            )
+
+    def mark_counts(self, group_by=('grup', 'materia'), **filters):
+        """
+        Number of NA, AS, AN and AE marks for each combination of the
+        group_by columns (curs, grup, trimestre, materia or id), counted by
+        SQLite with the same filters as marks().
+        """
+        for name in group_by:
+            if name not in FILTER_COLUMNS:
+                raise ValueError(f"Columna desconeguda: {name}. Opcions: {tuple(FILTER_COLUMNS)}")
+        where, params = self._where(filters)
+        columns = ', '.join(f"{FILTER_COLUMNS[name]} AS {name}" for name in group_by)
+        counts = ', '.join(f'SUM(m.code = {code}) AS "{label}"' for label, code in COUNT_COLUMNS.items())
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {columns}, {counts} "
+                "FROM marks m JOIN students s ON s.id = m.student JOIN files f ON f.id = s.file_id "
+                f"JOIN subjects sub ON sub.id = m.subject {where} "
+                f"GROUP BY {', '.join(FILTER_COLUMNS[name] for name in group_by)} "
+                f"ORDER BY {', '.join(FILTER_COLUMNS[name] for name in group_by)}",
+                self.connection, params=params
+            )
+
+    def delete_file(self, file_id):
+        """Remove a stored file with its students, marks and comments"""
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
@@ -0,0 +1,213 @@
+import io
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from utils.constants import AppConfig, MarkConfig
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, only needed for columnar files
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Columnar formats and the extension of their files
+COLUMNAR_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow'
+}
+
+# Key of the Metrika metadata stored in the Arrow schema
+METADATA_KEY = b'metrika'
+
+# Student level columns of the long table, materia level columns follow
+STUDENT_COLUMNS = ['alumne', 'id', 'nom_cognoms', 'comentari_general']
+MATERIA_COLUMNS = ['materia', 'qualificacio', 'comentari']
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Cal instal·lar pyarrow per llegir o escriure fitxers Parquet/Arrow")
+
+
+def columnar_path(output_file, columnar_format):
+    """Return the columnar file written next to a JSON output file"""
+    return os.path.splitext(output_file)[0] + COLUMNAR_FORMATS[columnar_format]
+
+
+def is_columnar_file(filename):
+    """Return True if the file name has a columnar format extension"""
+    return os.path.splitext(filename)[1].lower() in COLUMNAR_FORMATS.values()
+
+
+def students_to_frame(students):
+    """
+    Flatten students into a long table with one row per student and materia.
+
+    Students without materies keep one row with null materia columns. Marks
+    and materia names are categorical, extra student fields become columns.
+    """
+    extra_fields = []
+    for student in students:
+        for key in student:
+            if key not in STUDENT_COLUMNS and key != 'materies' and key not in extra_fields:
+                extra_fields.append(key)
+
+    columns = {col: [] for col in STUDENT_COLUMNS + extra_fields + MATERIA_COLUMNS}
+    for position, student in enumerate(students):
+        materies = student.get('materies') or [{}]
+        for materia in materies:
+            columns['alumne'].append(position)
+            columns['id'].append(str(student.get('id')))
+            for col in STUDENT_COLUMNS[2:] + extra_fields:
+                columns[col].append(student.get(col))
+            for col in MATERIA_COLUMNS:
+                columns[col].append(materia.get(col))
+
+    df = pd.DataFrame(columns)
+    df['alumne'] = df['alumne'].astype('int32')
+    df['materia'] = df['materia'].astype('category')
+    known_marks = list(MarkConfig.LIST.value)
+    other_marks = sorted(set(df['qualificacio'].dropna()) - set(known_marks))
+    df['qualificacio'] = pd.Categorical(df['qualificacio'], categories=known_marks + other_marks)
+    return df, extra_fields
+
+
+def frame_to_students(df, extra_fields=()):
+    """Rebuild student dictionaries from a long table made by students_to_frame"""
+    if df.empty:
+        return []
+    alumne = df['alumne'].to_numpy()
+    starts = [0] + (np.flatnonzero(np.diff(alumne)) + 1).tolist() + [len(alumne)]
+
+    def column_values(col):
+        values = df[col].astype(object)
+        return values.where(values.notna(), None).tolist()
+
+    student_values = {col: column_values(col) for col in STUDENT_COLUMNS[1:] + list(extra_fields)}
+    materia_values = [column_values(col) for col in MATERIA_COLUMNS]
+    materies = [
+        {'materia': m, 'qualificacio': q if q is not None else "", 'comentari': c if c is not None else ""}
+        for m, q, c in zip(*materia_values)
+    ]
+
+    students = []
+    for start, end in zip(starts[:-1], starts[1:]):
+        student = {
+            'id': student_values['id'][start],
+            'nom_cognoms': student_values['nom_cognoms'][start],
+            'materies': [m for m in materies[start:end] if m['materia'] is not None]
+        }
+        for col in list(extra_fields) + ['comentari_general']:
+            if student_values[col][start] is not None:
+                student[col] = student_values[col][start]
+        students.append(student)
+    return students
+
+
+def write_columnar(students, path, columnar_format='parquet', metadata=None):
+    """
+    Write students as a long student x materia table in Parquet or Arrow IPC.
+    ``metadata`` (grup, trimestre, metrika_version...) is stored in the schema.
+    """
+    _require_pyarrow()
+    if columnar_format not in COLUMNAR_FORMATS:
+        raise ValueError(f"Format columnar desconegut: {columnar_format}. Opcions: {tuple(COLUMNAR_FORMATS)}")
+
+    df, extra_fields = students_to_frame(students)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    file_metadata = dict(metadata or {})
+    file_metadata['extra_fields'] = extra_fields
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        METADATA_KEY: json.dumps(file_metadata, ensure_ascii=False).encode('utf-8')
+    })
+
+    if columnar_format == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    logger.info(f"S'ha desat el fitxer {columnar_format}: {path}")
+
+
+def read_columnar(source, columnar_format=None):
+    """
+    Read a Parquet or Arrow IPC file written by write_columnar.
+
+    ``source`` is a path, bytes or a binary file object; the format is taken
+    from the file name when not given. Returns (students, metadata).
+    """
+    _require_pyarrow()
+    columnar_format, source = _columnar_source(source, columnar_format)
+    if columnar_format == 'parquet':
+        table = pq.read_table(source)
+    else:
+        table = pa.ipc.open_file(source).read_all()
+
+    metadata = _schema_metadata(table.schema)
+    extra_fields = metadata.pop('extra_fields', [])
+    return frame_to_students(table.to_pandas(), extra_fields), metadata
+
+
+def read_columnar_metadata(source, columnar_format=None):
+    """Read only the Metrika metadata of a columnar file, without its rows"""
+    _require_pyarrow()
+    columnar_format, source = _columnar_source(source, columnar_format)
+    if columnar_format == 'parquet':
+        schema = pq.read_schema(source)
+    else:
+        schema = pa.ipc.open_file(source).schema
+    metadata = _schema_metadata(schema)
+    metadata.pop('extra_fields', None)
+    return metadata
+
+
+def _columnar_source(source, columnar_format):
+    """Resolve the format of a columnar source from its name and wrap bytes in a file object"""
+    if columnar_format is None:
+        name = source if isinstance(source, str) else getattr(source, 'name', '')
+        extension = os.path.splitext(name)[1].lower()
+        columnar_format = next((fmt for fmt, ext in COLUMNAR_FORMATS.items() if ext == extension), 'parquet')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return columnar_format, source
+
+
+def _schema_metadata(schema):
+    return json.loads((schema.metadata or {}).get(METADATA_KEY, b'{}').decode('utf-8'))
+
+
+def read_columnar_envelope(source, columnar_format=None):
+    """
+    Read a columnar file as the JSON file structure used by the app loaders:
+    a dict with grup, trimestre, estudiants and metrika_version.
+    """
+    students, metadata = read_columnar(source, columnar_format)
+    data = {key: value for key, value in metadata.items() if key in ('grup', 'trimestre', 'metrika_version')}
+    data['estudiants'] = students
+    return data
+
+
+def save_columnar_file(students, output_file, trimestre, columnar_format, grup=None):
+    """
+    Save students as a Parquet/Arrow file next to the JSON output file.
+    The grup defaults to the name of the output folder, as in batch_convert.
+    """
+    columnar_file = columnar_path(output_file, columnar_format)
+    if grup is None:
+        grup = os.path.basename(os.path.dirname(os.path.abspath(output_file)))
+    try:
+        write_columnar(students, columnar_file, columnar_format, metadata={
+            'grup': grup,
+            'trimestre': trimestre,
+            'metrika_version': AppConfig.VERSION
+        })
+        return True
+    except Exception as e:
+        logger.error(f"Error desant el fitxer {columnar_format} {columnar_file}: {str(e)}")
+        return False
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from utils.constants import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Default location of the conversion cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.metrika', 'conversion_cache')
+
+# Entries not used for this many seconds are evicted (30 days)
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+# Least recently used entries are evicted above this total size (200 MB)
+DEFAULT_MAX_SIZE = 200 * 1024 * 1024
+
+# Bytes read at a time when hashing input files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_content_hash(file_path):
+    """Return the SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Persistent cache of CSV to JSON conversions.
+
+    Entries are keyed by the content hash of the input CSV, the converter
+    version (AppConfig.VERSION) and the conversion options, so any change in
+    one of them produces a new key. The converted JSON is stored next to a
+    manifest that records size and last use of every entry, used to evict
+    entries by age and by total size.
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_age=DEFAULT_MAX_AGE, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_size = max_size
+        self.manifest_path = os.path.join(cache_dir, self.MANIFEST_NAME)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """Load the manifest, starting empty if it is missing or unreadable"""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No s'ha pogut llegir el manifest de la memòria cau {self.manifest_path}: {str(e)}")
+            return {}
+
+    def _save_manifest(self):
+        """Write the manifest atomically"""
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def make_key(self, csv_file, options=None):
+        """Build the cache key of a CSV file converted with the given options"""
+        key_source = json.dumps({
+            'content': file_content_hash(csv_file),
+            'version': AppConfig.VERSION,
+            'options': options or {}
+        }, sort_keys=True)
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached JSON for a key, or None on a miss"""
+        entry = self.manifest.get(key)
+        if entry is None:
+            return None
+        try:
+            with open(self._entry_path(key), 'r', encoding='utf-8') as f:
+                json_data = f.read()
+        except OSError:
+            logger.warning(f"Falta el fitxer de la memòria cau per a {entry.get('source')}, s'eliminarà l'entrada")
+            del self.manifest[key]
+            self._save_manifest()
+            return None
+        entry['last_used'] = time.time()
+        self._save_manifest()
+        logger.info(f"Conversió recuperada de la memòria cau: {entry.get('source')}")
+        return json_data
+
+    def put(self, key, json_data, source=None):
+        """Store the JSON produced for a key and evict old entries"""
+        with open(self._entry_path(key), 'w', encoding='utf-8') as f:
+            f.write(json_data)
+        now = time.time()
+        self.manifest[key] = {
+            'source': source,
+            'size': os.path.getsize(self._entry_path(key)),
+            'created': now,
+            'last_used': now
+        }
+        self.evict()
+        self._save_manifest()
+
+    def evict(self, max_age=None, max_size=None):
+        """
+        Remove entries unused for more than max_age seconds, then the least
+        recently used ones until the total size is within max_size.
+        Returns the number of entries removed.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_size = self.max_size if max_size is None else max_size
+        now = time.time()
+        by_last_use = sorted(self.manifest.items(), key=lambda item: item[1]['last_used'])
+        total_size = sum(entry['size'] for _, entry in by_last_use)
+        removed = []
+        for key, entry in by_last_use:
+            too_old = max_age is not None and now - entry['last_used'] > max_age
+            too_big = max_size is not None and total_size > max_size
+            if not (too_old or too_big):
+                continue
+            removed.append(key)
+            total_size -= entry['size']
+        for key in removed:
+            del self.manifest[key]
+            try:
+                os.unlink(self._entry_path(key))
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"S'han eliminat {len(removed)} entrades de la memòria cau")
+            self._save_manifest()
+        return len(removed)
+
+    def clear(self):
+        """Remove every entry"""
+        return self.evict(max_age=-1)
@@ -1,11 +1,20 @@
 import csv
+import io
+import itertools
 import json
 import os
+import re
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Dict, List, Set
+import numpy as np
 import pandas as pd
 import streamlit as st
-import tempfile
+from utils.columnar_format import COLUMNAR_FORMATS, save_columnar_file
+from utils.constants import AppConfig
+from utils.conversion_cache import ConversionCache
+from utils.trimester_dataset import merge_converted_sessions
+from utils.validation import KNOWN_MARKS, ValidationReport
 
 # Configure logging - only if not already configured
 if not logging.getLogger().handlers:
@@ -15,63 +24,214 @@ if not logging.getLogger().handlers:
     )
 logger = logging.getLogger(__name__)
 
-def clean_csv_line_breaks(csv_file_path):
+# Columns every Esfera export must provide
+REQUIRED_COLUMNS = ['id', 'nom_cognoms', 'numero_avaluacio', 'comentari general']
+
+# Materia, qualificacio and comentari columns: m1, q1, c1, m2...
+SUBJECT_COLUMN_PATTERN = re.compile(r'^([mqc])(\d+)$')
+
+# Candidate CSV separators, in detection order
+CSV_SEPARATORS = [',', ';', '|', '\t']
+
+# Characters read from the start of a CSV file to detect its separator
+SNIFF_SIZE = 64 * 1024
+
+# Rows cleaned per chunk when streaming a CSV file to the parser
+CLEAN_CHUNK_ROWS = 1000
+
+# Available DataFrame to student records conversion engines
+CONVERSION_ENGINES = ('rows', 'columnar')
+
+# File name markers used to detect the trimester of a CSV file
+TRIMESTER_MAP = {
+    '1r': 'T1',
+    '2n': 'T2',
+    '3r': 'T3'
+}
+
+# Output formats written by the chunked streaming conversion
+STREAM_FORMATS = ('json', 'jsonl')
+
+# CSV rows converted per chunk by the streaming conversion
+STREAM_CHUNK_ROWS = 5000
+
+class _MemoryviewReader(io.RawIOBase):
+    """Raw binary stream reading a buffer through a memoryview, without copying it first"""
+
+    def __init__(self, buffer, owner=None):
+        self._view = memoryview(buffer).cast('B')
+        self._owner = owner
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._position:self._position + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        chunk.release()
+        self._position += n
+        return n
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            if self._owner is not None:
+                self._owner.release()
+                self._owner = None
+        super().close()
+
+class _BorrowedStream(io.RawIOBase):
+    """Raw binary stream over a caller's file object that does not close it"""
+
+    def __init__(self, file):
+        self._file = file
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._file.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+def describe_csv_source(csv_file):
+    """Return a name for a CSV source (a path, bytes or a file object) to use in messages"""
+    if isinstance(csv_file, (str, os.PathLike)):
+        return os.fspath(csv_file)
+    return getattr(csv_file, 'name', None) or "dades CSV en memòria"
+
+def open_csv_text(csv_file):
     """
-    Clean line breaks within CSV cells by properly parsing quoted cells.
-    Creates a temporary cleaned file and returns its path.
+    Open a CSV source as a UTF-8 text stream.
+
+    ``csv_file`` is a path, a bytes-like object (bytes, bytearray,
+    memoryview) or a binary file object such as a Streamlit upload.
+    Bytes-like objects and in-memory files (with ``getbuffer()``) are read
+    through a memoryview, so the upload is parsed straight from its buffer
+    without a temporary file or a copy of the whole content. Other file
+    objects are read from the start and are left open when the stream is
+    closed.
+    """
+    if isinstance(csv_file, (str, os.PathLike)):
+        return open(csv_file, 'r', encoding='utf-8')
+    if isinstance(csv_file, (bytes, bytearray, memoryview)):
+        raw = _MemoryviewReader(csv_file)
+    elif hasattr(csv_file, 'getbuffer'):
+        owner = csv_file.getbuffer()
+        raw = _MemoryviewReader(owner, owner=owner)
+    elif hasattr(csv_file, 'read'):
+        if csv_file.seekable():
+            csv_file.seek(0)
+            return io.TextIOWrapper(_BorrowedStream(csv_file), encoding='utf-8')
+        # Non seekable sources are read once and kept in memory
+        raw = _MemoryviewReader(csv_file.read())
+    else:
+        raise TypeError(f"Font CSV no suportada: {type(csv_file).__name__}")
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8')
+
+def rewindable_csv_source(csv_file):
+    """Return a CSV source that can be opened more than once: non seekable file objects are read into memory"""
+    if hasattr(csv_file, 'read') and not hasattr(csv_file, 'getbuffer') and not csv_file.seekable():
+        return csv_file.read()
+    return csv_file
+
+def sniff_csv_separator(csv_file):
+    """
+    Detect the CSV separator looking only at the first record of the file.
+    Returns None if no candidate splits the header into several columns.
     """
-    logger.info(f"Netejant salts de línia a {csv_file_path}")
-    
-    # Create a temporary file for the cleaned CSV
-    temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False, encoding='utf-8')
-    temp_file_path = temp_file.name
-    
     try:
-        # Try different separators to find the right one
-        separators = [',', ';', '|', '\t']
-        best_separator = None
-        best_rows = []
-        
-        for sep in separators:
-            try:
-                with open(csv_file_path, 'r', encoding='utf-8') as input_file:
-                    reader = csv.reader(input_file, delimiter=sep, quotechar='"')
-                    rows = list(reader)
-                    if len(rows) > 0 and len(rows[0]) > 1:  # At least one row with multiple columns
-                        best_separator = sep
-                        best_rows = rows
-                        logger.debug(f"S'ha trobat un separador vàlid '{sep}' amb {len(rows)} files")
-                        break
-            except Exception as e:
-                logger.debug(f"El separador '{sep}' ha fallat: {str(e)}")
-                continue
-        
-        if best_separator is None:
-            logger.warning("No s'ha pogut determinar el separador CSV, retornant el fitxer original")
-            return csv_file_path
-        
-        # Write cleaned content to temporary file
-        with open(temp_file_path, 'w', encoding='utf-8', newline='') as output_file:
-            writer = csv.writer(output_file, delimiter=best_separator, quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            for row in best_rows:
-                # Clean any remaining line breaks within cells
-                cleaned_row = []
-                for cell in row:
-                    if isinstance(cell, str):
-                        # Replace line breaks with spaces within cells
-                        cleaned_cell = cell.replace('\n', ' ').replace('\r', ' ').strip()
-                        cleaned_row.append(cleaned_cell)
-                    else:
-                        cleaned_row.append(cell)
-                writer.writerow(cleaned_row)
-        
-        logger.info(f"S'ha netejat amb èxit el fitxer CSV utilizando el separador '{best_separator}'. Processades {len(best_rows)} files")
-        return temp_file_path
-        
-    except Exception as e:
-        logger.error(f"Error netejant el fitxer CSV: {str(e)}")
-        # If cleaning fails, return the original file path
-        return csv_file_path
+        with open_csv_text(csv_file) as input_file:
+            prefix = input_file.read(SNIFF_SIZE)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.debug(f"No s'ha pogut llegir l'inici de {describe_csv_source(csv_file)}: {str(e)}")
+        return None
+    
+    for sep in CSV_SEPARATORS:
+        try:
+            first_row = next(csv.reader(io.StringIO(prefix), delimiter=sep, quotechar='"'), [])
+            if len(first_row) > 1:  # At least one row with multiple columns
+                logger.debug(f"S'ha trobat un separador vàlid '{sep}'")
+                return sep
+        except csv.Error as e:
+            logger.debug(f"El separador '{sep}' ha fallat: {str(e)}")
+    return None
+
+class CleanCSVStream(io.TextIOBase):
+    """
+    Read-only text stream over a CSV source with line breaks inside cells removed.
+
+    Rows are parsed with the csv module, cleaned and re-serialized a chunk at a
+    time as the consumer reads, so the cleaned copy never exists as a whole,
+    neither in memory nor on disk.
+    """
+
+    def __init__(self, csv_file, separator, chunk_rows=CLEAN_CHUNK_ROWS):
+        self.csv_file = csv_file
+        self.separator = separator
+        self.chunk_rows = chunk_rows
+        self.rows_count = 0
+        self._input_file = open_csv_text(csv_file)
+        self._reader = csv.reader(self._input_file, delimiter=separator, quotechar='"')
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, delimiter=separator, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        self._pending = ''
+        self._exhausted = False
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        """Clean the next chunk of rows into the pending text. Returns False at EOF."""
+        if self._exhausted:
+            return False
+        n_rows = 0
+        for row in itertools.islice(self._reader, self.chunk_rows):
+            # Replace line breaks with spaces within cells
+            self._writer.writerow([cell.replace('\n', ' ').replace('\r', ' ').strip() for cell in row])
+            n_rows += 1
+        if n_rows == 0:
+            self._exhausted = True
+            logger.info(f"S'ha netejat amb èxit el fitxer CSV utilitzant el separador '{self.separator}'. Processades {self.rows_count} files")
+            return False
+        self.rows_count += n_rows
+        self._pending += self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            data, self._pending = self._pending, ''
+            return data
+        while len(self._pending) < size and self._fill():
+            pass
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def close(self):
+        self._input_file.close()
+        super().close()
+
+def open_clean_csv(csv_file, separator=None):
+    """
+    Open a CSV source (see open_csv_text) as a text stream with line breaks
+    within cells cleaned. Falls back to the original content when the
+    separator cannot be determined.
+    """
+    logger.info(f"Netejant salts de línia a {describe_csv_source(csv_file)}")
+    if separator is None:
+        csv_file = rewindable_csv_source(csv_file)
+        separator = sniff_csv_separator(csv_file)
+    if separator is None:
+        logger.warning("No s'ha pogut determinar el separador CSV, llegint el fitxer original")
+        return open_csv_text(csv_file)
+    return CleanCSVStream(csv_file, separator)
 
 def save_json_to_file(json_data, output_file):
     """Save JSON data to a file"""
@@ -84,24 +244,268 @@ def save_json_to_file(json_data, output_file):
         logger.error(f"Error desant el fitxer JSON {output_file}: {str(e)}")
         return False
 
-def process_csv_to_json(csv_file, output_file, trimestre, save_to_file=False):
-    """Process a single CSV file and convert it to JSON format"""
-    logger.info(f"Iniciant el processament de {csv_file}")
+class CsvSchema:
+    """
+    Column layout of an Esfera CSV, resolved once from its header.
+
+    ``materies`` holds one ``(index, materia_pos, qualificacio_pos,
+    comentari_pos)`` tuple per mN column, sorted by N, with None for a missing
+    qN/cN column. ``other_columns`` holds the ``(name, pos)`` of the columns
+    copied as plain student fields and ``required`` the position of every
+    required column present.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.required = {}
+        self.other_columns = []
+        triplets = {}
+        for pos, col in enumerate(self.columns):
+            if col in REQUIRED_COLUMNS:
+                self.required.setdefault(col, pos)
+                continue
+            match = SUBJECT_COLUMN_PATTERN.match(str(col))
+            if match:
+                kind, index = match.group(1), int(match.group(2))
+                triplets.setdefault(index, {}).setdefault(kind, pos)
+            else:
+                self.other_columns.append((col, pos))
+        self.materies = [
+            (index, slot['m'], slot.get('q'), slot.get('c'))
+            for index, slot in sorted(triplets.items())
+            if 'm' in slot
+        ]
+        self.missing = [col for col in REQUIRED_COLUMNS if col not in self.required]
+
+    def __repr__(self):
+        return f"CsvSchema(materies={len(self.materies)}, other_columns={[col for col, _ in self.other_columns]}, missing={self.missing})"
+
+def resolve_csv_schema(columns):
+    """Parse a CSV header into its CsvSchema"""
+    return CsvSchema(columns)
+
+def _dataframe_to_students_rows(df, schema):
+    """Convert the DataFrame to student records walking it row by row"""
+    id_pos = schema.required['id']
+    name_pos = schema.required['nom_cognoms']
+    general_pos = schema.required['comentari general']
+    students = []
+    for i, (idx, row) in enumerate(zip(df.index, df.itertuples(index=False, name=None))):
+        try:
+            # Validate that id and name are not empty
+            if pd.isna(row[id_pos]) or pd.isna(row[name_pos]) or str(row[id_pos]).strip() == '' or str(row[name_pos]).strip() == '':
+                logger.warning(f"Ometent la fila {idx} amb id o nom buit")
+                continue
+            
+            student = {
+                'id': str(row[id_pos]).strip(),
+                'nom_cognoms': str(row[name_pos]).strip()
+            }
+            
+            # Process materies array
+            materies = []
+            for _, materia_pos, qualificacio_pos, comentari_pos in schema.materies:
+                # Check if materia is not empty
+                materia_value = row[materia_pos]
+                if not pd.isna(materia_value) and str(materia_value).strip() != '':
+                    # Get qualificacio and comentari values
+                    qualificacio_value = ""
+                    comentari_value = ""
+                    
+                    if qualificacio_pos is not None:
+                        qual_value = row[qualificacio_pos]
+                        if not pd.isna(qual_value):
+                            qualificacio_value = str(qual_value).strip()
+                    
+                    if comentari_pos is not None:
+                        com_value = row[comentari_pos]
+                        if not pd.isna(com_value):
+                            comentari_value = str(com_value).strip()
+                    
+                    # Add materia to array
+                    materies.append({
+                        'materia': str(materia_value).strip(),
+                        'qualificacio': qualificacio_value,
+                        'comentari': comentari_value
+                    })
+            
+            # Add materies array to student
+            student['materies'] = materies
+            
+            # Add all other columns as fields (excluding materies columns)
+            for col, pos in schema.other_columns:
+                value = row[pos]
+                # Handle NaN values
+                if pd.isna(value):
+                    student[col] = ""
+                else:
+                    student[col] = str(value).strip()
+            
+            student['comentari_general'] = str(row[general_pos]).strip()
+            
+            students.append(student)
+            if i < 3: # Show first 3 students for debugging
+                logger.debug(f"Estudiant {i}: {student}")
+        except Exception as e:
+            logger.error(f"Error processant la fila {idx}: {str(e)}")
+            logger.debug(f"Dades de la fila: {dict(zip(schema.columns, row))}")
+            continue
+    
+    return students
+
+def _column_text(df, pos):
+    """Return the stripped text and the null mask of a column as arrays.
+
+    A missing column (pos None) reads as empty strings, matching the row engine.
+    """
+    if pos is None:
+        return np.full(len(df), '', dtype=object), np.ones(len(df), dtype=bool)
+    values = df.iloc[:, pos]
+    return values.astype(str).str.strip().to_numpy(dtype=object), values.isna().to_numpy()
+
+def validate_csv_frame(df, schema):
+    """
+    Check every row of an Esfera CSV DataFrame at once and return a
+    ValidationReport with the row positions of each error kind: empty id or
+    name (skipped by the converters), repeated ids, unknown qualifications,
+    qualifications without materia and materies repeated within a row.
+    """
+    ids, ids_null = _column_text(df, schema.required['id'])
+    names, names_null = _column_text(df, schema.required['nom_cognoms'])
+    id_absent = ids_null | (ids == '')
+    nom_absent = names_null | (names == '')
+    id_repeated = ~id_absent & pd.Series(ids).where(~id_absent).duplicated(keep=False).to_numpy()
+
+    errors = {
+        'id_absent': np.flatnonzero(id_absent),
+        'nom_absent': np.flatnonzero(nom_absent),
+        'id_repetit': np.flatnonzero(id_repeated)
+    }
+    if schema.materies and len(df):
+        materia_text, materia_null = zip(*(_column_text(df, m) for _, m, _, _ in schema.materies))
+        qualificacio_text, qualificacio_null = zip(*(_column_text(df, q) for _, _, q, _ in schema.materies))
+        materia = np.where(np.column_stack(materia_null), '', np.column_stack(materia_text))
+        qualificacio = np.where(np.column_stack(qualificacio_null), '', np.column_stack(qualificacio_text))
+        unknown = ~np.isin(qualificacio, list(KNOWN_MARKS - {None}))
+        orphan = (materia == '') & (qualificacio != '')
+        # Sorting the names of each row puts repeated materies next to each other
+        ordered = np.sort(materia.astype(str), axis=1)
+        repeated = ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] != '')).any(axis=1)
+        errors.update({
+            'qualificacio_desconeguda': np.flatnonzero(unknown.any(axis=1)),
+            'qualificacio_sense_materia': np.flatnonzero(orphan.any(axis=1)),
+            'materia_repetida': np.flatnonzero(repeated)
+        })
+    return ValidationReport(len(df), errors)
+
+def _dataframe_to_students_columnar(df, schema):
+    """Convert the DataFrame to student records working on whole columns.
+
+    The m/q/c triplets are stacked into a long (student, materia) layout with
+    vectorized strip and null masks, and the ``materies`` arrays are sliced
+    from it. The output is identical to ``_dataframe_to_students_rows``.
+    """
+    # Validate that id and name are not empty
+    ids, ids_null = _column_text(df, schema.required['id'])
+    names, names_null = _column_text(df, schema.required['nom_cognoms'])
+    valid = ~ids_null & ~names_null & (ids != '') & (names != '')
+    for idx in df.index[~valid]:
+        logger.warning(f"Ometent la fila {idx} amb id o nom buit")
+    df = df[valid]
+    ids = ids[valid]
+    names = names[valid]
+    n_students = len(df)
     
-    # Clean line breaks in the CSV file
-    cleaned_csv_file = clean_csv_line_breaks(csv_file)
-    should_delete_temp = cleaned_csv_file != csv_file
+    # Stack the materia/qualificacio/comentari triplets: one column per slot
+    bounds = np.zeros(n_students + 1, dtype=np.int64)
+    records = []
+    if schema.materies and n_students:
+        materia_text, materia_null = zip(*(_column_text(df, m) for _, m, _, _ in schema.materies))
+        qualificacio_text, qualificacio_null = zip(*(_column_text(df, q) for _, _, q, _ in schema.materies))
+        comentari_text, comentari_null = zip(*(_column_text(df, c) for _, _, _, c in schema.materies))
+        materia = np.column_stack(materia_text)
+        keep = ~np.column_stack(materia_null) & (materia != '')
+        qualificacio = np.where(np.column_stack(qualificacio_null), '', np.column_stack(qualificacio_text))
+        comentari = np.where(np.column_stack(comentari_null), '', np.column_stack(comentari_text))
+        
+        # Row-major nonzero keeps students in order and materies in slot order
+        rows, cols = np.nonzero(keep)
+        records = [
+            {'materia': m, 'qualificacio': q, 'comentari': c}
+            for m, q, c in zip(materia[rows, cols], qualificacio[rows, cols], comentari[rows, cols])
+        ]
+        bounds[1:] = np.cumsum(np.bincount(rows, minlength=n_students))
+    
+    # Other columns as fields, NaN values as empty strings
+    other_fields = []
+    for col, pos in schema.other_columns:
+        text, null = _column_text(df, pos)
+        other_fields.append((col, np.where(null, '', text)))
+    general = df.iloc[:, schema.required['comentari general']].astype(str).str.strip().to_numpy(dtype=object)
+    
+    students = []
+    for i in range(n_students):
+        student = {
+            'id': ids[i],
+            'nom_cognoms': names[i],
+            'materies': records[bounds[i]:bounds[i + 1]]
+        }
+        for col, values in other_fields:
+            student[col] = values[i]
+        student['comentari_general'] = general[i]
+        students.append(student)
+        if i < 3: # Show first 3 students for debugging
+            logger.debug(f"Estudiant {i}: {student}")
+    
+    return students
+
+def dataframe_to_students(df, engine='rows', schema=None):
+    """
+    Convert an Esfera DataFrame to a list of student dictionaries.
+    ``schema`` can be passed to reuse a layout already resolved for the same header.
+    """
+    if schema is None:
+        schema = resolve_csv_schema(df.columns)
+    if schema.missing:
+        raise ValueError(f"Falten columnes requerides: {schema.missing}")
+    if engine == 'columnar':
+        return _dataframe_to_students_columnar(df, schema)
+    return _dataframe_to_students_rows(df, schema)
+
+def process_csv_to_json(csv_file, output_file, trimestre, save_to_file=False, engine='rows', columnar_format=None, grup=None):
+    """Process a single CSV file and convert it to JSON format.
+
+    ``engine`` selects how the DataFrame is turned into student records:
+    ``'rows'`` walks it row by row and ``'columnar'`` reshapes the subject
+    columns in bulk. Both engines produce identical JSON.
+
+    With ``columnar_format`` ('parquet' or 'arrow') and ``save_to_file`` a
+    long student x materia table is also saved next to ``output_file``,
+    with ``grup`` (by default the name of its folder) in its metadata.
+
+    ``csv_file`` is a path, bytes-like object or binary file object, so
+    uploads can be converted from memory without a temporary file.
+    """
+    if engine not in CONVERSION_ENGINES:
+        raise ValueError(f"Motor de conversió desconegut: {engine}. Opcions: {CONVERSION_ENGINES}")
+    if columnar_format is not None and columnar_format not in COLUMNAR_FORMATS:
+        raise ValueError(f"Format columnar desconegut: {columnar_format}. Opcions: {tuple(COLUMNAR_FORMATS)}")
+    
+    source_name = describe_csv_source(csv_file)
+    csv_file = rewindable_csv_source(csv_file)
+    logger.info(f"Iniciant el processament de {source_name}")
     
     try:
         # Try to detect the correct separator
         separators = ['|']
         df = None
         
-        logger.debug(f"Provant diferents separadors per a {csv_file}")
+        logger.debug(f"Provant diferents separadors per a {source_name}")
         for sep in separators:
             try:
                 logger.debug(f"Provant separador '{sep}'")
-                df = pd.read_csv(cleaned_csv_file, encoding='utf-8', sep=sep, on_bad_lines='skip')
+                with open_clean_csv(csv_file) as cleaned_csv:
+                    df = pd.read_csv(cleaned_csv, sep=sep, on_bad_lines='skip')
                 # If we can read at least one row, assume this separator is correct
                 if len(df) > 0:
                     logger.info(f"S'han llegit amb èxit {len(df)} files amb el separador '{sep}'")
@@ -116,100 +520,39 @@ def process_csv_to_json(csv_file, output_file, trimestre, save_to_file=False):
         if df is None or len(df) == 0:
             logger.debug("Cap separador ha funcionat, provant el separador per defecte de pandas")
             try:
-                df = pd.read_csv(cleaned_csv_file, encoding='utf-8', on_bad_lines='skip')
+                with open_clean_csv(csv_file) as cleaned_csv:
+                    df = pd.read_csv(cleaned_csv, on_bad_lines='skip')
                 logger.info(f"El separador per defecte ha llegit {len(df)} files")
             except Exception as e:
                 logger.error(f"El separador per defecte també ha fallat: {str(e)}")
-                return False, f"Error llegint el fitxer CSV {csv_file}: {str(e)}", None
+                return False, f"Error llegint el fitxer CSV {source_name}: {str(e)}", None
         
         if df is None or len(df) == 0:
-            logger.warning(f"No s'han trobat dades vàlides a {csv_file}")
-            return False, f"No s'han trobat dades vàlides a {csv_file}", None
+            logger.warning(f"No s'han trobat dades vàlides a {source_name}")
+            return False, f"No s'han trobat dades vàlides a {source_name}", None
         
         # Validate that required columns exist
-        required_columns = ['id', 'nom_cognoms', 'numero_avaluacio', 'comentari general']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        schema = resolve_csv_schema(df.columns)
+        missing_columns = schema.missing
         if missing_columns:
-            logger.error(f"Falten columnes requerides a {csv_file}: {missing_columns}")
-            return False, f"Falten columnes requerides a {csv_file}: {missing_columns}", None
+            logger.error(f"Falten columnes requerides a {source_name}: {missing_columns}")
+            return False, f"Falten columnes requerides a {source_name}: {missing_columns}", None
         
         logger.info(f"Columnes del DataFrame: {list(df.columns)}")
         logger.info(f"Forma del DataFrame: {df.shape}")
         
+        # Report every invalid row at once, the converters skip the rows without id or name
+        for message in validate_csv_frame(df, schema).messages():
+            logger.warning(f"{source_name}: {message}")
+        
         # Convert DataFrame to list of dictionaries
-        students = []
-        logger.debug("Convertint DataFrame a llista de diccionaris")
-        for i, (idx, row) in enumerate(df.iterrows()):
-            try:
-                # Validate that id and name are not empty
-                if pd.isna(row['id']) or pd.isna(row['nom_cognoms']) or str(row['id']).strip() == '' or str(row['nom_cognoms']).strip() == '':
-                    logger.warning(f"Ometent la fila {idx} amb id o nom buit")
-                    continue
-                
-                student = {
-                    'id': str(row['id']).strip(),
-                    'nom_cognoms': str(row['nom_cognoms']).strip()
-                }
-                
-                # Process materies array
-                materies = []
-                for j in range(1, 101):  # Check up to 100 materies
-                    materia_col = f'm{j}'
-                    qualificacio_col = f'q{j}'
-                    comentari_col = f'c{j}'
-                    
-                    # Check if materia column exists and is not empty
-                    if materia_col in df.columns:
-                        materia_value = row[materia_col]
-                        if not pd.isna(materia_value) and str(materia_value).strip() != '':
-                            # Get qualificacio and comentari values
-                            qualificacio_value = ""
-                            comentari_value = ""
-                            
-                            if qualificacio_col in df.columns:
-                                qual_value = row[qualificacio_col]
-                                if not pd.isna(qual_value):
-                                    qualificacio_value = str(qual_value).strip()
-                            
-                            if comentari_col in df.columns:
-                                com_value = row[comentari_col]
-                                if not pd.isna(com_value):
-                                    comentari_value = str(com_value).strip()
-                            
-                            # Add materia to array
-                            materies.append({
-                                'materia': str(materia_value).strip(),
-                                'qualificacio': qualificacio_value,
-                                'comentari': comentari_value
-                            })
-                
-                # Add materies array to student
-                student['materies'] = materies
-                
-                # Add all other columns as fields (excluding materies columns)
-                for col in df.columns:
-                    if col not in ['id', 'nom_cognoms', 'numero_avaluacio', 'comentari general'] and not col.startswith('m') and not col.startswith('q') and not col.startswith('c'):
-                        value = row[col]
-                        # Handle NaN values
-                        if pd.isna(value):
-                            student[col] = ""
-                        else:
-                            student[col] = str(value).strip()
-                
-                student['comentari_general'] = str(row['comentari general']).strip()
-                
-                students.append(student)
-                if i < 3: # Show first 3 students for debugging
-                    logger.debug(f"Estudiant {i}: {student}")
-            except Exception as e:
-                logger.error(f"Error processant la fila {idx}: {str(e)}")
-                logger.debug(f"Dades de la fila: {row.to_dict()}")
-                continue
+        logger.debug(f"Convertint DataFrame a llista de diccionaris (motor '{engine}')")
+        students = dataframe_to_students(df, engine=engine, schema=schema)
         
         # Validate that we have at least one student
         if len(students) == 0:
-            logger.warning(f"No s'han trobat estudiants vàlids a {csv_file}")
-            return False, f"No s'han trobat estudiants vàlids a {csv_file}", None
+            logger.warning(f"No s'han trobat estudiants vàlids a {source_name}")
+            return False, f"No s'han trobat estudiants vàlids a {source_name}", None
         
         logger.info(f"S'han convertit amb èxit {len(students)} estudiants")
         
@@ -219,81 +562,289 @@ def process_csv_to_json(csv_file, output_file, trimestre, save_to_file=False):
         
         # Validate JSON data is not empty
         if not json_data or json_data.strip() == '' or json_data.strip() == '[]':
-            logger.error(f"S'ha generat JSON buit per a {csv_file}")
-            return False, f"S'ha generat JSON buit per a {csv_file}", None
+            logger.error(f"S'ha generat JSON buit per a {source_name}")
+            return False, f"S'ha generat JSON buit per a {source_name}", None
         
         # Save to file only if requested
         if save_to_file:
             logger.debug(f"Desant al fitxer {output_file}")
             save_json_to_file(json_data, output_file)
+            if columnar_format:
+                save_columnar_file(students, output_file, trimestre, columnar_format, grup)
         
-        logger.info(f"S'ha processat amb èxit {csv_file}")
+        logger.info(f"S'ha processat amb èxit {source_name}")
             
-        return True, f"S'ha processat amb èxit {csv_file}", json_data
+        return True, f"S'ha processat amb èxit {source_name}", json_data
         
     except Exception as e:
         logger.error(f"Excepció a process_csv_to_json: {str(e)}")
-        return False, f"Error processant {csv_file}: {str(e)}", None
-    finally:
-        # Clean up temporary file if it was created
-        if should_delete_temp and os.path.exists(cleaned_csv_file):
+        return False, f"Error processant {source_name}: {str(e)}", None
+
+def _infer_stream_dtypes(csv_file, chunksize):
+    """
+    Return the dtype of every column of a CSV file as pandas infers it when
+    reading the whole file, inferring each chunk and combining the results:
+    numeric dtypes widen to their common type and any other mix is object.
+    Object columns map to str so their values are read as the text of the cell.
+    """
+    dtypes = {}
+    with open_clean_csv(csv_file) as cleaned_csv:
+        for chunk in pd.read_csv(cleaned_csv, sep='|', on_bad_lines='skip', chunksize=chunksize):
+            for col, dtype in chunk.dtypes.items():
+                seen = dtypes.setdefault(col, dtype)
+                if seen == dtype:
+                    continue
+                if seen.kind in 'iuf' and dtype.kind in 'iuf':
+                    dtypes[col] = np.result_type(seen, dtype)
+                else:
+                    dtypes[col] = np.dtype(object)
+    return {col: str if dtype == object else dtype for col, dtype in dtypes.items()}
+
+def _stream_json_layout(envelope=None):
+    """
+    Return the text written before, between and after the students of a
+    streamed JSON file and the indentation of each student, following
+    json.dumps(..., indent=2) on the students list or, when ``envelope``
+    holds the grup and trimestre, on the structure of build_envelope.
+    """
+    if envelope is None:
+        return '[\n  ', ',\n  ', '\n]', '  '
+    header = ''.join(f'  "{key}": {json.dumps(envelope[key], ensure_ascii=False)},\n' for key in ('grup', 'trimestre'))
+    closing = f'\n  ],\n  "metrika_version": {json.dumps(AppConfig.VERSION, ensure_ascii=False)}\n}}'
+    return '{\n' + header + '  "estudiants": [\n    ', ',\n    ', closing, '    '
+
+def _write_stream_record(output, student, output_format, first, layout):
+    """Append one student to a JSON array or JSON lines output"""
+    if output_format == 'jsonl':
+        output.write(json.dumps(student, ensure_ascii=False))
+        output.write('\n')
+    else:
+        opening, separator, _, indent = layout
+        output.write(opening if first else separator)
+        output.write(json.dumps(student, ensure_ascii=False, indent=2).replace('\n', '\n' + indent))
+
+def stream_csv_to_json(csv_file, output_file, trimestre, output_format='json', chunksize=STREAM_CHUNK_ROWS, engine='columnar', grup=None, envelope=False):
+    """
+    Convert a CSV file to JSON reading and writing it in chunks of rows.
+
+    Each chunk of ``chunksize`` rows is converted to student records and
+    written straight to ``output_file``, either as a JSON array laid out like
+    process_csv_to_json output or as JSON lines (``output_format='jsonl'``),
+    so memory use does not grow with the size of the export. With
+    ``envelope`` the JSON array is written inside the grup/trimestre/
+    estudiants/metrika_version structure of build_envelope, with ``grup``
+    defaulting to the name of the output folder.
+
+    A first pass over the file infers the dtype of each column as
+    process_csv_to_json does when reading it whole, and the chunks are read
+    with those dtypes, so the values written do not depend on where chunk
+    boundaries fall and match the non-streaming conversion.
+
+    Returns (success, message, number of students written).
+    """
+    if output_format not in STREAM_FORMATS:
+        raise ValueError(f"Format de sortida desconegut: {output_format}. Opcions: {STREAM_FORMATS}")
+    if engine not in CONVERSION_ENGINES:
+        raise ValueError(f"Motor de conversió desconegut: {engine}. Opcions: {CONVERSION_ENGINES}")
+    
+    source_name = describe_csv_source(csv_file)
+    csv_file = rewindable_csv_source(csv_file)
+    logger.info(f"Iniciant el processament en streaming de {source_name} (blocs de {chunksize} files)")
+    layout = None
+    if output_format == 'json':
+        if envelope and grup is None:
+            grup = os.path.basename(os.path.dirname(os.path.abspath(output_file)))
+        layout = _stream_json_layout({'grup': grup, 'trimestre': trimestre} if envelope else None)
+    n_students = 0
+    try:
+        dtypes = _infer_stream_dtypes(csv_file, chunksize)
+        with open_clean_csv(csv_file) as cleaned_csv, open(output_file, 'w', encoding='utf-8') as output:
+            chunks = pd.read_csv(cleaned_csv, sep='|', on_bad_lines='skip', dtype=dtypes, chunksize=chunksize)
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    # All chunks share the header, resolve its layout once
+                    schema = resolve_csv_schema(chunk.columns)
+                    if schema.missing:
+                        raise ValueError(f"Falten columnes requerides a {source_name}: {schema.missing}")
+                for student in dataframe_to_students(chunk, engine=engine, schema=schema):
+                    _write_stream_record(output, student, output_format, n_students == 0, layout)
+                    n_students += 1
+                logger.debug(f"Bloc {i + 1} convertit, {n_students} estudiants escrits")
+            if output_format == 'json' and n_students:
+                output.write(layout[2])
+        
+        if n_students == 0:
+            raise ValueError(f"No s'han trobat estudiants vàlids a {source_name}")
+    except Exception as e:
+        logger.error(f"Excepció a stream_csv_to_json: {str(e)}")
+        if os.path.isfile(output_file):
             try:
-                os.unlink(cleaned_csv_file)
-                logger.debug(f"S'ha netejat el fitxer temporal: {cleaned_csv_file}")
+                os.unlink(output_file)
+            except OSError as unlink_error:
+                logger.warning(f"No s'ha pogut eliminar el fitxer incomplet {output_file}: {str(unlink_error)}")
+        return False, f"Error processant {source_name}: {str(e)}", 0
+    
+    logger.info(f"S'han escrit {n_students} estudiants a {output_file}")
+    return True, f"S'ha processat amb èxit {source_name}", n_students
+
+def detect_trimester(csv_file):
+    """Return T1, T2 or T3 from a CSV file name containing '1r', '2n' or '3r', None otherwise"""
+    # Get the base name without extension
+    base_name = os.path.splitext(os.path.basename(csv_file))[0]
+    
+    # Extract trimester from base name
+    for key, value in TRIMESTER_MAP.items():
+        if key in base_name.lower():
+            return value
+    return None
+
+def build_envelope(json_data, grup, trimestre):
+    """Wrap the students JSON of process_csv_to_json in the file structure loaded by the app"""
+    return json.dumps({
+        "grup": grup,
+        "trimestre": trimestre,
+        "estudiants": json.loads(json_data),
+        "metrika_version": AppConfig.VERSION
+    }, ensure_ascii=False, indent=2)
+
+def _save_trimestre_file(json_data, output_file, trimester, columnar_format=None, grup=None, envelope=False):
+    """Save an already converted file of process_trimestre_files (and its columnar copy)"""
+    if envelope:
+        if grup is None:
+            grup = os.path.basename(os.path.dirname(os.path.abspath(output_file)))
+        save_json_to_file(build_envelope(json_data, grup, trimester), output_file)
+    else:
+        save_json_to_file(json_data, output_file)
+    if columnar_format:
+        save_columnar_file(json.loads(json_data), output_file, trimester, columnar_format, grup)
+
+def _convert_trimestre_file(csv_file, output_file, trimester, save_to_file, engine='rows', columnar_format=None, grup=None, envelope=False, stream=False):
+    """Convert one CSV file of process_trimestre_files. Returns (success, message, json_data)"""
+    if stream and save_to_file:
+        # Written chunk by chunk, the students are never held in memory
+        success, message, _ = stream_csv_to_json(csv_file, output_file, trimester, engine=engine, grup=grup, envelope=envelope)
+        return success, message, None
+    
+    # Process the file, envelopes are saved once converted
+    success, message, json_data = process_csv_to_json(
+        csv_file, output_file, trimester, save_to_file=save_to_file and not envelope, engine=engine,
+        columnar_format=columnar_format, grup=grup
+    )
+    if success and save_to_file and envelope:
+        _save_trimestre_file(json_data, output_file, trimester, columnar_format, grup, envelope)
+    
+    # If processing failed and we're saving to file, remove any empty JSON file that might have been created
+    if not success and save_to_file:
+        if os.path.exists(output_file):
+            try:
+                # Check if the file is empty or contains only empty array
+                with open(output_file, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if not content or content == '[]':
+                    os.unlink(output_file)
+                    logger.info(f"S'ha eliminat el fitxer JSON buit: {output_file}")
             except Exception as e:
-                logger.warning(f"No s'ha pogut eliminar el fitxer temporal {cleaned_csv_file}: {str(e)}")
+                logger.warning(f"No s'ha pogut comprovar/eliminar el fitxer JSON buit {output_file}: {str(e)}")
+    
+    return success, message, json_data
 
-def process_trimestre_files(csv_files, output_dir, save_to_file=False):
-    """Process multiple CSV files for different trimesters"""
-    results = []
+def process_trimestre_files(csv_files, output_dir, save_to_file=False, workers=1, progress_callback=None, cache=None, engine='rows', columnar_format=None, grup=None, output_files=None, envelope=False, stream=False):
+    """
+    Process multiple CSV files for different trimesters.
+
+    With ``workers`` > 1 the files are converted in a pool of that many
+    processes. Results keep the order of ``csv_files`` either way, and
+    ``progress_callback(done, total, csv_file, result)`` is called as soon as
+    each file finishes. When several files map to the same trimester only the
+    last one is saved, as it would overwrite the others.
+
+    With a ConversionCache, files whose content, converter version and
+    options are unchanged are served from the cache instead of reconverted.
+    ``columnar_format`` also saves a Parquet/Arrow file next to each JSON,
+    with ``grup`` (by default the name of ``output_dir``) in its metadata.
+
+    ``output_files`` gives the JSON file of each CSV file instead of
+    <output_dir>/<trimestre>.json, and ``grup`` may then hold one grup per
+    file. With ``envelope`` the files are saved in the grup/trimestre/
+    estudiants/metrika_version structure loaded by the app.
+
+    With ``stream`` the saved files are written chunk by chunk with
+    stream_csv_to_json. Their conversions are not kept in the cache, and
+    ``columnar_format`` is not supported as it needs every student in memory.
+    """
+    if stream and columnar_format:
+        raise ValueError("La conversió en streaming no admet formats columnars")
+    results = [None] * len(csv_files)
+    total = len(csv_files)
+    done = 0
+    options = {'engine': engine}
     
-    # Ensure output directory exists
-    if save_to_file:
-        os.makedirs(output_dir, exist_ok=True)
+    def report(index, success, message, json_data=None, cache_key=None):
+        nonlocal done
+        if success and cache is not None and cache_key is not None and json_data is not None:
+            cache.put(cache_key, json_data, source=csv_files[index])
+        results[index] = (success, message)
+        done += 1
+        if progress_callback:
+            progress_callback(done, total, csv_files[index], results[index])
     
-    # Process each CSV file
-    for csv_file in csv_files:
-        # Get the base name without extension
-        base_name = os.path.splitext(os.path.basename(csv_file))[0]
-        
-        # Map the base name to T1, T2, or T3
-        trimester_map = {
-            '1r': 'T1',
-            '2n': 'T2',
-            '3r': 'T3'
-        }
-        
-        # Extract trimester from base name
-        trimester = None
-        for key, value in trimester_map.items():
-            if key in base_name.lower():
-                trimester = value
-                break
-        
+    grups = grup if isinstance(grup, (list, tuple)) else [grup] * len(csv_files)
+    
+    # Resolve the output of each file; the last file for each output is saved
+    tasks = []
+    last_for_output = {}
+    for index, csv_file in enumerate(csv_files):
+        trimester = detect_trimester(csv_file)
         if trimester is None:
-            results.append((False, f"No s'ha pogut determinar el trimestre per a {csv_file}. El nom del fitxer ha de contenir '1r', '2n', o '3r' per indicar el trimestre."))
+            report(index, False, f"No s'ha pogut determinar el trimestre per a {csv_file}. El nom del fitxer ha de contenir '1r', '2n', o '3r' per indicar el trimestre.")
             continue
         
         # Create output file name
-        output_file = os.path.join(output_dir, f"{trimester}.json")
-        
-        # Process the file
-        success, message, json_data = process_csv_to_json(csv_file, output_file, trimester, save_to_file=save_to_file)
-        
-        # If processing failed and we're saving to file, remove any empty JSON file that might have been created
-        if not success and save_to_file:
-            if os.path.exists(output_file):
+        output_file = output_files[index] if output_files is not None else os.path.join(output_dir, f"{trimester}.json")
+        last_for_output[output_file] = index
+        tasks.append((index, csv_file, output_file, trimester))
+    
+    # Ensure output directories exist
+    if save_to_file:
+        folders = {output_dir} if output_files is None else {os.path.dirname(output_file) or '.' for output_file in last_for_output}
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+    
+    # Serve unchanged files from the cache
+    pending = []
+    for index, csv_file, output_file, trimester in tasks:
+        save = save_to_file and last_for_output[output_file] == index
+        cache_key = None
+        if cache is not None:
+            try:
+                cache_key = cache.make_key(csv_file, options)
+            except OSError as e:
+                logger.warning(f"No s'ha pogut calcular la clau de memòria cau per a {csv_file}: {str(e)}")
+            json_data = cache.get(cache_key) if cache_key else None
+            if json_data is not None:
+                if save:
+                    _save_trimestre_file(json_data, output_file, trimester, columnar_format, grups[index], envelope)
+                report(index, True, f"S'ha processat amb èxit {csv_file} (memòria cau)")
+                continue
+        pending.append((index, cache_key, (csv_file, output_file, trimester, save, engine, columnar_format, grups[index], envelope, stream)))
+    
+    if workers > 1 and len(pending) > 1:
+        logger.info(f"Convertint {len(pending)} fitxers amb {workers} processos")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_convert_trimestre_file, *task): (index, cache_key, task)
+                for index, cache_key, task in pending
+            }
+            for future in as_completed(futures):
+                index, cache_key, task = futures[future]
                 try:
-                    # Check if the file is empty or contains only empty array
-                    with open(output_file, 'r', encoding='utf-8') as f:
-                        content = f.read().strip()
-                    if not content or content == '[]':
-                        os.unlink(output_file)
-                        logger.info(f"S'ha eliminat el fitxer JSON buit: {output_file}")
+                    report(index, *future.result(), cache_key=cache_key)
                 except Exception as e:
-                    logger.warning(f"No s'ha pogut comprovar/eliminar el fitxer JSON buit {output_file}: {str(e)}")
-        
-        results.append((success, message))
+                    logger.error(f"Error en el procés de conversió de {task[0]}: {str(e)}")
+                    report(index, False, f"Error processant {task[0]}: {str(e)}")
+    else:
+        for index, cache_key, task in pending:
+            report(index, *_convert_trimestre_file(*task), cache_key=cache_key)
     
     return results
 
@@ -336,24 +887,71 @@ def main():
     for file in selected_files:
         st.write(f"📄 {file}")
     
+    # Reuse previous conversions of unchanged files
+    use_cache = st.checkbox("Reutilitzar les conversions de fitxers sense canvis (memòria cau)", value=True)
+    
+    # Optional columnar copy of every JSON file
+    columnar_choice = st.selectbox(
+        "Desa també una còpia columnar (càrrega més ràpida)",
+        ["Cap", "parquet", "arrow"]
+    )
+    
+    # Optional multi-trimester dataset the converted sessions are merged into
+    merge_dataset = st.checkbox("Fusionar les sessions convertides en un conjunt de dades multitrimestral")
+    dataset_file = None
+    if merge_dataset:
+        dataset_file = st.text_input(
+            "Fitxer del conjunt de dades",
+            value=os.path.join(working_dir, "dataset.jsonl")
+        )
+    
+    # Number of parallel conversion processes
+    workers = st.number_input(
+        "Nombre de processos de conversió en paral·lel",
+        min_value=1,
+        max_value=max(1, os.cpu_count() or 1),
+        value=max(1, min(len(selected_files), os.cpu_count() or 1))
+    )
+    
     # Process files when button is clicked
     if st.button("Convertir a JSON"):
         # Show progress
         progress_bar = st.progress(0)
         status_text = st.empty()
         
+        def show_progress(done, total, csv_file, result):
+            progress_bar.progress(done / total)
+            status_text.text(f"Convertit {os.path.basename(csv_file)} ({done}/{total})")
+        
         # Process files
         full_paths = [os.path.join(working_dir, f) for f in selected_files]
-        results = process_trimestre_files(full_paths, working_dir, save_to_file=True)
+        results = process_trimestre_files(
+            full_paths,
+            working_dir,
+            save_to_file=True,
+            workers=int(workers),
+            progress_callback=show_progress,
+            cache=ConversionCache() if use_cache else None,
+            columnar_format=None if columnar_choice == "Cap" else columnar_choice
+        )
+        status_text.empty()
         
         # Display results
         st.subheader("Resultats de la conversió:")
-        for i, (success, message) in enumerate(results):
+        for success, message in results:
             if success:
                 st.success(message)
             else:
                 st.error(message)
-            progress_bar.progress((i + 1) / len(results))
+        
+        if dataset_file:
+            # Merge the trimester files converted in this run into the dataset
+            grup = os.path.basename(os.path.abspath(working_dir))
+            for _, success, message in merge_converted_sessions([detect_trimester(f) for f in full_paths], results, working_dir, dataset_file, grup):
+                if success:
+                    st.info(message)
+                else:
+                    st.error(message)
         
         st.success("Conversió completada!")
 
@@ -0,0 +1,86 @@
+import numpy as np
+
+FAILURE_CATEGORIES = ("Tot aprovat", "Fins a 3 susp.", "4 o 5 susp.", "Més de 5 susp.")
+"""Categories of students by their number of NA marks"""
+
+FAILURE_BINS = np.array([1, 4, 6])
+"""Lower number of NA marks of every category but the first, for np.digitize"""
+
+
+def failure_categories(n_failures):
+    """Index in FAILURE_CATEGORIES of each number of NA marks"""
+    return np.digitize(n_failures, FAILURE_BINS)
+
+
+class FailureSummary:
+    """
+    Failure categories of the students of a MarksDataset, for every group
+    and trimester at once.
+
+    ``counts`` is a groups x trimesters x categories array with the number
+    of students of each category, ``total_counts`` a groups x categories
+    array over the NA marks of all trimesters (each student in the group of
+    their last trimester). The tables of one group, one trimester or the
+    whole dataset are slices of them.
+    """
+
+    def __init__(self, marks):
+        self.marks = marks
+        n_groups, n_trimesters, n_categories = len(marks.groups), len(marks.trimesters), len(FAILURE_CATEGORIES)
+        # Category of each student in each trimester and over all of them
+        self.categories = failure_categories(marks.failure_counts)
+        self.total_categories = failure_categories(marks.failures())
+        self.student_groups = marks.last_groups()
+
+        s, t = np.nonzero(marks.present)
+        keys = np.ravel_multi_index((marks.student_groups[s, t], t, self.categories[s, t]),
+                                    (n_groups, n_trimesters, n_categories)) if len(s) else np.arange(0)
+        self.counts = np.bincount(keys, minlength=n_groups * n_trimesters * n_categories).reshape(
+            n_groups, n_trimesters, n_categories)
+        keys = self.student_groups * n_categories + self.total_categories
+        self.total_counts = np.bincount(keys, minlength=n_groups * n_categories).reshape(n_groups, n_categories)
+
+    def _index(self, names, value):
+        if value is None or isinstance(value, (int, np.integer)):
+            return value
+        return names.index(value)
+
+    def category_counts(self, group=None, trimester=None):
+        """Number of students of each category of a group and trimester (index or name), all of them if None"""
+        group = self._index(self.marks.groups, group)
+        trimester = self._index(self.marks.trimesters, trimester)
+        counts = self.total_counts if trimester is None else self.counts[:, trimester]
+        return counts.sum(axis=0) if group is None else counts[group]
+
+    def student_categories(self, group=None, trimester=None):
+        """Indices of the students of a group and trimester and the category of each one"""
+        group = self._index(self.marks.groups, group)
+        trimester = self._index(self.marks.trimesters, trimester)
+        if trimester is None:
+            selected = np.ones(len(self.marks), dtype=bool)
+            groups, categories = self.student_groups, self.total_categories
+        else:
+            selected = self.marks.present[:, trimester]
+            groups, categories = self.marks.student_groups[:, trimester], self.categories[:, trimester]
+        if group is not None:
+            selected = selected & (groups == group)
+        positions = np.flatnonzero(selected)
+        return positions, categories[positions]
+
+    def rows(self, group=None, trimester=None):
+        """
+        Table of a group and trimester: one row per category with its
+        Categoria, Nº d'alumnes, % and the names of its Alumnes.
+        """
+        counts = self.category_counts(group, trimester)
+        positions, categories = self.student_categories(group, trimester)
+        total = counts.sum()
+        data = []
+        for category, (label, count) in enumerate(zip(FAILURE_CATEGORIES, counts)):
+            data.append({
+                "Categoria": label,
+                "Nº d'alumnes": int(count),
+                "%": f"{(count/total*100):.1f}%" if total > 0 else "0.0%",
+                "Alumnes": '; '.join(self.marks.names[positions[categories == category]])
+            })
+        return data
@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+from utils.constants import MarkConfig
+from utils.subject_catalog import SubjectCatalog
+
+# Mark codes stored in the marks array, the mark codes follow HEIGHT_MAP
+ABSENT_CODE = -1  # The student has no such materia in the trimester
+EMPTY_CODE = 0  # The materia has no qualification
+OTHER_CODE = 5  # A qualification that is not one of MarkConfig.LIST
+
+MARK_CODES = {mark: code for code, mark in enumerate(MarkConfig.LIST.value, start=1)}
+"""Code of each mark of MarkConfig.LIST"""
+
+MARK_LABELS = ("",) + tuple(MarkConfig.LIST.value) + ("",)
+"""Mark of each code, indexed by code"""
+
+MARK_VALUES = np.array([np.nan, 2.5, 5.0, 7.5, 10.0, np.nan])
+"""Numeric value (0-10) of each code, NaN for codes without a mark"""
+
+N_CODES = len(MARK_LABELS)
+
+
+def mark_code(qualificacio):
+    """Return the code of a qualification string"""
+    if not qualificacio or not isinstance(qualificacio, str):
+        return EMPTY_CODE
+    return MARK_CODES.get(qualificacio, OTHER_CODE)
+
+
+def encode_marks(qualificacions):
+    """Return the int8 codes of an iterable of qualification strings"""
+    return np.fromiter((mark_code(q) for q in qualificacions), dtype=np.int8)
+
+
+def count_codes(codes):
+    """Count every code (ABSENT_CODE excluded) of an array of codes. Returns an array indexed by code"""
+    codes = np.asarray(codes).ravel()
+    return np.bincount(codes[codes >= 0], minlength=N_CODES)
+
+
+def label_counts(counts):
+    """Map the non-zero counts of the four marks to their labels, in MarkConfig.LIST order"""
+    return {MARK_LABELS[code]: int(counts[code]) for code in MARK_CODES.values() if counts[code] > 0}
+
+
+class MarkCube:
+    """
+    Groups x trimesters x materies x codes array with the number of marks of
+    each code.
+
+    Counted with a single bincount when a MarksDataset is built, so that the
+    charts sum a small slice of the cube instead of recounting the marks of
+    every student on each render. Groups and trimesters are selected by
+    index or name, materies by a boolean mask or an array of indices.
+    """
+
+    def __init__(self, groups, trimesters, materies, counts):
+        self.groups = groups
+        self.trimesters = trimesters
+        self.materies = materies
+        self.counts = counts
+
+    @classmethod
+    def from_cells(cls, cell_codes, cells, cell_groups, groups, trimesters, materies):
+        """
+        Count the codes of some (student, materia, trimester) cells,
+        ``cell_codes`` and ``cell_groups`` being the code and the group
+        index of each cell.
+        """
+        _, j, t = cells
+        shape = (len(groups), len(trimesters), len(materies), N_CODES)
+        flat = np.ravel_multi_index((cell_groups, t, j, cell_codes), shape) if len(j) else np.arange(0)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(groups, trimesters, materies, counts)
+
+    @staticmethod
+    def _axis_index(names, value):
+        """Slice of one group or trimester (index or name) that keeps the axis, every one if None"""
+        if value is None:
+            return slice(None)
+        if not isinstance(value, (int, np.integer)):
+            value = names.index(value)
+        return slice(value, value + 1)
+
+    def select(self, group=None, trimester=None, materia_mask=None):
+        """Sub-cube of a group, a trimester and some materies, keeping the four axes"""
+        counts = self.counts[self._axis_index(self.groups, group), self._axis_index(self.trimesters, trimester)]
+        if materia_mask is not None:
+            counts = counts[:, :, materia_mask]
+        return counts
+
+    def mark_counts(self, group=None, trimester=None, materia_mask=None):
+        """Number of marks of each code, indexed by code"""
+        return self.select(group, trimester, materia_mask).sum(axis=(0, 1, 2))
+
+    def materia_mark_counts(self, group=None, trimester=None, materia_mask=None):
+        """materies x codes array with the number of marks of each code per materia"""
+        return self.select(group, trimester, materia_mask).sum(axis=(0, 1))
+
+    def group_mark_counts(self, trimester=None, materia_mask=None):
+        """groups x codes array with the number of marks of each code per group"""
+        return self.select(None, trimester, materia_mask).sum(axis=(1, 2))
+
+
+class MarksDataset:
+    """
+    Students x materies x trimesters array of int8 mark codes.
+
+    Built once from the loaded student dictionaries, so that sections count,
+    average and reshape marks with NumPy instead of walking the nested
+    ``materies`` lists. Students are matched across trimesters by id and
+    kept in order of first appearance, materies are sorted by name and
+    trimesters follow their order of appearance. The original student and
+    materia dictionaries stay available for comments and details. The mark
+    counts per group, trimester and materia (a MarkCube) and the NA marks
+    of every student are counted when the dataset is built.
+
+    A materia repeated within a student record keeps its first entry in
+    ``codes`` and ``details``, but every entry is kept in ``cells`` (with
+    ``repeated`` flagging all but the first) and counted by the mark
+    counts, failures and averages, as the students lists count them.
+    """
+
+    def __init__(self, ids, names, materies, trimesters, codes, records, details, cells=None, cell_codes=None,
+                 cell_details=None):
+        self.ids = ids
+        self.names = names
+        self.materies = materies
+        self.trimesters = trimesters
+        self.codes = codes
+        self.records = records
+        self.details = details
+        # (student, materia, trimester) index arrays of every materia entry in the order they were loaded
+        self.cells = cells if cells is not None else tuple(np.nonzero(codes >= EMPTY_CODE))
+        s, j, t = self.cells
+        self.cell_codes = cell_codes if cell_codes is not None else codes[s, j, t]
+        self.cell_details = cell_details if cell_details is not None else [details.get(cell) for cell in zip(s, j, t)]
+        _, first = np.unique(np.ravel_multi_index(self.cells, codes.shape), return_index=True) if len(s) else (None, [])
+        self.repeated = np.ones(len(s), dtype=bool)
+        self.repeated[first] = False
+        # Row of each id, the first one for ids repeated within a trimester
+        self.student_index = {}
+        for i, student_id in enumerate(ids):
+            self.student_index.setdefault(student_id, i)
+        self.materia_index = {materia: j for j, materia in enumerate(materies)}
+        # Course level, stage and area of every materia, parsed once
+        self.subjects = SubjectCatalog(materies)
+        # Students with a record in each trimester and the index of its group
+        self.present = np.zeros((len(ids), len(trimesters)), dtype=bool)
+        student_groups = np.zeros((len(ids), len(trimesters)), dtype=np.intp)
+        groups, group_index = [], {}
+        for (s, t), record in records.items():
+            self.present[s, t] = True
+            grup = record.get('grup', '')
+            g = student_groups[s, t] = group_index.setdefault(grup, len(groups))
+            if g == len(groups):
+                groups.append(grup)
+        self.groups = groups
+        self.student_groups = student_groups
+        # Aggregates counted once, the charts slice them
+        s, _, t = self.cells
+        self.cube = MarkCube.from_cells(self.cell_codes, self.cells, student_groups[s, t], groups, trimesters, materies)
+        failed = self.cell_codes == MARK_CODES[MarkConfig.NA.value]
+        self.failure_counts = np.bincount(
+            s[failed] * len(trimesters) + t[failed], minlength=len(ids) * len(trimesters)
+        ).reshape(len(ids), len(trimesters))
+
+    @classmethod
+    def from_students(cls, students):
+        """Build the dataset from a list of student dictionaries"""
+        ids, names, trimesters = [], [], []
+        student_index, trimester_index = {}, {}
+        records, details = {}, {}
+        materia_names = set()
+        cells = []
+        for student in students:
+            trimestre = student.get('trimestre', '')
+            t = trimester_index.setdefault(trimestre, len(trimesters))
+            if t == len(trimesters):
+                trimesters.append(trimestre)
+            student_id = str(student.get('id', ''))
+            # Repeated ids within a trimester are kept as different students (rows), all with the original id
+            key = (student_id, 0)
+            while key in student_index and (student_index[key], t) in records:
+                key = (student_id, key[1] + 1)
+            s = student_index.setdefault(key, len(ids))
+            if s == len(ids):
+                ids.append(student_id)
+                names.append(student.get('nom_cognoms', ''))
+            records[(s, t)] = student
+            for materia in student.get('materies', []):
+                materia_names.add(materia['materia'])
+                cells.append((s, materia['materia'], t, materia))
+
+        materies = sorted(materia_names)
+        materia_index = {materia: j for j, materia in enumerate(materies)}
+        codes = np.full((len(ids), len(materies), len(trimesters)), ABSENT_CODE, dtype=np.int8)
+        order = (np.arange(0, dtype=np.intp),) * 3
+        values = np.arange(0, dtype=np.int8)
+        if cells:
+            s_idx = np.array([c[0] for c in cells], dtype=np.intp)
+            j_idx = np.array([materia_index[c[1]] for c in cells], dtype=np.intp)
+            t_idx = np.array([c[2] for c in cells], dtype=np.intp)
+            values = encode_marks(c[3].get('qualificacio') for c in cells)
+            # The first occurrence of a materia wins, so assign in reverse order
+            codes[s_idx[::-1], j_idx[::-1], t_idx[::-1]] = values[::-1]
+            for s, materia, t, detail in reversed(cells):
+                details[(s, materia_index[materia], t)] = detail
+            order = (s_idx, j_idx, t_idx)
+
+        return cls(np.array(ids, dtype=object), np.array(names, dtype=object), np.array(materies, dtype=object),
+                   trimesters, codes, records, details, order, values, [c[3] for c in cells])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _present_students(self, trimester=None):
+        if trimester is None:
+            return self.present.any(axis=1)
+        if not isinstance(trimester, (int, np.integer)):
+            trimester = self.trimesters.index(trimester)
+        return self.present[:, trimester]
+
+    def materia_mask(self, courses, stage=None):
+        """Boolean mask of the materies whose name contains any of the courses (e.g. '3r'), see SubjectCatalog"""
+        return self.subjects.mask(courses, stage)
+
+    def mark_counts(self, materia_mask=None, trimester=None, group=None):
+        """Number of marks of each code, indexed by code"""
+        return self.cube.mark_counts(group, trimester, materia_mask)
+
+    def materia_mark_counts(self, materia_mask=None, trimester=None, group=None):
+        """materies x codes array with the number of marks of each code per materia"""
+        return self.cube.materia_mark_counts(group, trimester, materia_mask)
+
+    def failures(self, trimester=None):
+        """Number of NA marks of each student"""
+        if trimester is None:
+            return self.failure_counts.sum(axis=1)
+        if not isinstance(trimester, (int, np.integer)):
+            trimester = self.trimesters.index(trimester)
+        return self.failure_counts[:, trimester]
+
+    def averages(self, trimester=None):
+        """Mean numeric mark (0-10) of each student, NaN for students without marks"""
+        s, _, t = self.cells
+        values = MARK_VALUES[self.cell_codes]
+        keep = ~np.isnan(values)
+        if trimester is not None:
+            if not isinstance(trimester, (int, np.integer)):
+                trimester = self.trimesters.index(trimester)
+            keep &= t == trimester
+        counts = np.bincount(s[keep], minlength=len(self.ids))
+        totals = np.bincount(s[keep], weights=values[keep], minlength=len(self.ids))
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+    def marks_matrix(self, trimester=None):
+        """
+        Students x materies codes of one trimester (the last one by default)
+        and the indices of the students present in it.
+        """
+        if not self.trimesters:
+            return np.empty((0, len(self.materies)), dtype=np.int8), np.arange(0)
+        if trimester is None:
+            trimester = len(self.trimesters) - 1
+        elif not isinstance(trimester, (int, np.integer)):
+            trimester = self.trimesters.index(trimester)
+        positions = np.flatnonzero(self.present[:, trimester])
+        return self.codes[positions, :, trimester], positions
+
+    def last_groups(self):
+        """Index in ``groups`` of the group of each student in the last trimester with a record"""
+        if not self.trimesters:
+            return np.zeros(len(self.ids), dtype=np.intp)
+        last = len(self.trimesters) - 1 - np.argmax(self.present[:, ::-1], axis=1)
+        return self.student_groups[np.arange(len(self.ids)), last]
+
+    def student_positions(self, trimester=None):
+        """Indices of the students with a record in the trimester (any trimester if None)"""
+        return np.flatnonzero(self._present_students(trimester))
+
+    def record(self, student, trimester=None):
+        """Original dictionary of a student (index), from the last trimester when not given"""
+        if trimester is None:
+            trimester = int(np.flatnonzero(self.present[student])[-1])
+        return self.records.get((student, trimester))
+
+    def materia_detail(self, student, materia, trimester):
+        """Original materia dictionary (qualificacio, comentari) of a student, None if absent"""
+        return self.details.get((student, materia, trimester))
+
+    def long_frame(self, min_code=EMPTY_CODE):
+        """
+        One row per materia entry with a code >= min_code, in the order the
+        students and their materies were loaded. Columns: alumne, id, nom,
+        materia, trimestre, codi, valor and qualificacio (the original text).
+        """
+        s, j, t = self.cells
+        keep = self.cell_codes >= min_code
+        s, j, t, code = s[keep], j[keep], t[keep], self.cell_codes[keep]
+        return pd.DataFrame({
+            'alumne': s,
+            'id': self.ids[s],
+            'nom': self.names[s],
+            'materia': self.materies[j],
+            'trimestre': np.array(self.trimesters + [None], dtype=object)[t],
+            'codi': code,
+            'valor': MARK_VALUES[code],
+            'qualificacio': [self.cell_details[i].get('qualificacio') for i in np.flatnonzero(keep)]
+        })
+
+
+def as_marks_dataset(students):
+    """Return ``students`` if it is already a MarksDataset, otherwise build one from the list"""
+    if isinstance(students, MarksDataset):
+        return students
+    return MarksDataset.from_students(students)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from utils.constants import AppConfig
+from utils.conversion_cache import ConversionCache
+
+logger = logging.getLogger(__name__)
+
+# Default location of the migrated files
+DEFAULT_MIGRATION_DIR = os.path.join(os.path.expanduser('~'), '.metrika', 'migration_cache')
+
+# Least recently used migrated files are evicted above this total size (50 MB)
+DEFAULT_MIGRATION_MAX_SIZE = 50 * 1024 * 1024
+
+# Version of the files written before metrika_version existed (a bare list of students)
+LEGACY_VERSION = '0.0.0'
+
+# Group of the legacy files, which do not record it
+LEGACY_GROUP = 'Grup Antic'
+
+MIGRATIONS = {}
+"""Migration of each file version: source version -> (target version, function)"""
+
+
+def compare_versions(version1, version2):
+    """Compare two semantic versions and return -1, 0, or 1"""
+    def version_to_tuple(version):
+        return tuple(map(int, version.split('.')))
+
+    v1_tuple = version_to_tuple(version1)
+    v2_tuple = version_to_tuple(version2)
+
+    if v1_tuple < v2_tuple:
+        return -1
+    elif v1_tuple > v2_tuple:
+        return 1
+    else:
+        return 0
+
+
+def register_migration(from_version, to_version):
+    """
+    Register a function that upgrades the decoded data of a file from one
+    version to the next. The function is called with the data and the file
+    name and returns the upgraded data with metrika_version set.
+    """
+    def decorator(function):
+        if from_version in MIGRATIONS:
+            raise ValueError(f"Ja hi ha una migració registrada per a la versió {from_version}")
+        MIGRATIONS[from_version] = (to_version, function)
+        return function
+    return decorator
+
+
+@register_migration(LEGACY_VERSION, '1.0.0')
+def _wrap_legacy_list(students, filename):
+    """Wrap a bare list of students in the 1.0.0 envelope, the trimester comes from the file name (T1.json)"""
+    return {
+        'grup': LEGACY_GROUP,
+        'trimestre': os.path.basename(filename).split('.')[0],
+        'estudiants': students,
+        'metrika_version': '1.0.0'
+    }
+
+
+def data_version(data):
+    """Version of decoded file data (or of its header), None for envelopes without metrika_version"""
+    if isinstance(data, list):
+        return LEGACY_VERSION
+    if isinstance(data, dict):
+        return data.get('metrika_version')
+    return None
+
+
+def needs_migration(data):
+    """Whether decoded file data (or its header) is older than AppConfig.MIN_COMPATIBLE_VERSION and can be upgraded"""
+    version = data_version(data)
+    return (version is not None and version in MIGRATIONS
+            and compare_versions(version, AppConfig.MIN_COMPATIBLE_VERSION) < 0)
+
+
+def migrate_data(data, filename):
+    """
+    Apply the registered migrations to decoded file data until it reaches
+    AppConfig.MIN_COMPATIBLE_VERSION. Returns the upgraded data and the
+    version it had, unchanged data when no migration applies. Upgraded data
+    records the version it had in 'migrated_from'.
+    """
+    from_version = data_version(data)
+    if not needs_migration(data):
+        return data, from_version
+    while needs_migration(data):
+        to_version, migration = MIGRATIONS[data_version(data)]
+        data = migration(data, filename)
+        if data_version(data) != to_version:
+            raise ValueError(f"La migració de {filename} a la versió {to_version} no ha actualitzat metrika_version")
+    return {**data, 'migrated_from': from_version}, from_version
+
+
+def is_legacy_content(content):
+    """Whether encoded JSON content (bytes) is a bare list of students, checking its first character only"""
+    start = re.match(rb'\s*', content).end()
+    return content[start:start + 1] == b'['
+
+
+class MigrationCache(ConversionCache):
+    """
+    Persistent cache of old files migrated to the current format, so that
+    each one is upgraded once. Entries are keyed by the content hash and
+    name of the original file (legacy files take their trimester from it)
+    together with AppConfig.VERSION and MIN_COMPATIBLE_VERSION, and are
+    evicted as in ConversionCache, within DEFAULT_MIGRATION_MAX_SIZE by
+    default. The migrated data keeps 'migrated_from', so a file read from
+    the cache is described as the original one. Files can be migrated from
+    several threads (see utils.prefetch), so the manifest is accessed under
+    a lock.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_MIGRATION_DIR, max_size=DEFAULT_MIGRATION_MAX_SIZE, **kwargs):
+        super().__init__(cache_dir, max_size=max_size, **kwargs)
+        self._lock = threading.Lock()
+
+    def content_key(self, content, filename):
+        """Build the cache key of the content of a file"""
+        key_source = json.dumps({
+            'content': hashlib.sha256(content).hexdigest(),
+            'filename': os.path.basename(filename),
+            'version': AppConfig.VERSION,
+            'min_version': AppConfig.MIN_COMPATIBLE_VERSION
+        }, sort_keys=True)
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+    def get_migrated(self, content, filename):
+        """Return the migrated JSON content (bytes) of a file, or None on a miss"""
+        key = self.content_key(content, filename)
+        with self._lock:
+            json_data = self.get(key)
+        return json_data.encode('utf-8') if json_data is not None else None
+
+    def put_migrated(self, content, filename, data):
+        """Store the migrated data of a file"""
+        key = self.content_key(content, filename)
+        json_data = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self.put(key, json_data, source=os.path.basename(filename))
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Background threads decoding files, decoding releases the GIL only in part
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Results kept in the cache, the oldest finished ones are evicted above it
+DEFAULT_MAX_ENTRIES = 64
+
+
+class PrefetchCache:
+    """
+    Thread-safe cache of values computed once, in the foreground or in a
+    background thread pool.
+
+    ``get`` returns the cached value of a key. When the key is missing, the
+    calling thread computes it. When another thread is already computing
+    it, the caller waits for that result instead of computing it again.
+    ``prefetch`` schedules a ``get`` in the pool and returns at once, so
+    later foreground calls find the value ready or in progress; with
+    ``store=False`` the function only runs in the pool, for tasks that cache
+    their own results. Every entry
+    in progress belongs to a running thread, never to a queued task, so
+    waiting on one cannot deadlock the pool. Failed computations are not
+    cached.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='metrika-prefetch')
+        self._lock = threading.Lock()
+        self._futures = OrderedDict()
+        # Prefetch tasks of the pool that have not finished
+        self._scheduled = {}
+
+    def _evict(self):
+        """Drop the least recently used finished entries above max_entries, with the lock held"""
+        excess = len(self._futures) - self.max_entries
+        for key in [key for key, future in self._futures.items() if future.done()][:max(excess, 0)]:
+            del self._futures[key]
+
+    def reserve(self, n_entries):
+        """Grow max_entries to hold at least n_entries, it never shrinks as entries are shared"""
+        with self._lock:
+            self.max_entries = max(self.max_entries, n_entries)
+
+    def get(self, key, function, *args):
+        """Return the value of a key, computing it with function(*args) if no thread has done it yet"""
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self._evict()
+            else:
+                self._futures.move_to_end(key)
+        if owner:
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+                with self._lock:
+                    if self._futures.get(key) is future:
+                        del self._futures[key]
+                raise
+        return future.result()
+
+    def prefetch(self, key, function, *args, store=True):
+        """
+        Compute the value of a key in the background unless it is cached,
+        scheduled or in progress. With ``store=False`` the value is not
+        cached, the key only prevents scheduling the same task twice.
+        """
+        with self._lock:
+            if key in self._futures or key in self._scheduled:
+                return False
+            self._scheduled[key] = self._executor.submit(self._run, key, function, store, *args)
+        return True
+
+    def _run(self, key, function, store, *args):
+        try:
+            if store:
+                self.get(key, function, *args)
+            else:
+                function(*args)
+        except Exception as e:
+            logger.warning(f"Error en la càrrega anticipada de {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._scheduled.pop(key, None)
+
+    def ready(self, key):
+        """Whether the value of a key is computed"""
+        with self._lock:
+            future = self._futures.get(key)
+        return future is not None and future.done()
+
+    def wait(self):
+        """Block until the scheduled prefetches are done"""
+        with self._lock:
+            scheduled = list(self._scheduled.values())
+        wait(scheduled)
+
+    def clear(self):
+        """Drop every finished entry"""
+        with self._lock:
+            for key in [key for key, future in self._futures.items() if future.done()]:
+                del self._futures[key]
+
+    def __len__(self):
+        return len(self._futures)
+
+    def __contains__(self, key):
+        return key in self._futures
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
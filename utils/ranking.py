@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+def rank_order(values):
+    """Indices of the values from highest to lowest, NaN last, ties in their original order"""
+    values = np.asarray(values, dtype=float)
+    return np.argsort(np.where(np.isnan(values), np.inf, -values), kind='stable')
+
+
+def top_k(values, k):
+    """Indices of the k highest values (NaN excluded), highest first, ties favour the first values"""
+    values = np.asarray(values, dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if k >= len(valid):
+        return valid[rank_order(values[valid])]
+    if k <= 0:
+        return valid[:0]
+    # k-th highest value, the values above it and the first tied ones make the top k
+    kth = values[valid[np.argpartition(-values[valid], k - 1)[k - 1]]]
+    above = valid[values[valid] > kth]
+    tied = valid[values[valid] == kth][:k - len(above)]
+    chosen = np.concatenate([above, tied])
+    return chosen[rank_order(values[chosen])]
+
+
+def bottom_k(values, k):
+    """Indices of the k lowest values (NaN excluded), lowest first, ties favour the last values"""
+    values = np.asarray(values, dtype=float)
+    return len(values) - 1 - top_k(-values[::-1], k)
+
+
+def _group_counts(values, groups):
+    """
+    Number of lower and equal values of each valid value within its group
+    and the number of valid values of the group, with one sort of the
+    (group, value) pairs.
+    """
+    # Dense rank of the values, so that the (group, rank) pairs fit in one integer key
+    _, ranks = np.unique(values, return_inverse=True)
+    keys = groups.astype(np.int64) * (len(values) + 1) + ranks
+    sorted_keys = np.sort(keys)
+    group_start = np.searchsorted(sorted_keys, groups.astype(np.int64) * (len(values) + 1), 'left')
+    left = np.searchsorted(sorted_keys, keys, 'left')
+    right = np.searchsorted(sorted_keys, keys, 'right')
+    sizes = np.bincount(groups)[groups]
+    return left - group_start, right - left, sizes
+
+
+def group_ranks(values, groups=None):
+    """
+    Position (1 = highest) of every value within its group, tied values
+    sharing the best position (1, 1, 3). ``groups`` holds a non-negative
+    group index per value, all values form one group if None. NaN values
+    get position 0.
+    """
+    values = np.asarray(values, dtype=float)
+    groups = np.zeros(len(values), dtype=np.intp) if groups is None else np.asarray(groups)
+    valid = ~np.isnan(values)
+    positions = np.zeros(len(values), dtype=np.intp)
+    if valid.any():
+        lower, equal, sizes = _group_counts(values[valid], groups[valid])
+        positions[valid] = sizes - lower - equal + 1
+    return positions
+
+
+def percentile_ranks(values, groups=None):
+    """
+    Percentile (0-100) of every value within its group: the share of lower
+    values plus half of the equal ones. NaN values get NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    groups = np.zeros(len(values), dtype=np.intp) if groups is None else np.asarray(groups)
+    valid = ~np.isnan(values)
+    percentiles = np.full(len(values), np.nan)
+    if valid.any():
+        lower, equal, sizes = _group_counts(values[valid], groups[valid])
+        percentiles[valid] = (lower + 0.5 * equal) / sizes * 100
+    return percentiles
+
+
+def ranking_frame(marks, trimester=None, by_group=False):
+    """
+    Ranking of the students of a MarksDataset by their mean numeric mark,
+    highest first and students without marks last. Columns: alumne (index
+    in the dataset), id, nom, grup, mitjana, posicio and percentil. With
+    ``by_group`` the positions and percentiles are computed within the
+    group of each student, for school-wide datasets of several groups.
+    """
+    averages = marks.averages(trimester)
+    groups = marks.last_groups()
+    rank_groups = groups if by_group else None
+    order = rank_order(averages)
+    return pd.DataFrame({
+        'alumne': order,
+        'id': marks.ids[order],
+        'nom': marks.names[order],
+        'grup': np.array(marks.groups + [''], dtype=object)[groups[order]],
+        'mitjana': averages[order],
+        'posicio': group_ranks(averages, rank_groups)[order],
+        'percentil': percentile_ranks(averages, rank_groups)[order]
+    })
@@ -0,0 +1,7 @@
+import sys
+
+
+def intern_value(value):
+    """Return the shared interned copy of a string, other values unchanged"""
+    return sys.intern(value) if type(value) is str else value
+
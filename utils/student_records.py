@@ -0,0 +1,204 @@
+import sys
+from collections.abc import Mapping
+from utils.string_pool import intern_value
+
+_intern = sys.intern
+
+# Value of the optional fields a record does not have
+_MISSING = object()
+
+
+class _Record(Mapping):
+    """
+    Read-only mapping over the __slots__ of a record, so that the sections
+    keep reading ``record['field']`` and ``record.get('field')`` as with the
+    decoded dictionaries. Fields set to _MISSING are absent from the mapping.
+    Records compare equal to dictionaries with the same content.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self.__slots__ else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (field for field in self.__slots__ if getattr(self, field) is not _MISSING)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        """Plain dictionary copy of the record"""
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class FileMetadata(_Record):
+    """grup, trimestre, display_name and version of a loaded file, shared by all its students"""
+
+    __slots__ = ('grup', 'trimestre', 'display_name', 'version')
+
+    def __init__(self, grup, trimestre, display_name, version):
+        self.grup = intern_value(grup)
+        self.trimestre = intern_value(trimestre)
+        self.display_name = intern_value(display_name)
+        self.version = version
+
+
+# Fields of a materia stored in the slots of its MateriaEntry
+_MATERIA_FIELDS = ('materia', 'qualificacio', 'comentari')
+
+
+class MateriaEntry(_Record):
+    """
+    One materia of a loaded student: materia, qualificacio and comentari,
+    any other field of the decoded materia is kept in ``extra``.
+    """
+
+    __slots__ = (*_MATERIA_FIELDS, 'extra')
+
+    def __init__(self, materia, qualificacio=_MISSING, comentari=_MISSING, extra=None):
+        # Names and qualifications repeat across students and files (intern_value inlined, one per materia)
+        self.materia = _intern(materia) if type(materia) is str else materia
+        self.qualificacio = _intern(qualificacio) if type(qualificacio) is str else qualificacio
+        self.comentari = comentari
+        self.extra = extra
+
+    def __getitem__(self, key):
+        if key in _MATERIA_FIELDS:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for field in _MATERIA_FIELDS:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+
+class MateriaList(tuple):
+    """Immutable materies of a student, equal to a list with the same materies"""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            other = tuple(other)
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+
+# Student fields read from the FileMetadata of the student
+FILE_FIELDS = {'trimestre': 'trimestre', 'grup': 'grup', 'file_display_name': 'display_name'}
+
+
+class StudentEntry(_Record):
+    """
+    One loaded student. The id, name, materies and general comment are
+    stored once, the grup, trimestre and file_display_name fields come from
+    the FileMetadata shared by every student of the file, and any other
+    field of the decoded student is kept in ``extra``.
+    """
+
+    __slots__ = ('id', 'nom_cognoms', 'materies', 'comentari_general', 'extra', 'file')
+
+    def __init__(self, id, nom_cognoms, materies, file, comentari_general=_MISSING, extra=None):
+        self.id = intern_value(id)
+        self.nom_cognoms = intern_value(nom_cognoms)
+        self.materies = materies
+        self.comentari_general = comentari_general
+        self.extra = extra
+        self.file = file
+
+    def __getitem__(self, key):
+        if key in FILE_FIELDS:
+            return getattr(self.file, FILE_FIELDS[key])
+        if key in ('id', 'nom_cognoms', 'materies', 'comentari_general'):
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield 'id'
+        yield 'nom_cognoms'
+        yield 'materies'
+        if self.comentari_general is not _MISSING:
+            yield 'comentari_general'
+        if self.extra:
+            yield from self.extra
+        yield from FILE_FIELDS
+
+    def to_dict(self):
+        """Plain dictionary copy of the student, with the materies as dictionaries"""
+        student = dict(self.items())
+        student['materies'] = [materia.to_dict() for materia in self.materies]
+        return student
+
+
+_STUDENT_FIELDS = frozenset(('id', 'nom_cognoms', 'materies', 'comentari_general', *FILE_FIELDS))
+
+_MATERIA_FIELD_SET = frozenset(_MATERIA_FIELDS)
+
+
+def _extra_fields(record, fields):
+    """Fields of a decoded dictionary outside ``fields``, None when it has none"""
+    if record.keys() <= fields:
+        return None
+    return {key: value for key, value in record.items() if key not in fields}
+
+
+def student_extra(student):
+    """Fields of a student (dictionary or StudentEntry) kept in StudentEntry.extra, None when it has none"""
+    return _extra_fields(student, _STUDENT_FIELDS)
+
+
+def materia_extra(materia):
+    """Fields of a materia (dictionary or MateriaEntry) kept in MateriaEntry.extra, None when it has none"""
+    return _extra_fields(materia, _MATERIA_FIELD_SET)
+
+
+def make_student(student, file, materies=None):
+    """
+    Build the StudentEntry of a decoded student dictionary (left unchanged)
+    of a file. ``materies`` replaces the materies of the dictionary, e.g.
+    to drop invalid ones. The id is stored as a string.
+    """
+    return StudentEntry(
+        str(student['id']),
+        student['nom_cognoms'],
+        MateriaList([
+            MateriaEntry(materia['materia'], materia.get('qualificacio', _MISSING), materia.get('comentari', _MISSING),
+                         _extra_fields(materia, _MATERIA_FIELD_SET))
+            for materia in (student['materies'] if materies is None else materies)
+        ]),
+        file,
+        student.get('comentari_general', _MISSING),
+        _extra_fields(student, _STUDENT_FIELDS)
+    )
@@ -0,0 +1,388 @@
+import codecs
+import io
+import json
+import re
+import typing
+from typing import List, NotRequired, Optional, TypedDict, Union
+
+try:
+    import msgspec
+except ImportError:  # msgspec is optional and not in requirements.txt
+    msgspec = None
+
+# JSON decoding backends, the first available one is the default. msgspec is
+# only used when asked for: validating with msgspec.convert makes a full decode
+# slower than json.loads (see benchmarks/bench_json_decoding.py)
+JSON_BACKENDS = ('json', 'msgspec')
+
+
+class MateriaRecord(TypedDict):
+    """One materia of a student"""
+    materia: str
+    qualificacio: NotRequired[Optional[str]]
+    comentari: NotRequired[Optional[str]]
+
+
+class StudentRecord(TypedDict):
+    """One student of a JSON file, as written by the CSV converter"""
+    id: Union[str, int, None]
+    nom_cognoms: str
+    materies: List[MateriaRecord]
+    comentari_general: NotRequired[Optional[str]]
+
+
+class StudentFile(TypedDict):
+    """JSON file structure: grup, trimestre, estudiants and metrika_version"""
+    estudiants: List[StudentRecord]
+    grup: NotRequired[str]
+    trimestre: NotRequired[str]
+    metrika_version: NotRequired[str]
+
+
+# Files are either the current structure or the old format, a bare list of students
+STUDENT_FILE_TYPE = Union[StudentFile, List[StudentRecord]]
+
+# Header fields of a student file, read by probe_student_file
+HEADER_FIELDS = ('grup', 'trimestre', 'metrika_version')
+
+_msgspec_decoder = None
+_msgspec_header_decoder = None
+if msgspec is not None:
+    class _StudentFileHeader(msgspec.Struct):
+        # Raw skips the students array without building any object
+        estudiants: msgspec.Raw
+        grup: Union[str, msgspec.UnsetType] = msgspec.UNSET
+        trimestre: Union[str, msgspec.UnsetType] = msgspec.UNSET
+        metrika_version: Union[str, msgspec.UnsetType] = msgspec.UNSET
+
+    # Untyped decoder, the decoded value is then validated with msgspec.convert
+    _msgspec_decoder = msgspec.json.Decoder()
+    _msgspec_header_decoder = msgspec.json.Decoder(_StudentFileHeader)
+
+
+def available_backends():
+    """Return the JSON decoding backends that can be used in this environment"""
+    return tuple(backend for backend in JSON_BACKENDS if backend != 'msgspec' or msgspec is not None)
+
+
+def default_backend():
+    """Return the backend used when none is given, the stdlib json module"""
+    return available_backends()[0]
+
+
+class SchemaError(ValueError):
+    """A decoded JSON value that does not follow the student file schema"""
+
+    def __init__(self, message, path=()):
+        self.message = message
+        self.path = list(path)
+        super().__init__(message)
+
+    def __str__(self):
+        return f"{self.message} - a `${''.join(self.path)}`"
+
+
+# Errors raised by decode_student_file for valid JSON that does not follow the schema
+SCHEMA_ERRORS = (SchemaError, msgspec.ValidationError) if msgspec is not None else (SchemaError,)
+
+
+def _type_name(expected):
+    if expected is type(None):
+        return 'null'
+    if typing.get_origin(expected) is Union:
+        return ' | '.join(_type_name(arg) for arg in typing.get_args(expected))
+    if typing.get_origin(expected) is list:
+        return 'array'
+    if typing.is_typeddict(expected):
+        return 'object'
+    return expected.__name__
+
+
+def _json_types(expected):
+    """Python types json.loads produces for a schema type"""
+    if expected is type(None):
+        return (type(None),)
+    if typing.get_origin(expected) is Union:
+        return sum((_json_types(arg) for arg in typing.get_args(expected)), ())
+    if typing.get_origin(expected) is list:
+        return (list,)
+    if typing.is_typeddict(expected):
+        return (dict,)
+    return (expected,)
+
+
+def _compile_validator(expected):
+    """
+    Build a function that checks a json.loads value against a schema type and
+    returns it, fields outside the schema included, mirroring the msgspec
+    backend. Paths are only built when a SchemaError is raised.
+    """
+    def type_error(value):
+        return SchemaError(f"S'esperava `{_type_name(expected)}`, s'ha trobat `{type(value).__name__}`")
+
+    if typing.get_origin(expected) is Union:
+        options = [(_json_types(arg), _compile_validator(arg)) for arg in typing.get_args(expected)]
+
+        def validate_union(value):
+            for types, validate in options:
+                # Exact types: bool is an int subclass but not a JSON number
+                if type(value) in types:
+                    return validate(value)
+            raise type_error(value)
+        return validate_union
+
+    if typing.get_origin(expected) is list:
+        (item_type,) = typing.get_args(expected)
+        validate_item = _compile_validator(item_type)
+
+        def validate_list(value):
+            if type(value) is not list:
+                raise type_error(value)
+            i = 0
+            try:
+                result = []
+                for i, item in enumerate(value):
+                    result.append(validate_item(item))
+                return result
+            except SchemaError as e:
+                e.path.insert(0, f"[{i}]")
+                raise
+        return validate_list
+
+    if typing.is_typeddict(expected):
+        fields = [
+            (field, _compile_validator(field_type), field in expected.__required_keys__)
+            for field, field_type in typing.get_type_hints(expected).items()
+        ]
+
+        def validate_record(value):
+            if type(value) is not dict:
+                raise type_error(value)
+            result = dict(value)
+            for field, validate, required in fields:
+                if field in value:
+                    try:
+                        result[field] = validate(value[field])
+                    except SchemaError as e:
+                        e.path.insert(0, f".{field}")
+                        raise
+                elif required:
+                    raise SchemaError(f"Falta el camp obligatori `{field}`")
+            return result
+        return validate_record
+
+    types = _json_types(expected)
+
+    def validate_value(value):
+        if type(value) not in types:
+            raise type_error(value)
+        return value
+    return validate_value
+
+
+_validate_student_file = _compile_validator(STUDENT_FILE_TYPE)
+
+
+def decode_student_file(content, backend=None):
+    """
+    Decode the JSON content (bytes or a binary file object) of a student file
+    and validate it against StudentFile, or a bare list of StudentRecord for
+    old files. Fields outside the schema are kept as decoded. Raises ValueError
+    (SchemaError or msgspec.ValidationError) when the content does not
+    follow the schema.
+    """
+    backend = backend or default_backend()
+    if backend not in available_backends():
+        raise ValueError(f"Descodificador JSON no disponible: {backend}. Opcions: {available_backends()}")
+    if hasattr(content, 'read'):
+        content = content.read()
+
+    if backend == 'msgspec':
+        data = _msgspec_decoder.decode(content)
+        # convert only validates: it returns the value without the extra fields
+        msgspec.convert(data, STUDENT_FILE_TYPE)
+        return data
+    if isinstance(content, memoryview):
+        content = content.tobytes()
+    return _validate_student_file(json.loads(content))
+
+
+# Bytes read at a time by the stdlib header scan
+PROBE_CHUNK_SIZE = 64 * 1024
+
+# Header values longer than this stop the scan, the whole file is decoded instead
+MAX_HEADER_VALUE_SIZE = 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that change the bracket depth or start a string outside strings
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+# Characters that end a string or escape the next one inside strings
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class _ScanAborted(Exception):
+    """The header scan found something it does not handle"""
+
+
+class _HeaderScanner:
+    """
+    Incremental reader of the top-level object of a student file (a binary
+    stream). Values are decoded with json.JSONDecoder.raw_decode from a
+    buffer that holds the unread part of the last chunks, and arrays are
+    skipped by bracket depth, so only the header values and one chunk are
+    kept in memory.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Append the next chunk to the unread text, False at the end of the content"""
+        if self.eof:
+            return False
+        chunk = self.stream.read(PROBE_CHUNK_SIZE)
+        self.eof = not chunk
+        self.text = self.text[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next character after whitespace, '' at the end of the content"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self._fill():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise _ScanAborted()
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading chunks until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                end = None
+            # A value that reaches the end of the buffer may continue in the next chunk (numbers)
+            if end is not None and (end < len(self.text) or self.eof):
+                self.pos = end
+                return value
+            if len(self.text) - self.pos > MAX_HEADER_VALUE_SIZE or not self._fill():
+                if end is None:
+                    raise _ScanAborted()
+                self.pos = end
+                return value
+
+    def skip_array(self):
+        """Skip the next array by bracket depth, without decoding it"""
+        self.expect('[')
+        depth, in_string, escaped = 1, False, False
+        while depth:
+            if self.pos >= len(self.text):
+                if not self._fill():
+                    raise _ScanAborted()
+                continue
+            if escaped:
+                self.pos += 1
+                escaped = False
+                continue
+            match = (_STRING_SPECIAL if in_string else _STRUCTURAL).search(self.text, self.pos)
+            if match is None:
+                self.pos = len(self.text)
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = not in_string
+            elif char in '[{':
+                depth += 1
+            else:
+                depth -= 1
+
+
+def _scan_header(stream):
+    """
+    Read the header fields of a student file (a binary stream) with the
+    stdlib decoder, one token at a time: every field but ``estudiants`` is
+    decoded, the students array is skipped. Returns None when the content
+    does not have the expected shape (the caller then decodes the whole
+    file), raises SchemaError when ``estudiants`` is missing or not an array.
+    """
+    scanner = _HeaderScanner(stream)
+    header = {}
+    found = False
+    try:
+        scanner.expect('{')
+        while True:
+            if scanner.peek() != '"':
+                raise _ScanAborted()
+            key = scanner.value()
+            scanner.expect(':')
+            if key == 'estudiants':
+                char = scanner.peek()
+                if char != '[':
+                    raise SchemaError(f"S'esperava `array`, s'ha trobat `{char}`", ['.estudiants'])
+                scanner.skip_array()
+                found = True
+            else:
+                header[key] = scanner.value()
+            char = scanner.peek()
+            scanner.pos += 1
+            if char == '}':
+                break
+            if char != ',':
+                raise _ScanAborted()
+    except _ScanAborted:
+        return None
+    if not found:
+        raise SchemaError("Falta el camp obligatori `estudiants`")
+    return header
+
+
+def probe_student_file(content, backend=None):
+    """
+    Read the header of a student file (bytes or a binary file object) without
+    building its students: a dict with the grup, trimestre and
+    metrika_version found in the file, or an empty list for old files (a
+    bare list of students, which have no header). Raises ValueError when the
+    content is not a student file.
+
+    The stdlib backend scans the file up to the end of its top-level object
+    and decodes the whole file when the scan cannot read it (see
+    _scan_header).
+    """
+    backend = backend or default_backend()
+    if backend not in available_backends():
+        raise ValueError(f"Descodificador JSON no disponible: {backend}. Opcions: {available_backends()}")
+    if hasattr(content, 'read'):
+        content = content.read()
+    content = bytes(content) if isinstance(content, memoryview) else content
+
+    start = re.match(rb'\s*', content).end()
+    if content[start:start + 1] == b'[':
+        return []
+    if backend == 'msgspec':
+        header = _msgspec_header_decoder.decode(content)
+        return {key: getattr(header, key) for key in HEADER_FIELDS if getattr(header, key) is not msgspec.UNSET}
+
+    header = _scan_header(io.BytesIO(content))
+    if header is None:
+        data = decode_student_file(content, backend)
+        return [] if isinstance(data, list) else {key: value for key, value in data.items() if key != 'estudiants'}
+    fields = {}
+    for key in HEADER_FIELDS:
+        if key in header:
+            if type(header[key]) is not str:
+                raise SchemaError(f"S'esperava `str`, s'ha trobat `{type(header[key]).__name__}`", [f".{key}"])
+            fields[key] = header[key]
+    return fields
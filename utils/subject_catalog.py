@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+from utils.constants import DataConfig
+
+COURSE_LEVELS = ('1r', '2n', '3r', '4t')
+"""Course levels found in subject names, the bit of each one in the masks follows this order"""
+
+STAGES = {'Batxillerat': re.compile(r'\bbatx', re.IGNORECASE)}
+"""Stages other than ESO and the pattern of their subject names"""
+
+DEFAULT_STAGE = 'ESO'
+
+# Course level tokens (1r, 2n, 3r, 4t) removed from the canonical name
+_LEVEL_PATTERN = re.compile(r'(?<!\w)(1r|2n|3r|4t)\b', re.IGNORECASE)
+
+# Words left around the course level once it is removed: "- 3r d'ESO" or "3r de Batxillerat"
+_STAGE_WORDS = re.compile(r"\s*(?:-\s*)?\b(?:d'|de\s+)?(?:ESO|Batxillerat|Batx\.?)(?!\w)", re.IGNORECASE)
+
+# Area (DataConfig.SUBJ_NAMES) of the subject names starting with each prefix, lowercase
+AREA_PREFIXES = {
+    'llengua catalana': 'CAT', 'català': 'CAT', 'catala': 'CAT',
+    'llengua castellana': 'CAST', 'castellà': 'CAST', 'castella': 'CAST',
+    'llengua estrangera': 'ANG', 'anglès': 'ANG', 'angles': 'ANG',
+    'matemàtiques': 'MAT', 'matematiques': 'MAT',
+    'biologia': 'BG',
+    'física i química': 'FQ', 'fisica i quimica': 'FQ',
+    'tecnologia': 'TD',
+    'ciències socials': 'CS', 'ciencies socials': 'CS',
+    'música': 'MUS', 'musica': 'MUS',
+    'educació física': 'EDF', 'educacio fisica': 'EDF',
+    'optativa': 'OPT',
+    **{column.lower(): short for column, short in DataConfig.COL_NAMES.value.items() if short in DataConfig.SUBJ_NAMES.value}
+}
+
+
+class SubjectInfo(NamedTuple):
+    """Structured record of a subject name"""
+
+    name: str
+    canonical: str
+    levels: frozenset
+    stage: str
+    area: Optional[str]
+    bits: int
+    folded_bits: int
+
+
+def level_bits(levels):
+    """Bitmask of some course levels, unknown levels are ignored"""
+    return sum(1 << COURSE_LEVELS.index(level) for level in set(levels) if level in COURSE_LEVELS)
+
+
+@lru_cache(maxsize=4096)
+def parse_subject(name):
+    """
+    Parse a subject name into its SubjectInfo: the course levels its name
+    contains (e.g. 'Matemàtiques 3r' -> {'3r'}), its stage, the canonical
+    name without the course and the area of DataConfig.SUBJ_NAMES (None
+    when unknown). Levels are matched as substrings, as the course filters
+    always did: ``bits`` holds the levels found with their case and
+    ``folded_bits`` the ones found ignoring it. Each distinct name is parsed
+    once.
+    """
+    levels = frozenset(level for level in COURSE_LEVELS if level in name)
+    folded_levels = [level for level in COURSE_LEVELS if level in name.lower()]
+    stage = next((stage for stage, pattern in STAGES.items() if pattern.search(name)), DEFAULT_STAGE)
+    canonical = _STAGE_WORDS.sub('', _LEVEL_PATTERN.sub('', name))
+    canonical = re.sub(r'\s+', ' ', canonical).strip(' -') or name.strip()
+    lowered = canonical.lower()
+    area = next((area for prefix, area in AREA_PREFIXES.items() if lowered.startswith(prefix)), None)
+    return SubjectInfo(name, canonical, levels, stage, area, level_bits(levels), level_bits(folded_levels))
+
+
+class SubjectCatalog:
+    """
+    Parsed subject names of a dataset, in the given order.
+
+    Keeps a bitmask of course levels per subject and the set of subjects of
+    each level, so that the course filters of the sections are bitwise and
+    set operations instead of scanning the names again on every rerun.
+    """
+
+    def __init__(self, names):
+        # Missing names (NaN) have no course
+        self.subjects = [parse_subject(name if isinstance(name, str) else '') for name in names]
+        self.names = [subject.name for subject in self.subjects]
+        self.bits = np.array([subject.bits for subject in self.subjects], dtype=np.int64)
+        self.folded_bits = np.array([subject.folded_bits for subject in self.subjects], dtype=np.int64)
+        self.stages = np.array([subject.stage for subject in self.subjects], dtype=object)
+        self.by_level = {level: frozenset(s.name for s in self.subjects if level in s.levels) for level in COURSE_LEVELS}
+        self.by_stage = {}
+        for subject in self.subjects:
+            self.by_stage.setdefault(subject.stage, set()).add(subject.name)
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def __getitem__(self, position):
+        return self.subjects[position]
+
+    def mask(self, levels, stage=None, case=True):
+        """
+        Boolean mask of the subjects whose name contains any of the course
+        levels (and of the stage, if given), ignoring case if ``case`` is
+        False. Levels outside COURSE_LEVELS are searched in the names.
+        """
+        mask = ((self.bits if case else self.folded_bits) & level_bits(levels)) != 0
+        other = [level for level in levels if level not in COURSE_LEVELS]
+        if other:
+            names = self.names if case else [name.lower() for name in self.names]
+            other = other if case else [level.lower() for level in other]
+            mask |= np.array([any(level in name for level in other) for name in names], dtype=bool)
+        if stage is not None:
+            mask &= self.stages == stage
+        return mask
+
+    def names_of(self, levels, stage=None):
+        """Set of the names of the subjects containing any of the course levels (and of the stage, if given)"""
+        names = set().union(*(self.by_level.get(level, ()) for level in levels))
+        if stage is not None:
+            names &= self.by_stage.get(stage, set())
+        return names
+
+    def levels(self):
+        """Course levels of the catalog, in COURSE_LEVELS order"""
+        return [level for level in COURSE_LEVELS if self.by_level[level]]
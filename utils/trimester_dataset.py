@@ -0,0 +1,213 @@
+import io
+import json
+import logging
+import os
+from utils.constants import AppConfig
+
+logger = logging.getLogger(__name__)
+
+# Format version of the multi-trimester dataset files
+DATASET_FORMAT_VERSION = 1
+
+# A dataset is compacted when it holds this many times more records than live ones
+DATASET_COMPACT_RATIO = 2
+
+# Extension of the multi-trimester dataset files
+DATASET_EXTENSION = 'jsonl'
+
+
+def _student_key(student):
+    """Return the dataset key of a student, None for students without a valid id"""
+    student_id = str(student.get('id', '')).strip()
+    if not student_id or student_id.upper() in ('NULL', 'NAN', 'NONE'):
+        return None
+    return student_id
+
+
+def is_dataset_file(filename):
+    """Whether a file name is a multi-trimester dataset (.jsonl)"""
+    return filename.lower().endswith(f'.{DATASET_EXTENSION}')
+
+
+def _open_dataset(dataset_file):
+    if isinstance(dataset_file, (bytes, bytearray, memoryview)):
+        return io.StringIO(bytes(dataset_file).decode('utf-8'))
+    return open(dataset_file, 'r', encoding='utf-8')
+
+
+def load_dataset(dataset_file, name=None):
+    """
+    Load a multi-trimester dataset, given as a path or as the bytes of the
+    file (``name`` is then used in the error messages).
+
+    The file is JSON lines: a header line with the dataset metadata followed
+    by one record per line with trimestre, id and estudiant. Later records of
+    the same trimestre and id replace earlier ones.
+
+    Returns (header, {trimestre: {id: student}}, number of records in the file).
+    """
+    name = name or (dataset_file if isinstance(dataset_file, str) else "el conjunt de dades")
+    header = None
+    trimestres = {}
+    n_records = 0
+    with _open_dataset(dataset_file) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if header is None:
+                if record.get('metrika_dataset') != DATASET_FORMAT_VERSION:
+                    raise ValueError(f"{name} no és un conjunt de dades de Metrika compatible")
+                header = record
+                continue
+            try:
+                trimestres.setdefault(record['trimestre'], {})[record['id']] = record['estudiant']
+            except KeyError as e:
+                raise ValueError(f"Registre incomplet a la línia {line_number} de {name}: falta {e}")
+            n_records += 1
+    if header is None:
+        raise ValueError(f"El conjunt de dades {name} és buit")
+    return header, trimestres, n_records
+
+
+def _dataset_line(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _write_dataset(dataset_file, header, trimestres):
+    """Rewrite a dataset with a header and one record per trimestre and id"""
+    temp_file = f"{dataset_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(_dataset_line(header))
+        for trimestre, students in trimestres.items():
+            for student_id, student in students.items():
+                f.write(_dataset_line({'trimestre': trimestre, 'id': student_id, 'estudiant': student}))
+    os.replace(temp_file, dataset_file)
+
+
+def compact_dataset(dataset_file):
+    """Rewrite a dataset keeping only the live record of every trimestre and id"""
+    header, trimestres, _ = load_dataset(dataset_file)
+    _write_dataset(dataset_file, header, trimestres)
+    logger.info(f"S'ha compactat el conjunt de dades {dataset_file}")
+
+
+def merge_session_into_dataset(students, dataset_file, trimestre, grup=None):
+    """
+    Merge the students of one evaluation session into a multi-trimester dataset.
+
+    Students are matched by id within ``trimestre``: only new students and
+    students whose record changed are appended to ``dataset_file``, which is
+    created if needed. Students missing from the session are kept. The file
+    is compacted when replaced records outgrow the live ones. A dataset
+    holds the sessions of one grup: merging a session of another grup
+    raises ValueError.
+
+    Returns a dict with the number of 'nous', 'modificats', 'sense_canvis'
+    and 'ignorats' (without a valid id) students.
+    """
+    stats = {'nous': 0, 'modificats': 0, 'sense_canvis': 0, 'ignorats': 0}
+    if os.path.exists(dataset_file):
+        header, trimestres, n_records = load_dataset(dataset_file)
+        if header.get('grup') is not None and grup is not None and grup != header['grup']:
+            raise ValueError(
+                f"El conjunt de dades {dataset_file} és del grup {header['grup']} i la sessió {trimestre} del grup {grup}"
+            )
+        if header.get('grup') is None and grup is not None:
+            # Datasets created without grup take the first one merged into them
+            header['grup'] = grup
+            _write_dataset(dataset_file, header, trimestres)
+            n_records = sum(len(students_by_id) for students_by_id in trimestres.values())
+    else:
+        header = {'metrika_dataset': DATASET_FORMAT_VERSION, 'grup': grup, 'metrika_version': AppConfig.VERSION}
+        trimestres, n_records = {}, 0
+        with open(dataset_file, 'w', encoding='utf-8') as f:
+            f.write(_dataset_line(header))
+
+    current = trimestres.setdefault(trimestre, {})
+    changed = {}
+    for student in students:
+        student_id = _student_key(student)
+        if student_id is None:
+            stats['ignorats'] += 1
+            continue
+        student = {**student, 'id': student_id}
+        previous = current.get(student_id, changed.get(student_id))
+        if previous == student:
+            stats['sense_canvis'] += 1
+            continue
+        stats['modificats' if previous is not None else 'nous'] += 1
+        changed[student_id] = student
+
+    if changed:
+        with open(dataset_file, 'a', encoding='utf-8') as f:
+            for student_id, student in changed.items():
+                f.write(_dataset_line({'trimestre': trimestre, 'id': student_id, 'estudiant': student}))
+        current.update(changed)
+        n_records += len(changed)
+        n_live = sum(len(students_by_id) for students_by_id in trimestres.values())
+        if n_records > DATASET_COMPACT_RATIO * n_live:
+            compact_dataset(dataset_file)
+
+    logger.info(f"Sessió {trimestre} fusionada a {dataset_file}: {stats}")
+    return stats
+
+
+def session_grup(students, default=None):
+    """The grup shared by the students of a converted session (a grup column of the CSV), ``default`` otherwise"""
+    grups = {student.get('grup') for student in students}
+    if len(grups) == 1 and None not in grups and str(next(iter(grups))).strip():
+        return str(next(iter(grups))).strip()
+    return default
+
+
+def merge_converted_sessions(trimesters, results, output_dir, dataset_file, grup=None):
+    """
+    Merge into a dataset the trimester files that process_trimestre_files
+    (with save_to_file) wrote in this run, given the trimester detected for
+    each of its CSV files and its ``results``. Trimesters whose saved file failed to convert are left out,
+    so stale files from earlier runs are never merged. The grup of each
+    session comes from its students, ``grup`` when they have none.
+    Returns (trimestre, success, message) tuples.
+    """
+    # The last file of each trimester is the one saved
+    saved = {}
+    for trimester, (success, _) in zip(trimesters, results):
+        if trimester is not None:
+            saved[trimester] = success
+    merged = []
+    for trimester in sorted(saved):
+        if not saved[trimester]:
+            merged.append((trimester, False, f"{trimester} no s'ha convertit en aquesta execució i no es fusiona"))
+            continue
+        output_file = os.path.join(output_dir, f"{trimester}.json")
+        try:
+            with open(output_file, 'r', encoding='utf-8') as f:
+                students = json.load(f)
+            stats = merge_session_into_dataset(students, dataset_file, trimester, grup=session_grup(students, grup))
+            merged.append((trimester, True, (
+                f"{trimester} fusionat a {dataset_file}: {stats['nous']} nous, "
+                f"{stats['modificats']} modificats, {stats['sense_canvis']} sense canvis"
+            )))
+        except Exception as e:
+            logger.error(f"Error fusionant {trimester} a {dataset_file}: {str(e)}")
+            merged.append((trimester, False, f"Error fusionant {trimester} a {dataset_file}: {str(e)}"))
+    return merged
+
+
+def dataset_envelopes(dataset_file, name=None):
+    """
+    Return one grup/trimestre/estudiants structure per trimester of a
+    dataset (a path or the bytes of the file, see load_dataset), the
+    structure the app loads from a trimester file.
+    """
+    header, trimestres, _ = load_dataset(dataset_file, name)
+    return [
+        {
+            'grup': header.get('grup') or 'Grup desconegut',
+            'trimestre': trimestre,
+            'estudiants': list(students.values()),
+            'metrika_version': header.get('metrika_version', AppConfig.VERSION)
+        }
+        for trimestre, students in sorted(trimestres.items())
+    ]
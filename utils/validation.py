@@ -0,0 +1,170 @@
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+import numpy as np
+from utils.constants import MarkConfig
+from utils.marks_dataset import OTHER_CODE, encode_marks
+
+# Error kinds of a validation report and their description
+ERROR_KINDS = {
+    'registre_invalid': "registres que no són un estudiant",
+    'id_absent': "estudiants sense id",
+    'nom_absent': "estudiants sense nom",
+    'materies_invalides': "estudiants sense llista de matèries",
+    'id_repetit': "estudiants amb l'id repetit",
+    'materia_sense_nom': "estudiants amb matèries sense nom",
+    'materia_repetida': "estudiants amb matèries repetides",
+    'qualificacio_desconeguda': "estudiants amb qualificacions desconegudes",
+    'qualificacio_sense_materia': "estudiants amb qualificacions sense matèria"
+}
+
+# Error kinds of the records that cannot be loaded
+SKIPPED_KINDS = ('registre_invalid', 'id_absent', 'nom_absent', 'materies_invalides')
+
+# Row indices listed in a report message
+MESSAGE_ROWS = 10
+
+# Qualifications that are not reported as unknown
+KNOWN_MARKS = set(MarkConfig.LIST.value) | {'', None}
+
+
+class ValidationReport:
+    """
+    Result of validating a batch of records: the sorted row indices of the
+    records with each kind of error (see ERROR_KINDS). Kinds without errors
+    are left out.
+    """
+
+    def __init__(self, n_records, errors):
+        self.n_records = n_records
+        self.errors = {}
+        for kind in ERROR_KINDS:
+            rows = errors.get(kind, ())
+            if len(rows):
+                self.errors[kind] = np.unique(np.asarray(rows, dtype=np.int64))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def counts(self):
+        """Number of records with each kind of error"""
+        return {kind: int(rows.size) for kind, rows in self.errors.items()}
+
+    def rows(self, kind):
+        """Row indices of the records with an error kind"""
+        return self.errors.get(kind, np.empty(0, dtype=np.int64))
+
+    def skipped_mask(self):
+        """Boolean mask of the records that cannot be loaded (SKIPPED_KINDS)"""
+        mask = np.zeros(self.n_records, dtype=bool)
+        for kind in SKIPPED_KINDS:
+            mask[self.rows(kind)] = True
+        return mask
+
+    def messages(self):
+        """One line per error kind, e.g. '2 estudiants sense id (files 3, 7)', skipped kinds marked"""
+        lines = []
+        for kind, rows in self.errors.items():
+            listed = ', '.join(str(row) for row in rows[:MESSAGE_ROWS]) + (', ...' if rows.size > MESSAGE_ROWS else '')
+            skipped = " (s'ometen)" if kind in SKIPPED_KINDS else ""
+            lines.append(f"{rows.size} {ERROR_KINDS[kind]}{skipped} (files {listed})")
+        return lines
+
+    def to_dict(self):
+        return {
+            'registres': self.n_records,
+            'errors': {kind: {'total': int(rows.size), 'files': rows.tolist()} for kind, rows in self.errors.items()}
+        }
+
+    def __repr__(self):
+        return f"ValidationReport(registres={self.n_records}, errors={self.counts()})"
+
+
+def _field_values(records, field):
+    """Value of a field in every record, None where it is missing or the record is not a dict"""
+    try:
+        # C level lookups when every record has the field, as in schema-decoded files
+        return list(map(itemgetter(field), records))
+    except (KeyError, TypeError, IndexError):
+        return [record.get(field) if type(record) is dict else None for record in records]
+
+
+def _blank(values):
+    """Mask of the values that are not a non-blank string"""
+    try:
+        # Few distinct values: check each of them once
+        blank_values = {value for value in set(values) if type(value) is not str or not value.strip()}
+        if not blank_values:
+            return np.zeros(len(values), dtype=bool)
+    except TypeError:  # unhashable values
+        pass
+    return np.fromiter((type(value) is not str or not value.strip() for value in values), dtype=bool, count=len(values))
+
+
+def _unknown_marks(qualificacions):
+    """Mask of the qualifications that are not empty nor one of MarkConfig.LIST"""
+    try:
+        if set(qualificacions) <= KNOWN_MARKS:
+            return np.zeros(len(qualificacions), dtype=bool)
+    except TypeError:  # unhashable values
+        pass
+    return encode_marks(qualificacions) == OTHER_CODE
+
+
+def _repeated_per_owner(lengths, values):
+    """Mask of the owners (one per length) with a repeated value among their slice of values"""
+    ends = np.cumsum(lengths)
+    return np.fromiter((len(set(values[end - length:end])) < length for end, length in zip(ends.tolist(), lengths.tolist())),
+                       dtype=bool, count=len(lengths))
+
+
+def validate_students(students):
+    """
+    Check every student of a decoded JSON file at once and return a
+    ValidationReport with the student indices of each error kind. Every
+    check builds a boolean mask over all students (or all their materies)
+    instead of stopping at the first error. Ids are absent when null, blank
+    or 'NULL'; materia level errors report the index of their student.
+    """
+    n = len(students)
+    is_record = np.fromiter((type(student) is dict for student in students), dtype=bool, count=n)
+    records = [student if type(student) is dict else {} for student in students]
+
+    id_text = [str(value).strip() if value is not None else '' for value in (record.get('id') for record in records)]
+    id_absent = is_record & np.fromiter((text == '' or text.upper() == 'NULL' for text in id_text), dtype=bool, count=n)
+    id_counts = Counter(id_text)
+    id_repeated = is_record & ~id_absent & np.fromiter((id_counts[text] > 1 for text in id_text), dtype=bool, count=n)
+    nom_absent = is_record & _blank([record.get('nom_cognoms') for record in records])
+
+    # Materies of all the students flattened, owner is the index of their student
+    materies = [record.get('materies') for record in records]
+    is_list = np.fromiter((type(m) is list for m in materies), dtype=bool, count=n)
+    lengths = np.fromiter((len(m) if type(m) is list else 0 for m in materies), dtype=np.int64, count=n)
+    owner = np.repeat(np.arange(n), lengths)
+    flat = list(chain.from_iterable(m for m in materies if type(m) is list))
+    names = _field_values(flat, 'materia')
+    qualificacions = _field_values(flat, 'qualificacio')
+    unnamed = _blank(names)
+    orphan = np.zeros(len(flat), dtype=bool)
+    if unnamed.any():
+        # Blank names are reported on their own, and may not be hashable
+        names = [name for name, blank in zip(names, unnamed) if not blank]
+        lengths = lengths - np.bincount(owner[unnamed], minlength=n)
+        # Qualifications given to a materia without name
+        orphan[unnamed] = ~_blank([q for q, blank in zip(qualificacions, unnamed) if blank])
+    repeated = _repeated_per_owner(lengths, names)
+    unknown = _unknown_marks(qualificacions)
+
+    return ValidationReport(n, {
+        'registre_invalid': np.flatnonzero(~is_record),
+        'id_absent': np.flatnonzero(id_absent),
+        'nom_absent': np.flatnonzero(nom_absent),
+        'materies_invalides': np.flatnonzero(is_record & ~is_list),
+        'id_repetit': np.flatnonzero(id_repeated),
+        'materia_sense_nom': owner[unnamed],
+        'materia_repetida': np.flatnonzero(repeated),
+        'qualificacio_desconeguda': owner[unknown],
+        'qualificacio_sense_materia': owner[orphan]
+    })
+